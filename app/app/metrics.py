@@ -0,0 +1,302 @@
+import bisect
+import fcntl
+import functools
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+
+# Layout of the values files: the used bytes (uint32, padded to 8 bytes), then entries of
+# key length (uint32), key (utf-8, padded to 8 bytes) and value (double)
+HEADER = struct.Struct("I")
+KEY_LENGTH = struct.Struct("I")
+VALUE = struct.Struct("d")
+# The values file of a process, and the file the values of stopped processes are merged
+# into, see `MetricsRegistry.collect`
+PROCESS_FILE = "metrics-{pid}.db"
+STOPPED_FILE = "metrics-stopped.db"
+LOCK_FILE = "metrics.lock"
+
+
+def _padded(length):
+    return length + (-length % 8)
+
+
+def _read_entries(buffer, used):
+    """
+    Yields (key, value, value offset) of the entries in the first `used` bytes of `buffer`
+    """
+    offset = 8
+    while offset < used:
+        (length,) = KEY_LENGTH.unpack_from(buffer, offset)
+        key = bytes(buffer[offset + 4:offset + 4 + length]).decode()
+        offset += _padded(4 + length)
+        yield key, VALUE.unpack_from(buffer, offset)[0], offset
+        offset += 8
+
+
+class MmapValues:
+    """
+    Float values by key in a file mapped into memory, so other processes can read them.
+    Only the owning process writes to the file: existing entries are updated in place and
+    new ones appended, a reader sees every entry completely written once it is counted in
+    the used bytes of the header.
+    """
+    initial_size = 1 << 16
+
+    def __init__(self, path):
+        self._file = open(path, "a+b")
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            size = self.initial_size
+            self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._used = HEADER.unpack_from(self._mmap, 0)[0] or 8
+        self._offsets = {key: offset for key, _, offset in _read_entries(self._mmap, self._used)}
+
+    def inc(self, key, amount):
+        offset = self._offsets.get(key)
+        if offset is None:
+            offset = self._append(key)
+        value = VALUE.unpack_from(self._mmap, offset)[0]
+        VALUE.pack_into(self._mmap, offset, value + amount)
+
+    def _append(self, key):
+        encoded = key.encode()
+        entry_size = _padded(4 + len(encoded)) + 8
+        if self._used + entry_size > len(self._mmap):
+            size = len(self._mmap) * 2
+            while self._used + entry_size > size:
+                size *= 2
+            self._file.truncate(size)
+            self._mmap.close()
+            self._mmap = mmap.mmap(self._file.fileno(), size)
+
+        KEY_LENGTH.pack_into(self._mmap, self._used, len(encoded))
+        self._mmap[self._used + 4:self._used + 4 + len(encoded)] = encoded
+        offset = self._used + _padded(4 + len(encoded))
+        VALUE.pack_into(self._mmap, offset, 0.0)
+        self._used = offset + 8
+        HEADER.pack_into(self._mmap, 0, self._used)
+        self._offsets[key] = offset
+        return offset
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    @staticmethod
+    def read(path):
+        """
+        Returns the values of the file at `path` as dict, without mapping it
+        """
+        with open(path, "rb") as file:
+            data = file.read()
+        if not data:
+            return {}
+        return {key: value for key, value, _ in _read_entries(data, HEADER.unpack_from(data)[0])}
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge_stopped(directory):
+    """
+    Adds the values of the files of stopped processes in `directory` to STOPPED_FILE and
+    removes them, so restarted workers do not leave a file each behind
+    """
+    stopped = []
+    for path in glob.glob(os.path.join(directory, PROCESS_FILE.format(pid="*"))):
+        pid = os.path.basename(path)[len("metrics-"):-len(".db")]
+        if pid.isdigit() and not _is_running(int(pid)):
+            stopped.append(path)
+    if not stopped:
+        return
+    merged = MmapValues(os.path.join(directory, STOPPED_FILE))
+    try:
+        for path in stopped:
+            values = MmapValues.read(path)
+            os.remove(path)
+            for key, value in values.items():
+                merged.inc(key, value)
+    finally:
+        merged.close()
+
+
+class DictValues(dict):
+    """
+    Float values by key of a single process
+    """
+
+    def inc(self, key, amount):
+        self[key] = self.get(key, 0.0) + amount
+
+
+class MetricsRegistry:
+    """
+    Metric values of the process. With settings.METRICS_MULTIPROCESS_DIR every process
+    (e.g. worker of a pre-forking server) writes its values to its own file in the directory
+    and `collect` sums the files of all processes, values of stopped processes included, so
+    counters never go backwards. The files of stopped processes are merged into one.
+    The values are only written under an uncontended lock, exposition reads the files.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._values = None
+
+    def _get_values(self):
+        # A forked worker must not write to the file of its parent
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            directory = settings.METRICS_MULTIPROCESS_DIR
+            if directory:
+                self._values = MmapValues(
+                    os.path.join(directory, PROCESS_FILE.format(pid=self._pid))
+                )
+            else:
+                self._values = DictValues()
+        return self._values
+
+    def inc_many(self, increments):
+        """
+        Adds the amounts of the (key, amount) pairs `increments` to their values
+        """
+        with self._lock:
+            values = self._get_values()
+            for key, amount in increments:
+                values.inc(key, amount)
+
+    def collect(self):
+        """
+        Returns the values by key summed over all processes. Locks the directory, so no
+        other process merges the files of stopped processes meanwhile.
+        """
+        directory = settings.METRICS_MULTIPROCESS_DIR
+        if not directory:
+            with self._lock:
+                return dict(self._get_values())
+        totals = {}
+        with open(os.path.join(directory, LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            _merge_stopped(directory)
+            for path in glob.glob(os.path.join(directory, "metrics-*.db")):
+                for key, value in MmapValues.read(path).items():
+                    totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def reset(self):
+        """
+        Drops the values of this process, e.g. between tests
+        """
+        with self._lock:
+            self._pid = None
+
+
+registry = MetricsRegistry()
+
+
+@functools.lru_cache(maxsize=4096)
+def _key(metric, labels, sample="", bucket=None):
+    """
+    Returns the key of a sample, `labels` is a tuple of (name, value) pairs
+    """
+    return json.dumps([metric, dict(labels), sample, bucket], separators=(",", ":"))
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+
+    def increments(self, labels, amount=1.0):
+        return [(_key(self.name, labels), amount)]
+
+
+class Histogram:
+    """
+    Histogram with fixed upper bounds `buckets`, each observation increments one bucket
+    and the exposition accumulates them
+    """
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+
+    def increments(self, labels, value):
+        bucket = bisect.bisect_left(self.buckets, value)
+        return [
+            (_key(self.name, labels, "_bucket", bucket), 1.0),
+            (_key(self.name, labels, "_sum"), value),
+            (_key(self.name, labels, "_count"), 1.0),
+        ]
+
+
+REQUESTS = Counter("http_requests_total", "Requests by view, method and status code.")
+LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latency of the requests by view.",
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+QUERIES = Histogram(
+    "http_request_queries",
+    "Database queries per request by view.",
+    (1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+METRICS = (REQUESTS, LATENCY, QUERIES)
+
+
+def _format_labels(labels):
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def exposition(values):
+    """
+    Returns `values` (see `MetricsRegistry.collect`) in the Prometheus text format
+    """
+    samples = {}
+    for key, value in values.items():
+        metric, labels, sample, bucket = json.loads(key)
+        label_text = _format_labels(labels)
+        samples.setdefault(metric, {}).setdefault(label_text, {})[(sample, bucket)] = value
+
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for label_text, series in sorted(samples.get(metric.name, {}).items()):
+            if metric.type == "counter":
+                lines.append(f"{metric.name}{{{label_text}}} {_format_value(series[('', None)])}")
+                continue
+            cumulative = 0.0
+            for bucket, bound in enumerate((*metric.buckets, "+Inf")):
+                cumulative += series.get(("_bucket", bucket), 0.0)
+                lines.append(
+                    f'{metric.name}_bucket{{{label_text},le="{bound}"}} {_format_value(cumulative)}'
+                )
+            for sample in ("_sum", "_count"):
+                lines.append(
+                    f"{metric.name}{sample}{{{label_text}}} "
+                    f"{_format_value(series.get((sample, None), 0.0))}"
+                )
+    return "\n".join(lines) + "\n"
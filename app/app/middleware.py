@@ -0,0 +1,304 @@
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework.permissions import SAFE_METHODS
+
+from app.metrics import LATENCY, QUERIES, REQUESTS, registry
+from app.routers import check_pinning_cache, pin_to_primary
+
+logger = logging.getLogger("app.server_timing")
+
+# Timing of the request in progress, None outside of ServerTimingMiddleware
+current_timing = contextvars.ContextVar("current_timing", default=None)
+
+# Callables (sql, duration) observing the SQL statements of the request in progress.
+# Context variables follow the request into the threads running its queries under ASGI.
+query_observers = contextvars.ContextVar("query_observers", default=())
+
+# Statements in the log line are cut to this length
+MAX_LOGGED_SQL = 200
+
+# Methods labeled as sent in the metrics, any other method is labeled "other"
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "TRACE", "CONNECT"}
+
+
+class RequestTiming:
+    """
+    Durations (seconds) of the phases of one request and statistics of its SQL statements
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest_sql = None
+        self.slowest_sql_time = 0.0
+        self.view_start = None
+        self.render_start = None
+
+    def add(self, phase, duration):
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+
+    def observe_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        if duration > self.slowest_sql_time:
+            self.slowest_sql, self.slowest_sql_time = sql, duration
+
+    def header(self, total):
+        """
+        Returns the value of the Server-Timing header, durations in milliseconds
+        """
+        metrics = [f"total;dur={total * 1000:.2f}"]
+        metrics += [f"{phase};dur={duration * 1000:.2f}" for phase, duration in self.phases.items()]
+        metrics.append(f'db;dur={self.sql_time * 1000:.2f};desc="{self.queries} queries"')
+        if self.slowest_sql is not None:
+            metrics.append(f"db-slowest;dur={self.slowest_sql_time * 1000:.2f}")
+        return ", ".join(metrics)
+
+
+def observe_queries(execute, sql, params, many, context):
+    """
+    Execute wrapper of all connections passing the statements to the `query_observers`
+    """
+    observers = query_observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        for observer in observers:
+            observer(sql, duration)
+
+
+def install_query_observer(connection):
+    if observe_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_queries)
+
+
+@receiver(connection_created)
+def connection_created_observer(sender, connection, **kwargs):
+    install_query_observer(connection)
+
+
+@contextmanager
+def timed(phase):
+    """
+    Adds the duration of the block to `phase` of the current request, if it is timed
+    """
+    timing = current_timing.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(phase, time.perf_counter() - start)
+
+
+class ObservingMiddleware:
+    """
+    Base of the middleware observing requests, it runs in the mode of the chain, so an async
+    chain (ASGI with async views) is not pushed onto a thread by it.
+    Subclasses implement `start(request)`, returning the state of the request, and
+    `finish(request, response, state)`, both run around the rest of the chain.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Marks the instance as coroutine function for the handler
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        # Connections opened before the signal receiver was connected
+        for connection in connections.all():
+            install_query_observer(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state, tokens = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self._reset(tokens)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state, tokens = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._reset(tokens)
+        return self.finish(request, response, state)
+
+    def _start(self, request):
+        state, context = self.start(request)
+        return state, [(var, var.set(value)) for var, value in context]
+
+    @staticmethod
+    def _reset(tokens):
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+    def start(self, request):
+        """
+        Returns the state of `request` and the (context variable, value) pairs set while
+        the rest of the chain runs
+        """
+        raise NotImplementedError
+
+    def finish(self, request, response, state):
+        raise NotImplementedError
+
+
+class ServerTimingMiddleware(ObservingMiddleware):
+    """
+    Times every request and adds a Server-Timing header with the total duration, the
+    phases recorded with `timed` (e.g. "auth"), the view (including auth and queries), the
+    rendering of DRF responses and the count and time of the SQL statements. The same data,
+    along with the slowest statement, is logged as a JSON line to the "app.server_timing"
+    logger.
+    DRF renders its responses lazily after `finalize_response`, so the rendering is timed
+    from `process_template_response` to the post render callback of the response.
+    Under ASGI Django runs these two hooks on a thread, it is a debugging aid.
+    Enabled by settings.SERVER_TIMING_ENABLED, otherwise it is removed from the chain.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def start(self, request):
+        timing = RequestTiming()
+        observers = (*query_observers.get(), timing.observe_query)
+        return timing, [(current_timing, timing), (query_observers, observers)]
+
+    def finish(self, request, response, timing):
+        total = time.perf_counter() - timing.start
+        response.headers["Server-Timing"] = timing.header(total)
+        self.log(request, response, timing, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_timing.get().view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        timing = current_timing.get()
+        timing.render_start = time.perf_counter()
+        if timing.view_start is not None:
+            timing.add("view", timing.render_start - timing.view_start)
+
+        def rendered(response):
+            timing.add("render", time.perf_counter() - timing.render_start)
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def log(self, request, response, timing, total):
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        match = request.resolver_match
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 3),
+            **{f"{phase}_ms": round(seconds * 1000, 3) for phase, seconds in timing.phases.items()},
+            "queries": timing.queries,
+            "sql_ms": round(timing.sql_time * 1000, 3),
+            "slowest_sql_ms": round(timing.slowest_sql_time * 1000, 3),
+            "slowest_sql": timing.slowest_sql and timing.slowest_sql[:MAX_LOGGED_SQL],
+        }))
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, sql, duration):
+        self.count += 1
+
+
+class MetricsMiddleware(ObservingMiddleware):
+    """
+    Records the count, latency and number of queries of the requests by view (url name) in
+    the metrics registry, exposed by `app.views.MetricsView`.
+    Enabled by settings.METRICS_ENABLED, otherwise it is removed from the chain.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def start(self, request):
+        queries = QueryCounter()
+        return (time.perf_counter(), queries), [
+            (query_observers, (*query_observers.get(), queries))
+        ]
+
+    def finish(self, request, response, state):
+        start, queries = state
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        # Unmatched paths and unknown methods share one label each, so scanners cannot
+        # create series at will
+        view = (("view", match.url_name if match and match.url_name else "unmatched"),)
+        method = request.method if request.method in HTTP_METHODS else "other"
+        registry.inc_many([
+            *REQUESTS.increments(
+                (*view, ("method", method), ("status", str(response.status_code)))
+            ),
+            *LATENCY.increments(view, duration),
+            *QUERIES.increments(view, queries.count),
+        ])
+        return response
+
+
+class ReplicaPinningMiddleware(ObservingMiddleware):
+    """
+    Pins authenticated users to the primary database after a successful unsafe request
+    (POST, PUT, PATCH, DELETE), so their next reads see what they wrote although the
+    replicas lag behind, see `app.routers`.
+    Enabled when settings.DATABASE_REPLICAS is set, otherwise it is removed from the chain.
+    Checks on startup that the pins are stored in a cache shared by the processes, see
+    `check_pinning_cache`.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        check_pinning_cache()
+        super().__init__(get_response)
+
+    def start(self, request):
+        return None, []
+
+    def finish(self, request, response, state):
+        user = getattr(request, "user", None)
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+        ):
+            pin_to_primary(user)
+        return response
@@ -0,0 +1,110 @@
+import contextvars
+import logging
+import random
+import sqlite3
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Alias of the replica the request in progress reads from, None to read from the primary.
+# Set by `notes.mixins.ReplicaReadMixin` for the views allowed to read stale data.
+read_alias = contextvars.ContextVar("read_alias", default=None)
+
+PINNED_KEY = "db:pinned:{pk}"
+
+logger = logging.getLogger("app.routers")
+
+
+def _pinning_cache():
+    return caches[settings.DATABASE_REPLICA_PINNING["CACHE_ALIAS"]]
+
+
+def pin_to_primary(user):
+    """
+    Sends the reads of `user` to the primary for settings.DATABASE_REPLICA_PINNING["SECONDS"],
+    so they see their own writes while the replicas catch up
+    """
+    _pinning_cache().set(
+        PINNED_KEY.format(pk=user.pk), True, settings.DATABASE_REPLICA_PINNING["SECONDS"]
+    )
+
+
+def check_pinning_cache():
+    """
+    Pins have to reach every process of the server: raises ImproperlyConfigured for a cache
+    that stores nothing and warns about a cache in the memory of the process, where a pin
+    only sends the reads of that process to the primary (fine for a single process)
+    """
+    alias = settings.DATABASE_REPLICA_PINNING["CACHE_ALIAS"]
+    cache = _pinning_cache()
+    if isinstance(cache, DummyCache):
+        raise ImproperlyConfigured(f'Replica pins cannot be stored in the DummyCache "{alias}".')
+    if isinstance(cache, LocMemCache):
+        logger.warning(
+            'Replica pins are stored in the local memory cache "%s", other processes of the '
+            "server do not see them. Use a cache shared by all processes.",
+            alias,
+        )
+
+
+def is_pinned_to_primary(user):
+    return user.is_authenticated and _pinning_cache().get(PINNED_KEY.format(pk=user.pk), False)
+
+
+def choose_replica(user):
+    """
+    Returns the alias of a random replica for the reads of `user`, None if there are no
+    replicas or the user has to read from the primary
+    """
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas or is_pinned_to_primary(user):
+        return None
+    return random.choice(replicas)
+
+
+class ReplicaRouter:
+    """
+    Routes all writes to the primary ("default") and the reads of requests marked with
+    `read_alias` to that replica (settings.DATABASE_REPLICAS). Reads inside a transaction
+    stay on the primary, so they see its writes.
+    Replicas hold a copy of the primary, they are not migrated.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every database holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def copy_to_replica(alias):
+    """
+    Copies the SQLite primary to the SQLite database `alias`, the stand-in for replication
+    in development and benchmarks
+    """
+    primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+    if primary.vendor != "sqlite" or replica.vendor != "sqlite":
+        raise ImproperlyConfigured("Only SQLite databases can be copied to a replica.")
+    primary.ensure_connection()
+    replica.close()
+    target = sqlite3.connect(replica.settings_dict["NAME"])
+    try:
+        primary.connection.backup(target)
+    finally:
+        target.close()
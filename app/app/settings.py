@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +49,8 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = "authors.Author"
 
 MIDDLEWARE = [
+    "app.middleware.ServerTimingMiddleware",
+    "app.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -55,8 +58,21 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "app.middleware.ReplicaPinningMiddleware",
 ]
 
+# Server-Timing header and timing log line of every request, see app.middleware
+SERVER_TIMING_ENABLED = DEBUG
+
+# Request metrics by view served at /metrics/, see app.metrics
+METRICS_ENABLED = True
+# Directory shared by all worker processes of the server, each one writes its metrics to
+# its own file there and /metrics/ sums them. None keeps the metrics in the process.
+# The files of stopped processes are merged into metrics-stopped.db, processes are told
+# apart by pid, so the directory must not be shared across hosts or containers. Empty
+# it on deploys to reset the counters.
+METRICS_MULTIPROCESS_DIR = None
+
 ROOT_URLCONF = "app.urls"
 
 TEMPLATES = [
@@ -81,21 +97,138 @@ WSGI_APPLICATION = "app.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# SQLite tuned for concurrent requests, see app.sqlite.base: readers do not block the writer
+# (WAL), commits only sync at checkpoints, writers wait for the lock at BEGIN and statements
+# failing with "database is locked" are retried
+SQLITE_OPTIONS = {
+    "pragmas": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # KiB
+        "busy_timeout": 5000,  # ms
+        "temp_store": "MEMORY",
+    },
+    "transaction_mode": "IMMEDIATE",
+    "lock_retries": 3,
+    "lock_retry_backoff": 0.05,
+}
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        "ENGINE": "app.sqlite",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": SQLITE_OPTIONS,
+        # Connections are reused across the requests of a thread
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+    },
+    # Stand-in for a read replica in development, a copy of the primary refreshed by
+    # `manage.py sync_replica`. Only read from once listed in DATABASE_REPLICAS.
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.replica.sqlite3",
+        "TEST": {"MIRROR": "default"},
+    },
+}
+
+# Aliases of the databases the notes are partitioned across by author, set as comma
+# separated list in the environment, e.g. NOTE_SHARDS=shard_1,shard_2, see notes.sharding.
+# Every shard is migrated (`migrate --database <alias>`), tags are copied to all of them.
+# After changing the list run `manage.py rebalance_notes`. With sharding the notes have no
+# foreign keys to their authors and tags, they may be in other databases. Empty: all notes
+# are in "default", the replicas only serve unsharded data.
+NOTE_SHARDS = [alias for alias in os.environ.get("NOTE_SHARDS", "").split(",") if alias]
+
+# Local SQLite files for the shards missing in DATABASES, to try out sharding
+for alias in NOTE_SHARDS:
+    DATABASES.setdefault(alias, {
+        "ENGINE": "app.sqlite",
+        "NAME": BASE_DIR / f"db.{alias}.sqlite3",
+        "OPTIONS": SQLITE_OPTIONS,
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+    })
+
+DATABASE_ROUTERS = ["notes.sharding.ShardRouter", "app.routers.ReplicaRouter"]
+
+# Aliases of the read replicas of "default", e.g. ["replica"]. The list, detail (GET) and
+# tag views read from them, see app.routers
+DATABASE_REPLICAS = []
+
+# After a write, reads of the user go to the primary for SECONDS (more than the replication
+# lag). The pins are stored in the Django cache CACHE_ALIAS, which has to be shared by all
+# processes of the server (e.g. Redis or Memcached). The local memory cache below only
+# works for a single process, the replica pinning middleware warns about it on startup.
+DATABASE_REPLICA_PINNING = {
+    "SECONDS": 5,
+    "CACHE_ALIAS": "default",
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     }
 }
 
+# Cache used for the public note list, see notes.cache. With several processes it has to
+# be shared by them: in a local memory cache a write only invalidates the lists cached by
+# its own process, the others serve theirs for up to NOTES_PUBLIC_LIST_CACHE_TIMEOUT.
+NOTES_CACHE_ALIAS = "default"
+NOTES_PUBLIC_LIST_CACHE_TIMEOUT = 60
+
+# Number of notes fetched per query when streaming an export
+NOTES_EXPORT_CHUNK_SIZE = 1000
+# Number of notes written per bulk insert when importing
+NOTES_IMPORT_CHUNK_SIZE = 1000
+
+# Tombstones of deleted notes and tags are kept in the change log for RETENTION_DAYS by
+# `manage.py compact_changes`, clients that did not sync for longer have to sync anew.
+# Entries read per sync request by default and at most, see notes.changes
+NOTES_CHANGE_LOG = {
+    "RETENTION_DAYS": 30,
+    "PAGE_SIZE": 500,
+    "MAX_PAGE_SIZE": 1000,
+}
+
+# Note bodies of at least MIN_LENGTH bytes (None: never) are stored zlib compressed at
+# LEVEL in SQLite, see notes.fields
+NOTES_COMPRESSION = {
+    "MIN_LENGTH": 1024,
+    "LEVEL": 6,
+}
+
+# Values model_bakery generates for the custom fields in tests
+BAKER_CUSTOM_FIELDS_GEN = {
+    "notes.fields.CompressedTextField": "model_bakery.random_gen.gen_text",
+}
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
-        "rest_framework.authentication.BasicAuthentication",
+        "authors.authentication.CachedTokenAuthentication",
+        "authors.authentication.CachedBasicAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
 }
 
+# Cache for resolved auth tokens, see authors.authentication
+TOKEN_AUTH_CACHE = {
+    "TTL": 30,
+    "MAX_SIZE": 10000,
+    # Alias of a shared Django cache used as second tier, e.g. for several worker processes
+    "SHARED_CACHE_ALIAS": None,
+}
+
+# Cache for verified Basic auth credentials, see authors.authentication
+BASIC_AUTH_CACHE = {
+    "TTL": 60,
+    "CACHE_ALIAS": "default",
+}
+
+# URL names of the views accepting Basic auth, None for all views.
+# ["author-login"] limits it to exchanging the credentials for a token.
+BASIC_AUTH_URL_NAMES = None
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
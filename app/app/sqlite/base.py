@@ -0,0 +1,81 @@
+import random
+import sqlite3
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+# OPTIONS of this backend, the others are passed on to sqlite3.connect()
+BACKEND_OPTIONS = ("pragmas", "transaction_mode", "lock_retries", "lock_retry_backoff")
+TRANSACTION_MODES = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+
+
+def is_locked(error):
+    return isinstance(error, sqlite3.OperationalError) and "database is locked" in str(error)
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+    """
+    Retries statements failing with "database is locked" outside of a transaction (and the
+    BEGIN starting one) `lock_retries` times, sleeping `lock_retry_backoff` seconds doubled
+    after every attempt, with jitter. A statement inside a transaction is not retried: the
+    transaction may hold the lock the other connection waits for.
+    """
+    lock_retries = 0
+    lock_retry_backoff = 0.05
+
+    def _retry_locked(self, execute, *args):
+        attempt = 0
+        while True:
+            retry = not self.connection.in_transaction
+            try:
+                return execute(*args)
+            except sqlite3.OperationalError as error:
+                if not retry or not is_locked(error) or attempt >= self.lock_retries:
+                    raise
+            time.sleep(self.lock_retry_backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+
+    def execute(self, query, params=None):
+        return self._retry_locked(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._retry_locked(super().executemany, query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend for serving concurrent requests, configured by OPTIONS:
+    - "pragmas": PRAGMA name to value, applied to every new connection, e.g.
+      {"journal_mode": "WAL", "busy_timeout": 5000}
+    - "transaction_mode": "DEFERRED" (SQLite's default), "IMMEDIATE" or "EXCLUSIVE", how
+      atomic() begins transactions. IMMEDIATE takes the write lock at BEGIN, where waiting
+      for it is safe, instead of failing at the first write after a read.
+    - "lock_retries", "lock_retry_backoff": see SQLiteCursorWrapper
+    Connections are reused across requests with CONN_MAX_AGE as for every backend.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for name in BACKEND_OPTIONS:
+            params.pop(name, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict["OPTIONS"].get("pragmas", {}).items():
+            conn.execute(f"PRAGMA {name} = {value}").fetchall()
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        options = self.settings_dict["OPTIONS"]
+        cursor.lock_retries = options.get("lock_retries", 0)
+        cursor.lock_retry_backoff = options.get("lock_retry_backoff", 0.05)
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict["OPTIONS"].get("transaction_mode", "DEFERRED").upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f"Unknown SQLite transaction mode {mode!r}.")
+        self.cursor().execute(f"BEGIN {mode}")
@@ -0,0 +1,151 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from authors.models import Author
+from django.test import SimpleTestCase, override_settings
+from model_bakery import baker
+from rest_framework import status
+
+from app.metrics import (LATENCY, QUERIES, REQUESTS, MmapValues, exposition,
+                         registry)
+from app.tests.utils import APIViewTest
+
+
+class TestMetricsExposition(SimpleTestCase):
+    """
+    Test cases for the Prometheus text format of the metrics.
+    """
+
+    def setUp(self):
+        self.values = {}
+        for increments in (
+            REQUESTS.increments((("view", "note-list"), ("method", "GET"), ("status", "200"))),
+            LATENCY.increments((("view", "note-list"),), 0.003),
+            LATENCY.increments((("view", "note-list"),), 0.2),
+            QUERIES.increments((("view", "note-list"),), 4),
+        ):
+            for key, amount in increments:
+                self.values[key] = self.values.get(key, 0.0) + amount
+
+    def test_counter(self):
+        self.assertIn(
+            'http_requests_total{view="note-list",method="GET",status="200"} 1\n',
+            exposition(self.values),
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        text = exposition(self.values)
+        for line in (
+            'http_request_duration_seconds_bucket{view="note-list",le="0.005"} 1\n',
+            'http_request_duration_seconds_bucket{view="note-list",le="0.1"} 1\n',
+            'http_request_duration_seconds_bucket{view="note-list",le="0.25"} 2\n',
+            'http_request_duration_seconds_bucket{view="note-list",le="+Inf"} 2\n',
+            'http_request_duration_seconds_count{view="note-list"} 2\n',
+            'http_request_duration_seconds_sum{view="note-list"} 0.203\n',
+            'http_request_queries_bucket{view="note-list",le="3"} 0\n',
+            'http_request_queries_bucket{view="note-list",le="5"} 1\n',
+        ):
+            self.assertIn(line, text)
+
+
+class TestMmapValues(SimpleTestCase):
+    """
+    Test cases for the metric files shared between processes.
+    """
+
+    def test_values_are_read_by_other_processes(self):
+        """
+        Test that the values written to a file are read back, also after it had to grow.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics-1.db")
+            values = MmapValues(path)
+            keys = [f"key {i}" * 100 for i in range(500)]
+            for key in keys:
+                values.inc(key, 1.0)
+            values.inc(keys[0], 2.5)
+            read = MmapValues.read(path)
+            self.assertEqual(len(read), 500)
+            self.assertEqual(read[keys[0]], 3.5)
+            # A restarted process continues with its values
+            MmapValues(path).inc(keys[0], 1.0)
+            self.assertEqual(MmapValues.read(path)[keys[0]], 4.5)
+
+    def test_processes_are_summed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for pid, amount in ((1, 1.0), (2, 2.0)):
+                MmapValues(os.path.join(directory, f"metrics-{pid}.db")).inc("key", amount)
+            with override_settings(METRICS_MULTIPROCESS_DIR=directory):
+                self.assertEqual(registry.collect(), {"key": 3.0})
+
+    def test_files_of_stopped_processes_are_merged(self):
+        """
+        Test that the files of stopped processes are merged into one, without changing the
+        sums.
+        """
+        stopped = []
+        for _ in range(2):
+            process = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                                     capture_output=True, text=True, check=True)
+            stopped.append(int(process.stdout))
+        with tempfile.TemporaryDirectory() as directory:
+            for pid, amount in ((os.getpid(), 1.0), (stopped[0], 2.0), (stopped[1], 4.0)):
+                MmapValues(os.path.join(directory, f"metrics-{pid}.db")).inc("key", amount)
+            with override_settings(METRICS_MULTIPROCESS_DIR=directory):
+                for _ in range(2):
+                    self.assertEqual(registry.collect(), {"key": 7.0})
+            self.assertEqual(
+                sorted(name for name in os.listdir(directory) if name.endswith(".db")),
+                sorted([f"metrics-{os.getpid()}.db", "metrics-stopped.db"]),
+            )
+
+
+class TestMetricsView(APIViewTest):
+    """
+    Test cases for the metrics of the requests and their exposition.
+    """
+    url = "/metrics/"
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+
+    def test_requests_are_recorded(self):
+        self.get("/notes/note/list/")
+        self.app.get("/not/a/route/", expect_errors=True)
+        self.auth_user.is_staff = True
+        self.auth_user.save()
+
+        response = self.app.get(self.url, headers={"Authorization": f"Token {self.token.key}"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        self.assertIn(
+            'http_requests_total{view="note-list",method="GET",status="200"} 1', response.text
+        )
+        self.assertIn('http_request_queries_count{view="note-list"} 1', response.text)
+        self.assertIn('view="unmatched",method="GET",status="404"', response.text)
+
+    def test_unknown_methods_share_a_label(self):
+        self.app.request(
+            "/notes/note/list/", method="FOOBAR", expect_errors=True,
+            headers={"Authorization": f"Token {self.token.key}"},
+        )
+        self.assertIn(
+            '{"view":"note-list","method":"other","status":"405"}',
+            "".join(registry.collect()),
+        )
+
+    def test_admin_only(self):
+        response = self.get(self.url, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.app.get(self.url, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.renew_app()
+        admin = baker.make(Author, is_staff=True)
+        self.app.get("/notes/note/list/", user=admin)
+        self.assertEqual(registry.collect(), {})
@@ -0,0 +1,57 @@
+import json
+
+from django.test import override_settings
+from model_bakery import baker
+from notes.models import Note
+
+from app.tests.utils import APIViewTest
+
+
+def parse_server_timing(header):
+    """
+    Returns the metrics of a Server-Timing header as {name: {"dur": ..., "desc": ...}}
+    """
+    metrics = {}
+    for metric in header.split(", "):
+        name, *params = metric.split(";")
+        metrics[name] = dict(param.split("=", 1) for param in params)
+    return metrics
+
+
+@override_settings(SERVER_TIMING_ENABLED=True)
+class TestServerTimingMiddleware(APIViewTest):
+    """
+    Test cases for the `ServerTimingMiddleware`.
+    """
+    url = "/notes/note/list/"
+
+    def test_server_timing_header(self):
+        """
+        Test that the phases and the queries of a request are reported.
+        """
+        baker.make(Note, author=self.auth_user, _quantity=2)
+        response = self.app.get(self.url, headers={"Authorization": f"Token {self.token.key}"})
+        metrics = parse_server_timing(response.headers["Server-Timing"])
+
+        self.assertEqual(
+            set(metrics), {"total", "auth", "view", "render", "db", "db-slowest"}
+        )
+        self.assertGreaterEqual(float(metrics["total"]["dur"]), float(metrics["view"]["dur"]))
+        self.assertRegex(metrics["db"]["desc"], r'^"[1-9]\d* queries"$')
+
+    def test_log_line(self):
+        """
+        Test that the timing is logged as one JSON line with the slowest statement.
+        """
+        with self.assertLogs("app.server_timing", "INFO") as logs:
+            self.app.get(self.url, headers={"Authorization": f"Token {self.token.key}"})
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["view"], line["status"]), ("note-list", 200))
+        self.assertGreater(line["queries"], 0)
+        self.assertTrue(line["slowest_sql"].startswith("SELECT"))
+
+    @override_settings(SERVER_TIMING_ENABLED=False)
+    def test_disabled(self):
+        self.renew_app()
+        response = self.app.get(self.url, headers={"Authorization": f"Token {self.token.key}"})
+        self.assertNotIn("Server-Timing", response.headers)
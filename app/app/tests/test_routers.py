@@ -0,0 +1,202 @@
+import sqlite3
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from authors.authentication import token_cache
+from authors.models import Author
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connections, transaction
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django_webtest import TransactionWebTest
+from model_bakery import baker
+from notes.models import Note, Tag
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from app.middleware import ReplicaPinningMiddleware
+from app.routers import ReplicaRouter, copy_to_replica, read_alias
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class TestReplicaRouting(TransactionWebTest):
+    """
+    Test cases for routing the reads of the list and detail views to the replica, it mirrors
+    the primary in tests, so the data has to be committed.
+    """
+    databases = {"default", "replica"}
+    csrf_checks = False
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # The pins are in the local memory cache, the test server is a single process
+        patcher = patch("app.routers.logger")
+        patcher.start()
+        cls.addClassCleanup(patcher.stop)
+
+    def setUp(self):
+        super().setUp()
+        token_cache.clear()
+        cache.clear()
+        self.author = baker.make(Author)
+        self.token = Token.objects.get(user=self.author)
+        self.note = baker.make(Note, author=self.author, tags=[baker.make(Tag)])
+
+    def request(self, method, url, token=None, **kwargs):
+        """
+        Sends the request and returns (response, queries on the primary, queries on the replica).
+        """
+        headers = {"Authorization": f"Token {(token or self.token).key}"}
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica"]) as replica:
+            response = getattr(self.app, method)(url, headers=headers, **kwargs)
+        return response, primary, replica
+
+    def test_reads_go_to_the_replica(self):
+        """
+        Test that the list and detail views read from the replica, apart from authentication.
+        """
+        self.request("get", "/notes/tag/list/")
+        for url in ("/notes/note/list/", f"/notes/note/{self.note.pk}/", "/notes/tag/list/",
+                    f"/notes/tag/{self.note.tags.get().pk}/"):
+            response, primary, replica = self.request("get", url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(replica, url)
+            self.assertFalse(primary.captured_queries, url)
+
+    def test_writes_go_to_the_primary(self):
+        """
+        Test that writes and the reads of views not allowed to read stale data use the primary.
+        """
+        response, primary, replica = self.request(
+            "patch_json", f"/notes/note/{self.note.pk}/", params={"title": "new"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(primary)
+        self.assertFalse(replica)
+
+        response, primary, replica = self.request(
+            "post_json", "/notes/note/create/", params={"title": "title", "body": "body"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(replica)
+
+    def test_read_your_writes(self):
+        """
+        Test that a user reads from the primary after writing until the pin expires, other
+        users keep reading from the replica.
+        """
+        self.request("patch_json", f"/notes/note/{self.note.pk}/", params={"title": "new"})
+        _, primary, replica = self.request("get", "/notes/note/list/")
+        self.assertTrue(primary)
+        self.assertFalse(replica)
+
+        other = Token.objects.get(user=baker.make(Author))
+        _, _, replica = self.request("get", "/notes/note/list/", token=other)
+        self.assertTrue(replica)
+
+        cache.clear()
+        _, _, replica = self.request("get", "/notes/note/list/")
+        self.assertTrue(replica)
+
+    def test_failed_writes_do_not_pin(self):
+        """
+        Test that a rejected write does not send the reads of the user to the primary.
+        """
+        self.request("patch_json", f"/notes/note/{self.note.pk}/", params={"title": ""},
+                     expect_errors=True)
+        _, _, replica = self.request("get", "/notes/note/list/")
+        self.assertTrue(replica)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        """
+        Test that everything goes to the primary without replicas.
+        """
+        self.renew_app()
+        _, primary, replica = self.request("get", "/notes/note/list/")
+        self.assertTrue(primary)
+        self.assertFalse(replica)
+
+
+class TestReplicaRouter(TestCase):
+    """
+    Test cases for the decisions of `ReplicaRouter`.
+    """
+    databases = {"default", "replica"}
+
+    def test_reads_in_a_transaction_stay_on_the_primary(self):
+        router = ReplicaRouter()
+        token = read_alias.set("replica")
+        self.addCleanup(read_alias.reset, token)
+        with patch.object(connections["default"], "in_atomic_block", False):
+            self.assertEqual(router.db_for_read(Note), "replica")
+        with transaction.atomic():
+            self.assertIsNone(router.db_for_read(Note))
+        self.assertEqual(router.db_for_write(Note), "default")
+
+    @override_settings(DATABASE_REPLICAS=["replica"])
+    def test_replicas_are_not_migrated(self):
+        router = ReplicaRouter()
+        self.assertFalse(router.allow_migrate("replica", "notes"))
+        self.assertIsNone(router.allow_migrate("default", "notes"))
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class TestReplicaPinningCache(SimpleTestCase):
+    """
+    Test cases for the check of the cache storing the pins, see `check_pinning_cache`.
+    """
+
+    def make_middleware(self, backend, **options):
+        caches = {"default": {"BACKEND": f"django.core.cache.backends.{backend}", **options}}
+        with override_settings(CACHES=caches):
+            return ReplicaPinningMiddleware(lambda request: None)
+
+    def test_shared_cache(self):
+        with self.assertNoLogs("app.routers"), tempfile.TemporaryDirectory() as directory:
+            self.make_middleware("filebased.FileBasedCache", LOCATION=directory)
+
+    def test_local_memory_cache_warns(self):
+        with self.assertLogs("app.routers", "WARNING") as logs:
+            self.make_middleware("locmem.LocMemCache")
+        self.assertIn("other processes", logs.output[0])
+
+    def test_dummy_cache_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.make_middleware("dummy.DummyCache")
+
+
+class TestSyncReplicaCommand(TransactionTestCase):
+    """
+    Test cases for the `sync_replica` management command.
+    """
+
+    def test_copy(self):
+        """
+        Test that the replica file holds the data of the primary after the copy.
+        """
+        baker.make(Note, title="copied")
+        with tempfile.NamedTemporaryFile(suffix=".sqlite3") as file, \
+                patch.dict(connections["replica"].settings_dict, NAME=file.name):
+            call_command("sync_replica", "replica", stdout=StringIO())
+            replica = sqlite3.connect(file.name)
+            titles = replica.execute("SELECT title FROM notes_note").fetchall()
+            replica.close()
+        self.assertEqual(titles, [("copied",)])
+
+    def test_no_replicas(self):
+        with self.assertRaises(CommandError):
+            call_command("sync_replica")
+        with self.assertRaises(CommandError):
+            call_command("sync_replica", "unknown")
+
+    def test_copy_requires_sqlite(self):
+        with patch.object(connections["replica"], "vendor", "postgresql"):
+            with self.assertRaises(Exception):
+                copy_to_replica("replica")
@@ -0,0 +1,93 @@
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError
+from django.test import SimpleTestCase
+
+from app.sqlite.base import DatabaseWrapper
+
+
+class TestSQLiteBackend(SimpleTestCase):
+    """
+    Test cases for the tuned SQLite backend, on a database file of its own.
+    """
+
+    def setUp(self):
+        file = tempfile.NamedTemporaryFile(suffix=".sqlite3")
+        self.addCleanup(file.close)
+        self.name = file.name
+
+    def connect(self, **options):
+        database = DatabaseWrapper({
+            "NAME": self.name,
+            "OPTIONS": options,
+            "CONN_MAX_AGE": 0,
+            "CONN_HEALTH_CHECKS": False,
+            "AUTOCOMMIT": True,
+            "TIME_ZONE": None,
+            "TEST": {},
+        }, "tuned")
+        self.addCleanup(database.close)
+        return database
+
+    def lock(self):
+        """
+        Returns a second connection holding the write lock of the database.
+        """
+        other = sqlite3.connect(self.name, isolation_level=None)
+        self.addCleanup(other.close)
+        other.execute("BEGIN IMMEDIATE")
+        return other
+
+    def test_pragmas(self):
+        """
+        Test that the pragmas are applied to new connections and not passed to sqlite3.
+        """
+        database = self.connect(
+            pragmas={"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 1234},
+            transaction_mode="IMMEDIATE", lock_retries=1,
+        )
+        with database.cursor() as cursor:
+            pragmas = [
+                cursor.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in ("journal_mode", "synchronous", "busy_timeout")
+            ]
+        self.assertEqual(pragmas, ["wal", 1, 1234])
+
+    def test_transaction_mode(self):
+        """
+        Test that IMMEDIATE transactions take the write lock at BEGIN.
+        """
+        database = self.connect(transaction_mode="IMMEDIATE", pragmas={"busy_timeout": 0})
+        with database.cursor() as cursor:
+            cursor.execute("CREATE TABLE t (x)")
+        self.lock()
+        # What atomic() does
+        with self.assertRaises(OperationalError):
+            database.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+
+        with self.assertRaises(ImproperlyConfigured):
+            self.connect(transaction_mode="LAZY")._start_transaction_under_autocommit()
+
+    def test_locked_retries(self):
+        """
+        Test that a statement failing on the lock is retried with backoff until it is
+        released, up to `lock_retries` times.
+        """
+        database = self.connect(pragmas={"busy_timeout": 0}, lock_retries=2,
+                                lock_retry_backoff=0.01)
+        with database.cursor() as cursor:
+            cursor.execute("CREATE TABLE t (x)")
+        other = self.lock()
+        with patch("app.sqlite.base.time.sleep", side_effect=lambda _: other.rollback()) as sleep:
+            with database.cursor() as cursor:
+                cursor.execute("INSERT INTO t VALUES (%s)", [1])
+        self.assertEqual(sleep.call_count, 1)
+
+        self.lock()
+        with patch("app.sqlite.base.time.sleep") as sleep, self.assertRaises(OperationalError):
+            with database.cursor() as cursor:
+                cursor.execute("INSERT INTO t VALUES (%s)", [2])
+        self.assertEqual(sleep.call_count, 2)
@@ -1,6 +1,9 @@
 import json
+import re
 
 from authors.models import Author
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django_webtest import WebTest
 from django_webtest.response import DjangoWebtestResponse
 from model_bakery import baker
@@ -8,6 +11,64 @@ from rest_framework.authtoken.models import Token
 
 # pylint: disable=keyword-arg-before-vararg, dangerous-default-value
 
+# A plan step reading a whole table or index, not an index range ("SEARCH t USING INDEX i
+# (a=?)") or a virtual table like the full text search index
+FULL_SCAN = re.compile(r"^SCAN \w+( USING (COVERING )?INDEX \w+)?$")
+INDEX_SCAN = re.compile(r"^SCAN \w+ USING (COVERING )?INDEX \w+$")
+# The LIMIT of the outermost query
+LIMIT = re.compile(r"LIMIT \d+( OFFSET \d+)?$")
+# Plan nodes of subqueries returning one value, SQLite stops reading after the first row
+SCALAR_SUBQUERY = re.compile(r"^(CORRELATED )?SCALAR SUBQUERY")
+
+
+def full_table_scans(queries):
+    """
+    Runs EXPLAIN QUERY PLAN (SQLite) for the SELECT statements in `queries` captured by a
+    CaptureQueriesContext and returns the (sql, plan step) pairs scanning a whole table or
+    index. An index scan is bounded, and not returned, in the outermost query with a LIMIT
+    or in a scalar subquery, unless a temporary B-tree sorts the rows: SQLite reads the
+    index in order and stops at the limit.
+    """
+    scans = []
+    with connection.cursor() as cursor:
+        for query in queries:
+            if not query["sql"].startswith("SELECT"):
+                continue
+            cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+            plan = {node: (parent, step) for node, parent, _, step in cursor.fetchall()}
+            sorted_in = {parent for parent, step in plan.values() if "TEMP B-TREE" in step}
+            for parent, step in plan.values():
+                limited = (
+                    LIMIT.search(query["sql"]) if parent == 0
+                    else SCALAR_SUBQUERY.match(plan[parent][1])
+                )
+                if limited and parent not in sorted_in and INDEX_SCAN.match(step):
+                    continue
+                if FULL_SCAN.match(step):
+                    scans.append((query["sql"], step))
+    return scans
+
+
+def count_sqlite_steps(function):
+    """
+    Returns the number of SQLite virtual machine instructions (in tens) executed by
+    `function()` on the default connection, a measure of the rows its queries read
+    """
+    steps = 0
+
+    def progress():
+        nonlocal steps
+        steps += 1
+        return 0
+
+    connection.ensure_connection()
+    connection.connection.set_progress_handler(progress, 10)
+    try:
+        function()
+    finally:
+        connection.connection.set_progress_handler(None, 10)
+    return steps
+
 
 class APIViewTest(WebTest):
     csrf_checks = False
@@ -18,6 +79,18 @@ class APIViewTest(WebTest):
             self.auth_user = baker.make(Author)
             self.token = Token.objects.get(user=self.auth_user)
 
+    def assertNoFullTableScan(self, url, auth=True):
+        """
+        Asserts that no query of a GET on `url` reads a whole table (SQLite only).
+        """
+        if connection.vendor != "sqlite":
+            self.skipTest("EXPLAIN QUERY PLAN is SQLite specific")
+        headers = {"Authorization": f"Token {self.token.key}"} if auth else {}
+        with CaptureQueriesContext(connection) as queries:
+            self.app.get(url, headers=headers)
+        scans = full_table_scans(queries)
+        self.assertFalse(scans, "\n".join(f"{step}: {sql}" for sql, step in scans))
+
     def post(self, url, data=[], auth=None, headers={}, *args, **kwargs) -> DjangoWebtestResponse:
         auth = auth if auth is not None else self.auth
         if auth:
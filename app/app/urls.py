@@ -21,6 +21,8 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from app.views import MetricsView
+
 schema_view = get_schema_view(
    openapi.Info(
       title="Note-Taking API",
@@ -38,6 +40,8 @@ urlpatterns = [
             schema_view.with_ui('swagger'), name='schema-swagger-ui'),
     re_path(r'^docs/$',
             schema_view.with_ui('redoc'), name='schema-redoc'),
+    re_path(r"^metrics/$",
+            MetricsView.as_view(), name="metrics"),
     re_path(r"", include("authors.urls")),
     re_path(r"", include("notes.urls")),
 ]
@@ -0,0 +1,29 @@
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from app.metrics import exposition, registry
+
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = "text/plain"
+    format = "prometheus"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data.encode(self.charset) if isinstance(data, str) else str(data).encode()
+
+
+class MetricsView(APIView):
+    """
+    API view for retrieving the request metrics of all processes in the Prometheus text
+    format via GET. Only for admin users (is_staff).
+    """
+    permission_classes = [IsAdminUser]
+    renderer_classes = [PrometheusRenderer]
+
+    def get(self, request, *args, **kwargs):
+        response = Response(exposition(registry.collect()))
+        response["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+        return response
@@ -0,0 +1,245 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.crypto import salted_hmac
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import (BasicAuthentication,
+                                           TokenAuthentication,
+                                           get_authorization_header)
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from app.middleware import timed
+
+
+class LRUCache:
+    """
+    Thread safe in-process LRU cache whose entries expire `ttl` seconds after being set
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TokenCache:
+    """
+    Two tier cache for resolved tokens: an in-process LRU in front of an optional shared
+    Django cache (settings.TOKEN_AUTH_CACHE["SHARED_CACHE_ALIAS"]).
+    Deleting a token evicts it from the shared cache and the LRU of the current process,
+    other processes keep their entry until it expires after TTL seconds.
+    """
+    key_prefix = "auth:token:"
+
+    def __init__(self):
+        self.configure()
+
+    def configure(self):
+        config = settings.TOKEN_AUTH_CACHE
+        self.local = LRUCache(config["MAX_SIZE"], config["TTL"])
+        self.ttl = config["TTL"]
+        self.shared_alias = config.get("SHARED_CACHE_ALIAS")
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(self.key_prefix + key)
+            if entry is not None:
+                self.local.set(key, entry)
+        return entry
+
+    def set(self, key, entry):
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(self.key_prefix + key, entry, self.ttl)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(self.key_prefix + key)
+
+    def clear(self):
+        self.local.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication caching the token -> user resolution, so warm requests do not
+    query authtoken_token joined with authors_author.
+    Entries are evicted when the token is deleted (which includes rotating it) and when its
+    user is saved, e.g. deactivated (see authors.models).
+    """
+
+    def authenticate(self, request):
+        with timed("auth"):
+            return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        if entry is None:
+            entry = super().authenticate_credentials(key)
+            token_cache.set(key, entry)
+        return entry
+
+
+async def aauthenticate_token(request):
+    """
+    Async counterpart of `CachedTokenAuthentication` for async views, sharing its cache.
+    Returns (user, token) for a valid "Authorization: Token <key>" header, None without
+    one, and raises AuthenticationFailed for an invalid token.
+    """
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b"token":
+        return None
+    if len(auth) == 1:
+        raise AuthenticationFailed(_("Invalid token header. No credentials provided."))
+    if len(auth) > 2:
+        msg = _("Invalid token header. Token string should not contain spaces.")
+        raise AuthenticationFailed(msg)
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        msg = _("Invalid token header. Token string should not contain invalid characters.")
+        raise AuthenticationFailed(msg)
+
+    with timed("auth"):
+        entry = token_cache.get(key)
+        if entry is None:
+            try:
+                token = await Token.objects.select_related("user").aget(key=key)
+            except Token.DoesNotExist:
+                raise AuthenticationFailed(_("Invalid token."))
+            if not token.user.is_active:
+                raise AuthenticationFailed(_("User inactive or deleted."))
+            entry = (token.user, token)
+            token_cache.set(key, entry)
+    return entry
+
+
+class CredentialCache:
+    """
+    Cache of verified Basic auth credentials in the Django cache
+    settings.BASIC_AUTH_CACHE["CACHE_ALIAS"], shared by all processes.
+    Entries are keyed by a HMAC of username and password under the SECRET_KEY, so neither
+    is stored, and by a per-username generation that is bumped when the password changes.
+    """
+    key_prefix = "auth:basic:"
+    hmac_salt = "authors.authentication.CredentialCache"
+
+    @property
+    def cache(self):
+        return caches[settings.BASIC_AUTH_CACHE["CACHE_ALIAS"]]
+
+    def generation_key(self, username):
+        return f"{self.key_prefix}generation:{salted_hmac(self.hmac_salt, username).hexdigest()}"
+
+    def get_generation(self, username):
+        generation_key = self.generation_key(username)
+        generation = self.cache.get(generation_key)
+        if generation is None:
+            # Start from the clock, so a lost counter never hands out a generation that was used
+            self.cache.add(generation_key, time.time_ns(), timeout=None)
+            generation = self.cache.get(generation_key)
+        return generation
+
+    def key(self, username, password):
+        digest = salted_hmac(self.hmac_salt, f"{username}\0{password}").hexdigest()
+        return f"{self.key_prefix}{self.get_generation(username)}:{digest}"
+
+    def get(self, username, password):
+        return self.cache.get(self.key(username, password))
+
+    def set(self, username, password, entry):
+        self.cache.set(self.key(username, password), entry, settings.BASIC_AUTH_CACHE["TTL"])
+
+    def fingerprint(self, user):
+        """
+        Returns a digest of the password hash `user` was verified against, cached instead
+        of the hash itself
+        """
+        return salted_hmac(self.hmac_salt, user.password).hexdigest()
+
+    def invalidate(self, username):
+        """
+        Drops all cached credentials of `username`
+        """
+        self.cache.set(self.generation_key(username), time.time_ns(), timeout=None)
+
+
+credential_cache = CredentialCache()
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    Basic authentication remembering verified credentials for a few seconds, so only the
+    first request of a client runs the (deliberately slow) password hasher. Warm requests
+    load the author by primary key and check that the password it was verified against is
+    still current and that the author is still active.
+    Only views named in settings.BASIC_AUTH_URL_NAMES accept Basic auth, all views do when
+    the setting is None.
+    """
+
+    def authenticate(self, request):
+        url_names = settings.BASIC_AUTH_URL_NAMES
+        match = request.resolver_match
+        if url_names is not None and (match is None or match.url_name not in url_names):
+            return None
+        with timed("auth"):
+            return super().authenticate(request)
+
+    def authenticate_credentials(self, userid, password, request=None):
+        entry = credential_cache.get(userid, password)
+        if entry is not None:
+            pk, fingerprint = entry
+            user = get_user_model().objects.filter(pk=pk).first()
+            if (
+                user is not None
+                and user.is_active
+                and user.get_username() == userid
+                and credential_cache.fingerprint(user) == fingerprint
+            ):
+                return (user, None)
+
+        user, auth = super().authenticate_credentials(userid, password, request)
+        credential_cache.set(userid, password, (user.pk, credential_cache.fingerprint(user)))
+        return (user, auth)
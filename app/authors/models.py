@@ -1,5 +1,7 @@
+from authors.authentication import credential_cache, token_cache
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 
@@ -11,6 +13,12 @@ class Author(AbstractUser):
     This is the main user model
     """
 
+    def save(self, *args, **kwargs):
+        password_changed = self._password is not None
+        super().save(*args, **kwargs)
+        if password_changed:
+            credential_cache.invalidate(self.get_username())
+
     def __str__(self):
         return self.username
 
@@ -22,3 +30,27 @@ def author_post_save(sender, instance=None, created=False, **kwargs):
     """
     if created:
         Token.objects.create(user=instance)
+
+
+@receiver(post_save, sender=AUTH_USER_MODEL)
+def author_evict_tokens(sender, instance=None, created=False, **kwargs):
+    """
+    Evict the cached tokens of a changed author, e.g. after a deactivation
+    """
+    if not created:
+        for key in Token.objects.filter(user=instance).values_list("key", flat=True):
+            token_cache.delete(key)
+
+
+@receiver(post_delete, sender=Token)
+def token_post_delete(sender, instance=None, **kwargs):
+    """
+    Evict deleted or rotated tokens from the token cache
+    """
+    token_cache.delete(instance.key)
+
+
+@receiver(setting_changed)
+def token_cache_setting_changed(setting, **kwargs):
+    if setting == "TOKEN_AUTH_CACHE":
+        token_cache.configure()
@@ -0,0 +1,221 @@
+import base64
+from unittest.mock import patch
+
+from authors.authentication import LRUCache, token_cache
+from authors.models import Author
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from app.tests.utils import APIViewTest
+
+
+class TestLRUCache(SimpleTestCase):
+    """
+    Test cases for the `LRUCache` of the token authentication.
+    """
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_entries_expire(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        with patch("authors.authentication.time.monotonic", return_value=0):
+            cache.set("a", 1)
+        with patch("authors.authentication.time.monotonic", return_value=59):
+            self.assertEqual(cache.get("a"), 1)
+        with patch("authors.authentication.time.monotonic", return_value=61):
+            self.assertIsNone(cache.get("a"))
+
+
+class TestCachedTokenAuthentication(APIViewTest):
+    """
+    Test cases for `CachedTokenAuthentication`.
+    """
+    url = "/notes/tag/list/"
+
+    def setUp(self):
+        super().setUp()
+        token_cache.clear()
+
+    def request(self, expect_errors=False):
+        """
+        Returns the response and the queries of a request authenticated by the token only.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.app.get(
+                self.url,
+                headers={"Authorization": f"Token {self.token.key}"},
+                expect_errors=expect_errors,
+            )
+        token_queries = [query for query in queries if '"authtoken_token"' in query["sql"]]
+        return response, token_queries
+
+    def test_warm_request_does_not_query_token(self):
+        """
+        Test that only the first request resolves the token in the database.
+        """
+        _, cold = self.request()
+        response, warm = self.request()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(cold), 1)
+        self.assertEqual(warm, [])
+
+    def test_deleted_token_is_evicted(self):
+        """
+        Test that a deleted (or rotated) token is rejected right away.
+        """
+        self.request()
+        self.token.delete()
+        response, _ = self.request(expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_author_is_evicted(self):
+        """
+        Test that the token of a deactivated author is rejected right away.
+        """
+        self.request()
+        self.auth_user.is_active = False
+        self.auth_user.save()
+        response, _ = self.request(expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_token_is_not_cached(self):
+        """
+        Test that unknown tokens are rejected and looked up again on every request.
+        """
+        self.token.delete()
+        self.token = Token(key="0" * 40)
+        for _ in range(2):
+            response, queries = self.request(expect_errors=True)
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(len(queries), 1)
+
+    @override_settings(
+        TOKEN_AUTH_CACHE={"TTL": 30, "MAX_SIZE": 10, "SHARED_CACHE_ALIAS": "default"}
+    )
+    def test_shared_cache_tier(self):
+        """
+        Test that a token resolved by another process is found in the shared cache.
+        """
+        self.request()
+        token_cache.local.clear()
+        _, queries = self.request()
+        self.assertEqual(queries, [])
+
+        self.token.delete()
+        response, _ = self.request(expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestCachedBasicAuthentication(APIViewTest):
+    """
+    Test cases for `CachedBasicAuthentication`.
+    """
+    url = "/notes/tag/list/"
+    password = "paSsw0rd"
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.auth_user.set_password(self.password)
+        self.auth_user.save()
+
+    def request(self, password=None, url=None, expect_errors=False):
+        credentials = f"{self.auth_user.username}:{password or self.password}"
+        return self.app.get(
+            url or self.url,
+            headers={"Authorization": f"Basic {base64.b64encode(credentials.encode()).decode()}"},
+            expect_errors=expect_errors,
+        )
+
+    def count_hasher_calls(self, *requests):
+        with patch.object(Author, "check_password", autospec=True,
+                          side_effect=Author.check_password) as check_password:
+            responses = [self.request(**kwargs) for kwargs in requests]
+        return responses, check_password.call_count
+
+    def test_warm_request_skips_hasher(self):
+        """
+        Test that only the first request verifies the password with the hasher.
+        """
+        responses, calls = self.count_hasher_calls({}, {}, {})
+        self.assertEqual([r.status_code for r in responses], [status.HTTP_200_OK] * 3)
+        self.assertEqual(calls, 1)
+
+    def test_wrong_password_is_rejected(self):
+        """
+        Test that other passwords are verified and rejected after a successful request.
+        """
+        responses, calls = self.count_hasher_calls(
+            {}, {"password": "wrong", "expect_errors": True}
+        )
+        self.assertEqual(responses[1].status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(calls, 2)
+
+    def test_password_change_invalidates(self):
+        """
+        Test that the old password is rejected right after changing it.
+        """
+        self.request()
+        self.auth_user.set_password("n3wPassword")
+        self.auth_user.save()
+        response = self.request(expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.request(password="n3wPassword")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_password_update_outside_save_is_detected(self):
+        """
+        Test that a password changed by a queryset update is not served from the cache.
+        """
+        self.request()
+        Author.objects.filter(pk=self.auth_user.pk).update(password="!")
+        response = self.request(expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_author_is_rejected(self):
+        """
+        Test that the credentials of a deactivated author are rejected right away.
+        """
+        self.request()
+        Author.objects.filter(pk=self.auth_user.pk).update(is_active=False)
+        response = self.request(expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(BASIC_AUTH_URL_NAMES=["author-login"])
+    def test_limited_to_login(self):
+        """
+        Test that Basic auth can be limited to exchanging the credentials for a token.
+        """
+        response = self.request(expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        credentials = base64.b64encode(f"{self.auth_user.username}:{self.password}".encode())
+        response = self.app.post(
+            "/authors/login/", headers={"Authorization": f"Basic {credentials.decode()}"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json["token"], self.token.key)
+
+    def test_cold_cache_runs_hasher_on_every_request(self):
+        """
+        Test that without cached credentials every request runs the hasher, and none once
+        they are cached.
+        """
+        with patch.object(Author, "check_password", autospec=True,
+                          side_effect=Author.check_password) as check_password:
+            for _ in range(3):
+                cache.clear()
+                self.request()
+        self.assertEqual(check_password.call_count, 3)
+        _, calls = self.count_hasher_calls({}, {}, {})
+        self.assertEqual(calls, 0)
@@ -1,7 +1,11 @@
 from authors.models import Author
 from authors.serializers import SignUpSerializer
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.generics import CreateAPIView
 from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
 
 
 class SignUpAuthorView(CreateAPIView):
@@ -12,3 +16,17 @@ class SignUpAuthorView(CreateAPIView):
     queryset = Author.objects.all()
     permission_classes = (AllowAny,)
     serializer_class = SignUpSerializer
+
+
+class LoginAuthorView(ObtainAuthToken):
+    """
+    POST: Returns the auth token of an Author
+    required data: username, password
+    or the credentials as HTTP Basic authentication instead
+    """
+
+    def post(self, request, *args, **kwargs):
+        if isinstance(request.successful_authenticator, BasicAuthentication):
+            token, _ = Token.objects.get_or_create(user=request.user)
+            return Response({"token": token.key})
+        return super().post(request, *args, **kwargs)
@@ -1,6 +1,34 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def register_sqlite_functions(sender, connection, **kwargs):
+    """
+    Adds the SQL functions and the trigger indexing the queued changes of notes (see
+    `notes.search`) to new SQLite connections
+    """
+    from notes.fields import register_functions
+    from notes.search import install_drain_trigger
+
+    if connection.vendor == "sqlite":
+        register_functions(connection.connection)
+        install_drain_trigger(connection.connection)
+
+
+def notes_post_migrate(sender, using="default", **kwargs):
+    """
+    Reinstall the search index triggers, SQLite drops them whenever notes_note is remade
+    """
+    from notes.search import install_search_index
+
+    install_search_index(using)
 
 
 class NotesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "notes"
+
+    def ready(self):
+        post_migrate.connect(notes_post_migrate, sender=self)
+        connection_created.connect(register_sqlite_functions)
@@ -0,0 +1,203 @@
+import json
+
+from asgiref.sync import sync_to_async
+from authors.authentication import aauthenticate_token
+from django.contrib.auth.models import AnonymousUser
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views import View
+from notes.cache import bump_generation
+from notes.filters import NoteSearchFilter, NoteTagFilter
+from notes.models import Note, NoteChange, Tag
+from notes.pagination import NoteCursorPagination
+from notes.serializers import NoteReadSerializer, NoteWriteSerializer
+from notes.sharding import (current_shard, is_sharded, shard_for_author,
+                            shard_querysets)
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.pagination import Cursor
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def json_response(data, status=status.HTTP_200_OK, **kwargs):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False, **kwargs)
+
+
+async def load_tag_ids(notes):
+    """
+    Sets `tag_ids` of all `notes` from one query of the through table
+    """
+    tag_ids = {note.pk: [] for note in notes}
+    by_shard = {}
+    for note in notes:
+        by_shard.setdefault(note._state.db, []).append(note.pk)
+    for alias, note_ids in by_shard.items():
+        # Rows as model instances: Django 4.1 runs the query of values_list() iterables in
+        # the event loop on `aiterator`
+        rows = Note.tags.through.objects.using(alias).filter(note_id__in=note_ids)
+        async for row in rows.only("note_id", "tag_id").aiterator():
+            tag_ids[row.note_id].append(row.tag_id)
+    for note in notes:
+        note.tag_ids = tag_ids[note.pk]
+    return notes
+
+
+class AsyncAPIView(View):
+    """
+    Base of the async note views for ASGI deployments, they run on the event loop instead of
+    a thread per request. Requests are authenticated by token (see `aauthenticate_token`),
+    API errors are returned like DRF does.
+    """
+    authentication_required = True
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Authenticated by token like the DRF views, which are exempt from CSRF checks too
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            auth = await aauthenticate_token(request)
+            request.user, request.auth = auth or (AnonymousUser(), None)
+            if self.authentication_required and request.user.is_anonymous:
+                raise NotAuthenticated()
+            shard = None
+            if is_sharded() and request.user.is_authenticated:
+                shard = shard_for_author(request.user.pk)
+            token = current_shard.set(shard)
+            try:
+                return await super().dispatch(request, *args, **kwargs)
+            finally:
+                current_shard.reset(token)
+        except APIException as exc:
+            headers = {"WWW-Authenticate": "Token"} if exc.status_code == 401 else None
+            return json_response(
+                exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail},
+                status=exc.status_code,
+                headers=headers,
+            )
+
+
+class AsyncNoteListView(AsyncAPIView):
+    """
+    Async API view for retrieving a list of notes via GET, see `NoteListView`.
+    Takes the same "search", "tag", "match", "cursor" and "page_size" query params, but the
+    notes are always ordered by id (newest first) and paged forward only. Responses are not
+    cached and carry no ETag.
+    """
+    authentication_required = False
+    filter_backends = [NoteSearchFilter, NoteTagFilter]
+    search_fields = ["title", "body"]
+
+    async def get(self, request, *args, **kwargs):
+        drf_request = Request(request)
+        drf_request.user = request.user
+        queryset = Note.objects.visible_to(request.user)
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(drf_request, queryset, self)
+
+        pagination = NoteCursorPagination()
+        page_size = pagination.get_page_size(drf_request)
+        cursor = pagination.decode_cursor(drf_request)
+        if cursor is not None and cursor.position is not None:
+            queryset = queryset.filter(pk__lt=int(cursor.position))
+        # The newest notes of every queryset (see `MergedQuerySet`) and shard are merged
+        notes = []
+        for shard_queryset in shard_querysets(queryset.order_by("-id")):
+            notes += [note async for note in shard_queryset[:page_size + 1].aiterator()]
+        notes = sorted(notes, key=lambda note: note.pk, reverse=True)[:page_size + 1]
+
+        next_link = None
+        if len(notes) > page_size:
+            notes = notes[:page_size]
+            pagination.base_url = request.build_absolute_uri()
+            next_link = pagination.encode_cursor(Cursor(0, False, notes[-1].pk))
+        await load_tag_ids(notes)
+        return json_response({
+            "next": next_link,
+            "previous": None,
+            "results": NoteReadSerializer(notes, many=True).data,
+        })
+
+
+class AsyncNoteDetailView(AsyncAPIView):
+    """
+    Async API view for retrieving a note of the authenticated user via GET, see
+    `NoteDetailView`. Supports conditional requests via ETag / Last-Modified.
+    """
+
+    async def get(self, request, pk, *args, **kwargs):
+        try:
+            note = await Note.objects.filter(author=request.user).aget(pk=pk)
+        except Note.DoesNotExist:
+            raise NotFound()
+
+        # The same validators as the sync view, so cached responses are interchangeable
+        etag = quote_etag(f"{note.pk}-{note.version}-json")
+        last_modified = int(note.updated_at.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            await load_tag_ids([note])
+            response = json_response(NoteReadSerializer(note).data)
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = http_date(last_modified)
+        return response
+
+
+class AsyncNoteCreateView(AsyncAPIView):
+    """
+    Async API view for creating a new note via POST, see `NoteCreateView`.
+    Required: title:str, body:str
+    Optional: tags: list(Tag), is_public: Boolean
+    """
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return json_response(
+                {"detail": "JSON parse error."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = NoteWriteSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        tags = serializer.validated_data.pop("tags", [])
+
+        existing = {tag.pk async for tag in Tag.objects.filter(pk__in=tags).only("pk").aiterator()}
+        missing = [tag for tag in tags if tag not in existing]
+        if missing:
+            return json_response(
+                {"tags": [f'Invalid pk "{tag}" - object does not exist.' for tag in missing]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        note = await Note.objects.acreate(author=request.user, **serializer.validated_data)
+        tag_ids = list(dict.fromkeys(tags))
+        try:
+            await Note.tags.through.objects.abulk_create(
+                [Note.tags.through(note_id=note.pk, tag_id=tag) for tag in tag_ids]
+            )
+        except IntegrityError:
+            # The foreign key of a tag deleted in the meantime
+            deleted = True
+        else:
+            # The relations of sharded notes have no foreign keys, look the tags up again
+            deleted = await Tag.objects.filter(pk__in=tag_ids).acount() < len(tag_ids)
+        if deleted:
+            # Async code cannot run a transaction, remove the note with its relations
+            await Note.objects.filter(pk=note.pk).adelete()
+            return json_response(
+                {"tags": ["A tag was deleted while creating the note."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if tags:
+            # The bulk insert does not send m2m_changed, drop cached lists with the note and
+            # log the change of its tags
+            await sync_to_async(bump_generation)()
+            await sync_to_async(NoteChange.record_notes)([note], using=note._state.db)
+        note.tag_ids = tag_ids
+        return json_response(NoteReadSerializer(note).data, status=status.HTTP_201_CREATED)
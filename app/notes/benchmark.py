@@ -0,0 +1,803 @@
+import asyncio
+import io
+import itertools
+import json
+import platform
+import random
+import sqlite3
+import statistics
+import threading
+import time
+import tracemalloc
+import uuid
+from unittest.mock import patch
+
+import django
+from asgiref.sync import sync_to_async
+from authors.models import Author
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.db import (DEFAULT_DB_ALIAS, DatabaseError, connection,
+                       connections, transaction)
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from notes.fields import DECOMPRESS_FUNCTION
+from notes.models import Note, Tag
+from notes.renderers import ColumnarJSONRenderer
+from notes.serializers import NoteSerializer, ValuesSerializer
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from app.routers import copy_to_replica
+
+PASSWORD = "benchmark"
+# Savepoints of `_request` and the views are not counted as queries
+TRANSACTION_CONTROL = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+WORDS = (
+    "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike november "
+    "oscar papa quebec romeo sierra tango uniform victor whiskey xray yankee zulu"
+).split()
+
+
+SYLLABLES = "ka lo mi ne ru sa te vi do pe gu ha ji zo be fa ri ton mar sel".split()
+
+
+def _made_up_words(count, seed=0):
+    rng = random.Random(seed)
+    return ["".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(count)]
+
+
+# Vocabulary of the note bodies: WORDS followed by made up words, drawn from a Zipf
+# distribution like the words of natural language, so bodies compress and index alike
+VOCABULARY = WORDS + _made_up_words(5000)
+VOCABULARY_WEIGHTS = list(
+    itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1))
+)
+
+
+def _text(rng, words):
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+def _prose(rng, words):
+    """
+    Returns `words` words of the vocabulary in sentences of 5 to 20 words
+    """
+    sentences = []
+    while words > 0:
+        length = min(words, rng.randint(5, 20))
+        sentence = rng.choices(VOCABULARY, cum_weights=VOCABULARY_WEIGHTS, k=length)
+        sentences.append(" ".join(sentence).capitalize() + ".")
+        words -= length
+    return " ".join(sentences)
+
+
+def generate_dataset(notes, authors, tags, tags_per_note, tag_skew, public_ratio, seed,
+                     body_words=30, batch_size=5000):
+    """
+    Bulk creates `authors` authors (with tokens, all with the password PASSWORD), `tags`
+    tags and `notes` notes with bodies of `body_words` words (see `_prose`) spread evenly
+    over the authors. The tags of a note are drawn from a Zipf distribution with exponent
+    `tag_skew`, so a few tags are on most notes.
+    Returns the summary of the dataset for the report and the first author.
+    """
+    rng = random.Random(seed)
+    prefix = uuid.uuid4().hex[:8]
+    password = make_password(PASSWORD)
+
+    author_objs = Author.objects.bulk_create(
+        [Author(username=f"bench-{prefix}-{i}", password=password) for i in range(authors)],
+        batch_size=batch_size,
+    )
+    Token.objects.bulk_create(
+        [Token(key=Token.generate_key(), user=author) for author in author_objs],
+        batch_size=batch_size,
+    )
+    titles = [f"{prefix} tag {i}" for i in range(tags)]
+    tag_objs = Tag.objects.bulk_create(
+        [Tag(title=title, normalized_title=Tag.normalize_title(title)) for title in titles],
+        batch_size=batch_size,
+    )
+    weights = [1 / rank ** tag_skew for rank in range(1, tags + 1)]
+
+    Through = Note.tags.through
+    for start in range(0, notes, batch_size):
+        note_objs = Note.objects.bulk_create(
+            [
+                Note(
+                    title=_text(rng, 3),
+                    body=_prose(rng, body_words),
+                    author=author_objs[i % authors],
+                    is_public=rng.random() < public_ratio,
+                )
+                for i in range(start, min(start + batch_size, notes))
+            ]
+        )
+        Through.objects.bulk_create(
+            [
+                Through(note_id=note.pk, tag_id=tag.pk)
+                for note in note_objs
+                for tag in {*rng.choices(tag_objs, weights, k=tags_per_note)}
+            ],
+            batch_size=batch_size,
+        )
+
+    summary = {
+        "notes": notes,
+        "authors": authors,
+        "tags": tags,
+        "tags_per_note": tags_per_note,
+        "tag_skew": tag_skew,
+        "public_ratio": public_ratio,
+        "seed": seed,
+        "body_words": body_words,
+    }
+    return summary, author_objs[0]
+
+
+def _import_file():
+    lines = [{"title": "imported", "body": _text(random.Random(i), 10)} for i in range(100)]
+    file = io.BytesIO("".join(json.dumps(line) + "\n" for line in lines).encode())
+    file.name = "notes.ndjson"
+    return file
+
+
+def get_routes(author):
+    """
+    Returns the benchmarked requests, one for every route of notes.urls and authors.urls:
+    dicts of the url name, the method, the path and the request kwargs for `Client`.
+    Requests run as `author`, who needs notes and tags on them.
+    """
+    note = Note.objects.filter(author=author).order_by("pk").first()
+    tag = Tag.objects.filter(notes__author=author).order_by("-notes__pk").first()
+    token = {"HTTP_AUTHORIZATION": f"Token {Token.objects.get(user=author).key}"}
+    json_body = {"content_type": "application/json", **token}
+
+    def route(name, method, path, **kwargs):
+        return {"name": name, "method": method, "path": path, "kwargs": kwargs}
+
+    return [
+        route("note-list", "get", reverse("note-list"), **token),
+        route("note-list", "get", reverse("note-list")),
+        route("note-list", "get", f"{reverse('note-list')}?search={WORDS[0]}", **token),
+        route("note-list", "get", f"{reverse('note-list')}?tag={tag.pk}", **token),
+        route("note-list", "get", f"{reverse('note-list')}?fields=id,title,tags", **token),
+        route("note-list", "get", f"{reverse('note-list')}?format=columnar", **token),
+        route("note-detail", "get", reverse("note-detail", args=[note.pk]), **token),
+        route("note-detail", "get", f"{reverse('note-detail', args=[note.pk])}?exclude=body",
+              **token),
+        route("note-detail", "patch", reverse("note-detail", args=[note.pk]),
+              data={"title": "patched"}, **json_body),
+        route("note-detail", "delete", reverse("note-detail", args=[note.pk]), **token),
+        route("note-create", "post", reverse("note-create"),
+              data={"title": "title", "body": _text(random.Random(0), 30)}, **json_body),
+        route("note-bulk", "post", reverse("note-bulk"),
+              data=[{"op": "create", "title": "title", "body": "body"}] * 10, **json_body),
+        route("note-bulk", "post", reverse("note-bulk"),
+              data={"op": ["create"] * 10, "title": ["title"] * 10, "body": ["body"] * 10},
+              content_type=ColumnarJSONRenderer.media_type, **token),
+        route("note-export", "get", reverse("note-export"), **token),
+        route("note-changes", "get", reverse("note-changes"), **token),
+        route("note-import", "post", reverse("note-import"), data={"file": _import_file}, **token),
+        route("async-note-list", "get", reverse("async-note-list"), **token),
+        route("async-note-detail", "get", reverse("async-note-detail", args=[note.pk]), **token),
+        route("async-note-create", "post", reverse("async-note-create"),
+              data={"title": "title", "body": _text(random.Random(0), 30)}, **json_body),
+        route("tag-list", "get", reverse("tag-list"), **token),
+        route("tag-list", "get", f"{reverse('tag-list')}?format=columnar", **token),
+        route("tag-detail", "get", reverse("tag-detail", args=[tag.pk]), **token),
+        route("tag-create", "post", reverse("tag-create"), data={"title": "new tag"}, **json_body),
+        route("tag-resolve", "post", reverse("tag-resolve"),
+              data={"titles": [tag.title, "new tag"]}, **json_body),
+        route("author-signup", "post", reverse("author-signup"),
+              data={"username": "bench-signup", "password": PASSWORD}, **json_body),
+        route("author-login", "post", reverse("author-login"),
+              data={"username": author.username, "password": PASSWORD}),
+        route("author-logout", "post", reverse("author-logout"), **token),
+    ]
+
+
+def _request(client, route):
+    """
+    Sends the request of `route` in a savepoint that is rolled back, so writes (and
+    deletions) can be repeated and do not change the dataset
+    """
+    kwargs = dict(route["kwargs"])
+    data = kwargs.pop("data", None)
+    if kwargs.get("content_type") in ("application/json", ColumnarJSONRenderer.media_type):
+        data = json.dumps(data)
+    elif data is not None:
+        data = {key: value() if callable(value) else value for key, value in data.items()}
+    with transaction.atomic():
+        response = getattr(client, route["method"])(route["path"], data, **kwargs)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        transaction.set_rollback(True)
+    return response
+
+
+def _percentile(quantiles, percent):
+    return round(quantiles[percent - 1] * 1000, 3)
+
+
+def benchmark_route(client, route, iterations, warmup):
+    """
+    Returns the latency percentiles (ms) of `iterations` requests of `route` after `warmup`
+    requests and the size of the response body (bytes, None if streamed), along with the
+    queries and the peak of traced allocations (bytes) of one more request, traced
+    separately as tracing slows the requests down.
+    `iterations` must be at least 2.
+    """
+    for _ in range(warmup):
+        _request(client, route)
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = _request(client, route)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            _request(client, route)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    quantiles = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "name": route["name"],
+        "method": route["method"].upper(),
+        "path": route["path"],
+        "status": response.status_code,
+        "response_bytes": None if response.streaming else len(response.content),
+        "iterations": iterations,
+        "latency_ms": {
+            "p50": _percentile(quantiles, 50),
+            "p95": _percentile(quantiles, 95),
+            "p99": _percentile(quantiles, 99),
+            "mean": round(statistics.fmean(timings) * 1000, 3),
+        },
+        "queries": sum(not query["sql"].startswith(TRANSACTION_CONTROL) for query in queries),
+        "allocated_bytes": peak,
+    }
+
+
+def run_benchmark(dataset_options, iterations, warmup):
+    """
+    Generates a dataset, benchmarks every route against it and returns the report.
+    Everything runs in a transaction that is rolled back, the database is left as it was.
+    """
+    with transaction.atomic():
+        started = time.perf_counter()
+        dataset, author = generate_dataset(**dataset_options)
+        dataset["generation_seconds"] = round(time.perf_counter() - started, 3)
+
+        client = Client(HTTP_HOST="localhost")
+        results = [
+            benchmark_route(client, route, iterations, warmup) for route in get_routes(author)
+        ]
+        transaction.set_rollback(True)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+        },
+        "dataset": dataset,
+        "routes": results,
+    }
+
+
+def _latency_report(timings, elapsed, statuses):
+    quantiles = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "requests": len(timings),
+        "errors": sum(status >= 400 for status in statuses),
+        "requests_per_second": round(len(timings) / elapsed, 1),
+        "latency_ms": {"p50": _percentile(quantiles, 50), "p99": _percentile(quantiles, 99)},
+    }
+
+
+def _wsgi_environ(path, headers, method="GET", body=b""):
+    return {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": io.StringIO(),
+        "HTTP_HOST": "localhost",
+        "CONTENT_TYPE": "application/json" if body else "",
+        "CONTENT_LENGTH": str(len(body)),
+        **headers,
+    }
+
+
+def _drive_wsgi(environs, requests):
+    """
+    Sends `requests` requests from one thread per item of `environs`, callables returning
+    the WSGI environ of the next request of that client, to the WSGI application.
+    Returns the timings and statuses of every client and the elapsed seconds.
+    """
+    application = get_wsgi_application()
+    timings, statuses = [[] for _ in environs], [[] for _ in environs]
+    start = threading.Barrier(len(environs) + 1)
+
+    def client_thread(index):
+        def start_response(status, response_headers, exc_info=None):
+            statuses[index].append(int(status.split()[0]))
+
+        try:
+            start.wait()
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = application(environs[index](), start_response)
+                b"".join(response)
+                response.close()
+                timings[index].append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+
+    threads = [
+        threading.Thread(target=client_thread, args=[index]) for index in range(len(environs))
+    ]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return timings, statuses, time.perf_counter() - started
+
+
+def _run_wsgi(path, headers, clients, requests):
+    """
+    Sends `requests` GETs of `path` from each of `clients` threads to the WSGI application
+    """
+    timings, statuses, elapsed = _drive_wsgi(
+        [lambda: _wsgi_environ(path, headers)] * clients, requests
+    )
+    return _latency_report(sum(timings, []), elapsed, sum(statuses, []))
+
+
+async def _run_asgi(path, headers, clients, requests):
+    """
+    Sends `requests` GETs of `path` from each of `clients` tasks to the ASGI application,
+    all on one event loop
+    """
+    application = get_asgi_application()
+    timings, statuses = [], []
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "server": ("localhost", 80),
+        "headers": [(b"host", b"localhost")] + [
+            (key.removeprefix("HTTP_").lower().encode(), value.encode())
+            for key, value in headers.items()
+        ],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    async def client_task():
+        for _ in range(requests):
+            started = time.perf_counter()
+            await application(dict(scope), receive, send)
+            timings.append(time.perf_counter() - started)
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_task() for _ in range(clients)))
+        return _latency_report(timings, time.perf_counter() - started, statuses)
+    finally:
+        # The connections of the thread running the queries of the async views
+        await sync_to_async(connections.close_all)()
+
+
+def get_concurrency_routes(author):
+    """
+    Returns (name, path) pairs of the sync views and their async counterparts, requested
+    as `author`
+    """
+    note = Note.objects.filter(author=author).order_by("pk").first()
+    return [
+        ("note-list", reverse("note-list")),
+        ("async-note-list", reverse("async-note-list")),
+        ("note-detail", reverse("note-detail", args=[note.pk])),
+        ("async-note-detail", reverse("async-note-detail", args=[note.pk])),
+    ]
+
+
+def _delete_dataset(author):
+    prefix = author.username.rsplit("-", 1)[0]
+    Author.objects.filter(username__startswith=f"{prefix}-").delete()
+    Tag.objects.filter(title__startswith=f"{prefix.removeprefix('bench-')} tag ").delete()
+
+
+def run_concurrency_benchmark(dataset_options, client_counts, requests, replicas=()):
+    """
+    Generates a dataset and requests the sync note views from the WSGI application (one
+    thread per client) and the async views from the ASGI application (one task per client
+    on an event loop) with each of `client_counts` concurrent clients, sending `requests`
+    requests each. Returns the report.
+    With `replicas` (SQLite aliases) the dataset is copied to them and the sync views are
+    requested once more reading from the replicas.
+    The clients need the dataset committed, it is deleted afterwards.
+    """
+    started = time.perf_counter()
+    dataset, author = generate_dataset(**dataset_options)
+    dataset["generation_seconds"] = round(time.perf_counter() - started, 3)
+    headers = {"HTTP_AUTHORIZATION": f"Token {Token.objects.get(user=author).key}"}
+
+    results = []
+    try:
+        for alias in replicas:
+            copy_to_replica(alias)
+        for name, path in get_concurrency_routes(author):
+            async_view = name.startswith("async-")
+            for replica_aliases in ([], list(replicas)) if replicas and not async_view else ([],):
+                for clients in client_counts:
+                    if async_view:
+                        server = "asgi"
+                        result = asyncio.run(_run_asgi(path, headers, clients, requests))
+                    else:
+                        server = "wsgi"
+                        with override_settings(DATABASE_REPLICAS=replica_aliases):
+                            result = _run_wsgi(path, headers, clients, requests)
+                    results.append({
+                        "name": name,
+                        "server": server,
+                        "replicas": replica_aliases,
+                        "clients": clients,
+                        **result,
+                    })
+    finally:
+        _delete_dataset(author)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+        },
+        "dataset": dataset,
+        "results": results,
+    }
+
+
+# Connection settings of "default" compared by `run_sqlite_benchmark`: stock SQLite with
+# rollback journal and a connection per request, and settings.SQLITE_OPTIONS
+SQLITE_PROFILES = {
+    "stock": {"OPTIONS": {}, "CONN_MAX_AGE": 0},
+    "tuned": {"OPTIONS": settings.SQLITE_OPTIONS, "CONN_MAX_AGE": 600},
+}
+
+
+def _run_mixed(read_path, write_path, headers, clients, writers, requests):
+    """
+    Sends `requests` requests from each of `clients` threads to the WSGI application,
+    `writers` of them create notes, the others read the note list
+    """
+    body = json.dumps({"title": "title", "body": _text(random.Random(0), 30)}).encode()
+    environs = [lambda: _wsgi_environ(write_path, headers, "POST", body)] * writers + [
+        lambda: _wsgi_environ(read_path, headers)
+    ] * (clients - writers)
+    timings, statuses, elapsed = _drive_wsgi(environs, requests)
+    result = {
+        "requests_per_second": round(sum(map(len, timings)) / elapsed, 1),
+        "errors": sum(status >= 400 for status in sum(statuses, [])),
+    }
+    for kind, group in (("writes", slice(None, writers)), ("reads", slice(writers, None))):
+        if timings[group]:
+            result[kind] = _latency_report(sum(timings[group], []), elapsed,
+                                           sum(statuses[group], []))
+    return result
+
+
+def run_sqlite_benchmark(dataset_options, client_counts, requests, write_ratio):
+    """
+    Generates a dataset and runs concurrent readers of the note list and writers creating
+    notes against the WSGI application, a `write_ratio` share of each of `client_counts`
+    clients writing, once with every profile of SQLITE_PROFILES. Returns the report.
+    "default" has to use the app.sqlite backend. The clients need the dataset committed, it
+    is deleted afterwards along with the created notes.
+    """
+    started = time.perf_counter()
+    dataset, author = generate_dataset(**dataset_options)
+    dataset["generation_seconds"] = round(time.perf_counter() - started, 3)
+    headers = {"HTTP_AUTHORIZATION": f"Token {Token.objects.get(user=author).key}"}
+
+    results = []
+    try:
+        for profile, profile_settings in SQLITE_PROFILES.items():
+            # The journal mode is stored in the database file, it can only change while no
+            # other connection is open
+            connections.close_all()
+            with patch.dict(connections.settings[DEFAULT_DB_ALIAS], profile_settings):
+                pragmas = profile_settings["OPTIONS"].get("pragmas", {})
+                with connection.cursor() as cursor:
+                    cursor.execute(f'PRAGMA journal_mode = {pragmas.get("journal_mode", "DELETE")}')
+                for clients in client_counts:
+                    writers = min(clients, round(clients * write_ratio))
+                    result = _run_mixed(reverse("note-list"), reverse("note-create"), headers,
+                                        clients, writers, requests)
+                    results.append({
+                        "profile": profile,
+                        "clients": clients,
+                        "writers": writers,
+                        **result,
+                    })
+                connections.close_all()
+    finally:
+        _delete_dataset(author)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "sqlite": sqlite3.sqlite_version,
+        },
+        "dataset": dataset,
+        "results": results,
+    }
+
+
+# Storage of the note bodies compared by `run_compression_benchmark`
+COMPRESSION_PROFILES = {
+    "plain": {**settings.NOTES_COMPRESSION, "MIN_LENGTH": None},
+    "compressed": settings.NOTES_COMPRESSION,
+}
+
+
+def get_compression_routes(author, body_words):
+    """
+    Returns the benchmarked requests reading and writing note bodies, see `get_routes`
+    """
+    note = Note.objects.filter(author=author).order_by("pk").first()
+    token = {"HTTP_AUTHORIZATION": f"Token {Token.objects.get(user=author).key}"}
+    body = _prose(random.Random(0), body_words)
+
+    def route(name, method, path, **kwargs):
+        return {"name": name, "method": method, "path": path, "kwargs": kwargs}
+
+    return [
+        route("note-list", "get", reverse("note-list"), **token),
+        route("note-list", "get", f"{reverse('note-list')}?search={WORDS[0]}", **token),
+        route("note-detail", "get", reverse("note-detail", args=[note.pk]), **token),
+        route("note-detail", "patch", reverse("note-detail", args=[note.pk]),
+              data={"body": body}, content_type="application/json", **token),
+        route("note-create", "post", reverse("note-create"),
+              data={"title": "title", "body": body}, content_type="application/json", **token),
+    ]
+
+
+def _storage_report():
+    """
+    Returns the bytes of the note bodies as text and as stored, and of the pages of the
+    notes_note table (None if SQLite lacks the dbstat table)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT SUM(length(CAST({DECOMPRESS_FUNCTION}(body) AS BLOB))), "
+            f"SUM(length(CAST(body AS BLOB))) FROM notes_note"
+        )
+        text_bytes, stored_bytes = cursor.fetchone()
+        try:
+            cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = 'notes_note'")
+            table_bytes = cursor.fetchone()[0]
+        except DatabaseError:
+            table_bytes = None
+    return {"text_bytes": text_bytes, "stored_bytes": stored_bytes, "table_bytes": table_bytes}
+
+
+def run_compression_benchmark(dataset_options, iterations, warmup):
+    """
+    Generates the same dataset once with every profile of COMPRESSION_PROFILES and reports
+    the storage of the notes and the latency of the routes reading and writing bodies.
+    Everything runs in transactions that are rolled back, the database is left as it was.
+    """
+    results = []
+    for profile, compression in COMPRESSION_PROFILES.items():
+        with override_settings(NOTES_COMPRESSION=compression), transaction.atomic():
+            started = time.perf_counter()
+            dataset, author = generate_dataset(**dataset_options)
+            dataset["generation_seconds"] = round(time.perf_counter() - started, 3)
+
+            client = Client(HTTP_HOST="localhost")
+            routes = get_compression_routes(author, dataset["body_words"])
+            results.append({
+                "profile": profile,
+                "compression": compression,
+                "dataset": dataset,
+                "storage": _storage_report(),
+                "routes": [benchmark_route(client, route, iterations, warmup) for route in routes],
+            })
+            transaction.set_rollback(True)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "sqlite": sqlite3.sqlite_version,
+        },
+        "results": results,
+    }
+
+
+def run_serializer_benchmark(dataset_options, list_size, repeat):
+    """
+    Generates a dataset and times the newest `list_size` notes read and serialized by
+    NoteSerializer from instances with prefetched tags and by ValuesSerializer from
+    values_list() rows (which reads the tags while serializing), then rendered to JSON.
+    Reports the best of `repeat` runs of each phase per note (µs) and whether both JSON are
+    identical. Every run serializes freshly read notes, bodies decompressed once are cached
+    by the instances.
+    Everything runs in a transaction that is rolled back, the database is left as it was.
+    """
+    with transaction.atomic():
+        started = time.perf_counter()
+        dataset, _ = generate_dataset(**dataset_options)
+        dataset["generation_seconds"] = round(time.perf_counter() - started, 3)
+        queryset = Note.objects.with_tags().order_by("-id")[:list_size]
+        values = ValuesSerializer(NoteSerializer())
+        paths = {
+            "model_serializer": (
+                lambda: list(queryset.all()),
+                lambda notes: NoteSerializer(notes, many=True).data,
+            ),
+            "values_serializer": (
+                lambda: list(values.values_list(queryset.all())),
+                values.to_representation,
+            ),
+        }
+
+        results, rendered = [], []
+        for name, (read, serialize) in paths.items():
+            timings = {"read": [], "serialize": [], "render": []}
+            for _ in range(repeat):
+                start = time.perf_counter()
+                notes = read()
+                read_end = time.perf_counter()
+                data = serialize(notes)
+                serialize_end = time.perf_counter()
+                content = JSONRenderer().render(data)
+                timings["read"].append(read_end - start)
+                timings["serialize"].append(serialize_end - read_end)
+                timings["render"].append(time.perf_counter() - serialize_end)
+            rendered.append(content)
+            per_note = {phase: min(seconds) for phase, seconds in timings.items()}
+            per_note["total"] = sum(per_note.values())
+            results.append({
+                "name": name,
+                "notes": len(notes),
+                "per_note_us": {
+                    phase: round(seconds / max(len(notes), 1) * 1e6, 2)
+                    for phase, seconds in per_note.items()
+                },
+            })
+        transaction.set_rollback(True)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+        },
+        "dataset": dataset,
+        "identical_json": all(content == rendered[0] for content in rendered),
+        "results": results,
+    }
+
+
+def get_bulk_routes(author, operation, size):
+    """
+    Returns the requests writing `size` notes of `author` ("create" or "update", updates
+    change the oldest notes) once per note with the note views and once with the bulk view,
+    see `get_routes`. Both write the same title, body and tag.
+    """
+    token = {"HTTP_AUTHORIZATION": f"Token {Token.objects.get(user=author).key}"}
+    tag = Tag.objects.order_by("pk").first()
+    data = {"title": "title", "body": _text(random.Random(0), 30), "tags": [str(tag.pk)]}
+
+    def route(name, method, path, data):
+        return {"name": name, "method": method, "path": path,
+                "kwargs": {"data": data, "content_type": "application/json", **token}}
+
+    if operation == "create":
+        per_note = [route("note-create", "post", reverse("note-create"), data)] * size
+        bulk = [{"op": "create", **data}] * size
+    else:
+        ids = list(Note.objects.filter(author=author).order_by("pk").values_list("pk", flat=True)
+                   [:size])
+        per_note = [
+            route("note-detail", "patch", reverse("note-detail", args=[pk]), data) for pk in ids
+        ]
+        bulk = [{"op": "update", "id": pk, **data} for pk in ids]
+    return {
+        "per_note": per_note,
+        "bulk": [route("note-bulk", "post", reverse("note-bulk"), bulk)],
+    }
+
+
+def _time_requests(client, routes, repeat):
+    """
+    Returns the best time (s) of `repeat` runs sending `routes` in one savepoint that is
+    rolled back, the statuses and the queries of one more run
+    """
+    timings = []
+    for _ in range(repeat):
+        with transaction.atomic():
+            start = time.perf_counter()
+            statuses = {_request(client, route).status_code for route in routes}
+            timings.append(time.perf_counter() - start)
+            transaction.set_rollback(True)
+    with CaptureQueriesContext(connection) as queries, transaction.atomic():
+        for route in routes:
+            _request(client, route)
+        transaction.set_rollback(True)
+    queries = sum(not query["sql"].startswith(TRANSACTION_CONTROL) for query in queries)
+    return min(timings), sorted(statuses), queries
+
+
+def run_bulk_benchmark(dataset_options, batch_sizes, repeat):
+    """
+    Generates a dataset and compares the throughput of writing batches of notes with one
+    request per note against one request to the bulk view, for creates and updates of every
+    size in `batch_sizes`. Reports the best of `repeat` runs in notes per second and the
+    queries per batch. Updates are limited to the notes of the benchmarked author.
+    Everything runs in a transaction that is rolled back, the database is left as it was.
+    """
+    with transaction.atomic():
+        started = time.perf_counter()
+        dataset, author = generate_dataset(**dataset_options)
+        dataset["generation_seconds"] = round(time.perf_counter() - started, 3)
+
+        client = Client(HTTP_HOST="localhost")
+        results = []
+        for operation, size in itertools.product(("create", "update"), batch_sizes):
+            paths = get_bulk_routes(author, operation, size)
+            notes = len(paths["per_note"])
+            result = {"operation": operation, "notes": notes}
+            for name, routes in paths.items():
+                seconds, statuses, queries = _time_requests(client, routes, repeat)
+                result[name] = {
+                    "statuses": statuses,
+                    "seconds": round(seconds, 6),
+                    "notes_per_second": round(notes / seconds, 1),
+                    "queries": queries,
+                }
+            result["speedup"] = round(result["per_note"]["seconds"] / result["bulk"]["seconds"], 2)
+            results.append(result)
+        transaction.set_rollback(True)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+        },
+        "dataset": dataset,
+        "results": results,
+    }
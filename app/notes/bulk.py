@@ -0,0 +1,106 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from notes.cache import bump_generation
+from notes.models import Note, NoteChange, Tag
+from notes.sharding import using_shard_of
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+
+NOTE_FIELDS = {"title", "body", "is_public"}
+OPERATION_STATUS = {
+    "create": status.HTTP_201_CREATED,
+    "update": status.HTTP_200_OK,
+    "delete": status.HTTP_204_NO_CONTENT,
+}
+
+
+def _check_references(author, operations):
+    """
+    Returns the notes of `author` referenced by update and delete operations by id.
+    Raises a ValidationError with the errors per operation if a note or tag does not exist
+    or a note is referenced more than once.
+    """
+    note_ids = [op["id"] for op in operations if op["op"] != "create"]
+    notes = Note.objects.filter(author=author).in_bulk(note_ids)
+    tag_ids = {tag_id for op in operations for tag_id in op.get("tags", ())}
+    existing_tag_ids = set(Tag.objects.filter(pk__in=tag_ids).values_list("pk", flat=True))
+
+    errors = [{} for _ in operations]
+    seen = set()
+    for error, op in zip(errors, operations):
+        if op["op"] != "create":
+            if op["id"] not in notes:
+                error["id"] = ["Not found."]
+            elif op["id"] in seen:
+                error["id"] = ["Only one operation per note is allowed."]
+            seen.add(op["id"])
+        missing_tags = [tag_id for tag_id in op.get("tags", ()) if tag_id not in existing_tag_ids]
+        if missing_tags:
+            error["tags"] = [
+                f'Invalid pk "{tag_id}" - object does not exist.' for tag_id in missing_tags
+            ]
+    if any(errors):
+        raise ValidationError(errors)
+    return notes
+
+
+def apply_operations(author, operations):
+    """
+    Applies validated bulk `operations` (see `NoteBulkOperationSerializer`) to the notes of
+    `author` in one transaction: one bulk insert for all created notes, one bulk update for
+    all changed notes, one delete, batched inserts into the tag through table and one
+    insert into the change log.
+    Either all operations are applied or, if any operation is invalid, none of them.
+    Returns one result per operation, in order: {"op": str, "id": int, "status": int}
+    """
+    Through = Note.tags.through
+    with using_shard_of(author) as alias, transaction.atomic(using=alias), NoteChange.batch():
+        notes = _check_references(author, operations)
+
+        # The note every operation applies to, new notes get their pk from the bulk insert
+        targets = [
+            Note(author=author) if op["op"] == "create" else notes[op["id"]] for op in operations
+        ]
+        update_fields = set()
+        for note, op in zip(targets, operations):
+            if op["op"] == "update":
+                update_fields.update(NOTE_FIELDS & op.keys())
+            if op["op"] != "delete":
+                for field in NOTE_FIELDS & op.keys():
+                    setattr(note, field, op[field])
+        created = [note for note, op in zip(targets, operations) if op["op"] == "create"]
+        updated = [note for note, op in zip(targets, operations) if op["op"] == "update"]
+        deleted = [note.pk for note, op in zip(targets, operations) if op["op"] == "delete"]
+
+        Note.objects.bulk_create(created)
+        if updated:
+            now = timezone.now()
+            for note in updated:
+                note.version = F("version") + 1
+                note.updated_at = now
+            Note.objects.bulk_update(updated, [*update_fields, "version", "updated_at"])
+        if deleted:
+            Note.objects.filter(pk__in=deleted).delete()
+
+        # Sent tags replace the tags of updated notes
+        tagged = [
+            (note, op) for note, op in zip(targets, operations)
+            if op["op"] != "delete" and "tags" in op
+        ]
+        Through.objects.filter(
+            note_id__in=[note.pk for note, op in tagged if op["op"] == "update"]
+        ).delete()
+        Through.objects.bulk_create(
+            Through(note_id=note.pk, tag_id=tag_id)
+            for note, op in tagged
+            for tag_id in set(op["tags"])
+        )
+        # Bulk operations bypass the model signals (the delete sends them)
+        NoteChange.record_notes([*created, *updated], using=alias)
+        bump_generation()
+
+    return [
+        {"op": op["op"], "id": note.pk, "status": OPERATION_STATUS[op["op"]]}
+        for note, op in zip(targets, operations)
+    ]
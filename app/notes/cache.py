@@ -0,0 +1,58 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import urlencode
+
+GENERATION_KEY = "notes:generation"
+PUBLIC_LIST_KEY = "notes:public-list:{generation}:{digest}"
+
+
+def get_cache():
+    return caches[settings.NOTES_CACHE_ALIAS]
+
+
+def get_generation():
+    """
+    Returns the current generation of the notes data. Every cached response is keyed by
+    it, so bumping the generation invalidates all of them at once.
+    """
+    cache = get_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Start from the clock, so a lost counter never hands out a generation that was used
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def _bump_generation():
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def bump_generation():
+    """
+    Invalidates all cached responses of notes data.
+    Bumps right away and again after the commit, so a response cached by a concurrent
+    request from not yet committed data is dropped as well. Only processes sharing the
+    cache see the bump, see settings.NOTES_CACHE_ALIAS.
+    """
+    _bump_generation()
+    transaction.on_commit(_bump_generation)
+
+
+def public_list_key(request):
+    """
+    Returns the cache key of the anonymous note list for the host, query params and
+    rendered format of `request` at the current generation.
+    """
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    fingerprint = f"{request.get_host()}:{request.accepted_renderer.format}?{params}"
+    digest = hashlib.md5(fingerprint.encode()).hexdigest()
+    return PUBLIC_LIST_KEY.format(generation=get_generation(), digest=digest)
@@ -0,0 +1,95 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+from notes.models import Note, NoteChange, NoteChangeHorizon, Tag
+from notes.serializers import NoteSerializer, TagSerializer
+from notes.sharding import ShardedQuerySet
+
+
+def get_horizon():
+    """
+    Returns the `seq` clients have to have synced past to get the changes since then
+    """
+    changes = NoteChangeHorizon.objects.using(DEFAULT_DB_ALIAS)
+    return changes.aggregate(seq=Max("seq"))["seq"] or 0
+
+
+def changes_since(request, since, limit):
+    """
+    Returns the changes of the notes and tags visible to the user of `request` after the
+    change `since`, up to `limit` log entries: the current state of every changed object,
+    in the order of its last change, or a tombstone if it was deleted or is no longer
+    visible. {"changes": [{"seq", "type", "id", "deleted", "data"}], "next_since": int,
+    "has_more": bool}
+    """
+    changes = NoteChange.objects.using(DEFAULT_DB_ALIAS).visible_to(request.user, since)
+    entries = list(changes.order_by("seq")[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Only the last change of an object counts, its state is read now
+    latest = {}
+    for entry in entries:
+        latest.pop((entry.model, entry.object_id), None)
+        latest[(entry.model, entry.object_id)] = entry
+    ids = {NoteChange.NOTE: [], NoteChange.TAG: []}
+    for (model, object_id), entry in latest.items():
+        if not entry.deleted:
+            ids[model].append(object_id)
+    notes = ShardedQuerySet.fan_out(Note.objects.with_tags().visible_to(request.user))
+    notes = NoteSerializer(
+        notes.filter(pk__in=ids[NoteChange.NOTE]), many=True, context={"request": request}
+    )
+    tags = TagSerializer(
+        Tag.objects.filter(pk__in=ids[NoteChange.TAG]), many=True, context={"request": request}
+    )
+    objects = {
+        NoteChange.NOTE: {str(note["id"]): note for note in notes.data},
+        NoteChange.TAG: {tag["uuid"]: tag for tag in tags.data},
+    }
+
+    results = []
+    for (model, object_id), entry in latest.items():
+        data = objects[model].get(object_id)
+        results.append({
+            "seq": entry.seq,
+            "type": model,
+            "id": int(object_id) if model == NoteChange.NOTE else object_id,
+            "deleted": data is None,
+            "data": data,
+        })
+    return {
+        "changes": results,
+        "next_since": entries[-1].seq if entries else since,
+        "has_more": has_more,
+    }
+
+
+def compact_changes(retention):
+    """
+    Bounds the size of the change log: drops the changes followed by a later change of
+    the same object, which clients never read, and the tombstones older than `retention`
+    (a timedelta), moving the horizon (see `NoteChangeHorizon`) past them.
+    Returns the counts of dropped entries: {"superseded": int, "tombstones": int}
+    """
+    changes = NoteChange.objects.using(DEFAULT_DB_ALIAS)
+    later = changes.filter(
+        model=OuterRef("model"), object_id=OuterRef("object_id"), seq__gt=OuterRef("seq")
+    )
+    earlier_public = changes.filter(
+        model=OuterRef("model"), object_id=OuterRef("object_id"), seq__lt=OuterRef("seq"),
+        public=True,
+    )
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        # A note that was public stays visible to everyone in the log, as a tombstone for
+        # the others if it is private now
+        changes.filter(~Exists(later), Exists(earlier_public), public=False).update(public=True)
+        superseded, _ = changes.filter(Exists(later)).delete()
+
+        tombstones = changes.filter(deleted=True, created_at__lt=timezone.now() - retention)
+        horizon = tombstones.aggregate(seq=Max("seq"))["seq"]
+        dropped = 0
+        if horizon is not None:
+            dropped, _ = tombstones.filter(seq__lte=horizon).delete()
+            NoteChangeHorizon.objects.using(DEFAULT_DB_ALIAS).create(seq=horizon)
+    return {"superseded": superseded, "tombstones": dropped}
@@ -0,0 +1,87 @@
+import zlib
+
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+# First byte of a compressed value, the format of the rest: a zlib stream of UTF-8 text
+ZLIB_MARKER = b"\x01"
+# Name of the SQL function reading the text of a stored value, see `register_functions`
+DECOMPRESS_FUNCTION = "notes_decompress"
+
+
+def compress(text):
+    """
+    Returns the value `text` is stored as: a marker followed by the compressed text if it
+    has at least settings.NOTES_COMPRESSION["MIN_LENGTH"] bytes and compression makes it
+    smaller, otherwise the text itself
+    """
+    options = settings.NOTES_COMPRESSION
+    data = text.encode()
+    if options["MIN_LENGTH"] is None or len(data) < options["MIN_LENGTH"]:
+        return text
+    compressed = ZLIB_MARKER + zlib.compress(data, options["LEVEL"])
+    return compressed if len(compressed) < len(data) else text
+
+
+def decompress(value):
+    """
+    Returns the text of a stored value, compressed (bytes) or not
+    """
+    if not isinstance(value, (bytes, memoryview)):
+        return value
+    value = bytes(value)
+    if value[:1] != ZLIB_MARKER:
+        raise ValueError(f"Unknown compression format {value[:1]!r}.")
+    return zlib.decompress(value[1:]).decode()
+
+
+def register_functions(connection):
+    """
+    Adds `notes_decompress(value)` to an SQLite connection, for the search index and
+    queries reading the text of compressed columns
+    """
+    connection.create_function(DECOMPRESS_FUNCTION, 1, decompress, deterministic=True)
+
+
+class CompressedTextAttribute(DeferredAttribute):
+    """
+    Keeps the stored value of a loaded instance until the attribute is read, then
+    decompresses it once
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, bytes):
+            value = instance.__dict__[self.field.attname] = decompress(value)
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """
+    TextField storing long values compressed (see `compress`) in SQLite, the column holds
+    text or a BLOB. Model instances decompress on access, a value that was not read is
+    saved again as stored, e.g. when notes are copied between shards. Other databases
+    store plain text.
+    The database only sees the stored values: lookups like `icontains` and values() /
+    values_list() do not decompress, wrap the column in `notes_decompress()` for that.
+    """
+    descriptor_class = CompressedTextAttribute
+
+    def pre_save(self, model_instance, add):
+        if self.attname in model_instance.__dict__:
+            return model_instance.__dict__[self.attname]
+        return super().pre_save(model_instance, add)
+
+    def get_db_prep_save(self, value, connection):
+        if connection.vendor != "sqlite":
+            return super().get_db_prep_save(decompress(value), connection)
+        if isinstance(value, bytes):
+            return value
+        value = super().get_db_prep_save(value, connection)
+        return value if value is None else compress(value)
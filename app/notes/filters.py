@@ -0,0 +1,87 @@
+import re
+
+from django.db.models import Count
+from notes.models import Note
+from notes.search import build_match_query, is_supported, search_notes
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+UUID_REGEX = re.compile(
+    "[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{12}"
+)
+
+
+class NoteSearchFilter(filters.SearchFilter):
+    """
+    Full text search for notes via the "search" query param.
+    Uses the FTS5 index over title and body (see `notes.search`) and ranks the results by
+    relevance. Databases without the index fall back to DRF's icontains search over
+    the view's `search_fields`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not is_supported(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+
+        match = build_match_query(request.query_params.get(self.search_param, ""))
+        if not match:
+            return queryset
+        return search_notes(queryset, match)
+
+
+class NoteTagFilter(filters.BaseFilterBackend):
+    """
+    Filter notes of the authenticated user by tags.
+    Query Params:
+        "tag" one or more tag uuids, e.g. ?tag=<uuid>+<uuid>
+        "match" how the tags are combined:
+            "all" (default) notes having every tag
+            "any" notes having at least one of the tags
+            "none" notes having none of the tags
+    All modes run as a single subquery on the tag through table, for "all" grouped by note
+    with HAVING COUNT = number of tags, so the cost does not grow with extra joins per tag.
+    """
+    tag_param = "tag"
+    match_param = "match"
+    match_modes = ("all", "any", "none")
+    max_tags = 20
+
+    def get_tag_ids(self, request):
+        """
+        Returns the distinct tag uuids found in the "tag" query param.
+        """
+        tag_query = request.query_params.get(self.tag_param, "")
+        return {tag_id.lower() for tag_id in UUID_REGEX.findall(tag_query)}
+
+    def filter_queryset(self, request, queryset, view):
+        tag_ids = self.get_tag_ids(request)
+        if not tag_ids:
+            return queryset
+
+        match = request.query_params.get(self.match_param, "all")
+        if match not in self.match_modes:
+            raise ValidationError(
+                {self.match_param: [f"Must be one of: {', '.join(self.match_modes)}."]}
+            )
+        if len(tag_ids) > self.max_tags:
+            raise ValidationError(
+                {self.tag_param: [f"Filter by at most {self.max_tags} tags."]}
+            )
+
+        tagged = Note.tags.through.objects.filter(tag_id__in=tag_ids).values("note_id")
+        if match == "all":
+            tagged = (
+                tagged.annotate(matched=Count("tag_id"))
+                .filter(matched=len(tag_ids))
+                .values("note_id")
+            )
+
+        if match == "none":
+            queryset = queryset.exclude(pk__in=tagged)
+        else:
+            queryset = queryset.filter(pk__in=tagged)
+
+        # Users filter their own notes via tags
+        if request.user.is_authenticated:
+            queryset = queryset.filter(author=request.user)
+        return queryset
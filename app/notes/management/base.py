@@ -0,0 +1,80 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+DATASET_OPTIONS = ("notes", "authors", "tags", "tags_per_note", "tag_skew", "public_ratio", "seed")
+
+
+class BenchmarkCommand(BaseCommand):
+    """
+    Base of the benchmark commands: the options of the generated dataset (see
+    `notes.benchmark.generate_dataset`) and the JSON report, written to stdout or to
+    --output with a summary of `summarize` on stdout.
+    Commands add their own options in `add_benchmark_arguments`, check them in
+    `check_options` and run in `run`.
+    """
+    # Defaults of the dataset options, "body_words" None leaves out --body-words
+    dataset_defaults = {"notes": 10000, "authors": 100, "tags": 1000, "body_words": None}
+
+    def add_arguments(self, parser):
+        defaults = self.dataset_defaults
+        parser.add_argument(
+            "--notes", type=int, default=defaults["notes"], help="e.g. 10000, 100000, 1000000"
+        )
+        parser.add_argument("--authors", type=int, default=defaults["authors"])
+        parser.add_argument("--tags", type=int, default=defaults["tags"])
+        parser.add_argument("--tags-per-note", type=int, default=3)
+        parser.add_argument(
+            "--tag-skew", type=float, default=1.1,
+            help="Exponent of the Zipf distribution of the tags, 0 for uniform",
+        )
+        parser.add_argument("--public-ratio", type=float, default=0.3)
+        parser.add_argument("--seed", type=int, default=0)
+        if defaults["body_words"] is not None:
+            parser.add_argument(
+                "--body-words", type=int, default=defaults["body_words"],
+                help="Words per note body, 1000 are about 7 KB",
+            )
+        self.add_benchmark_arguments(parser)
+        parser.add_argument("--output", help="File the JSON report is written to, default stdout")
+
+    def add_benchmark_arguments(self, parser):
+        pass
+
+    def check_options(self, options):
+        """
+        Raises a CommandError for invalid options of the benchmark
+        """
+
+    def run(self, dataset_options, options):
+        """
+        Returns the report of the benchmark
+        """
+        raise NotImplementedError
+
+    def summarize(self, report):
+        """
+        Yields the lines summing up `report`, written when the report goes to --output
+        """
+        return ()
+
+    def handle(self, *args, **options):
+        if options["notes"] < 1 or options["authors"] < 1 or options["tags"] < 1:
+            raise CommandError("--notes, --authors and --tags must be positive")
+        if options.get("body_words", 0) < 0:
+            raise CommandError("--body-words must not be negative")
+        self.check_options(options)
+
+        dataset_options = {key: options[key] for key in DATASET_OPTIONS}
+        if self.dataset_defaults["body_words"] is not None:
+            dataset_options["body_words"] = options["body_words"]
+        report = self.run(dataset_options, options)
+
+        if not options["output"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+        for line in self.summarize(report):
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
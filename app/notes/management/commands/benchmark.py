@@ -0,0 +1,32 @@
+from django.core.management.base import CommandError
+from notes.benchmark import run_benchmark
+from notes.management.base import BenchmarkCommand
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Benchmark every route of the notes and authors apps in-process against a generated "
+        "dataset and report latency percentiles, queries and allocations per request as JSON. "
+        "The dataset and all writes are rolled back afterwards."
+    )
+    dataset_defaults = {"notes": 10000, "authors": 100, "tags": 1000, "body_words": 30}
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50, help="Timed requests per route")
+        parser.add_argument("--warmup", type=int, default=5, help="Untimed requests per route")
+
+    def check_options(self, options):
+        if options["iterations"] < 2:
+            raise CommandError("--iterations must be at least 2")
+
+    def run(self, dataset_options, options):
+        return run_benchmark(dataset_options, options["iterations"], options["warmup"])
+
+    def summarize(self, report):
+        for result in report["routes"]:
+            yield (
+                f'{result["method"]:6} {result["path"]:60} {result["status"]} '
+                f'p50 {result["latency_ms"]["p50"]:8.2f}ms '
+                f'p99 {result["latency_ms"]["p99"]:8.2f}ms '
+                f'{result["queries"]:3} queries {result["allocated_bytes"]:>10} bytes'
+            )
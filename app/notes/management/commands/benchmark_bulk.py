@@ -0,0 +1,45 @@
+from django.core.management.base import CommandError
+from notes.benchmark import run_bulk_benchmark
+from notes.management.base import BenchmarkCommand
+from notes.views import NoteBulkView
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Benchmark the throughput of the bulk notes endpoint against one request per note, "
+        "for batches of creates and updates, reported as JSON. The dataset and all writes "
+        "are rolled back afterwards."
+    )
+    dataset_defaults = {"notes": 5000, "authors": 5, "tags": 100, "body_words": None}
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument(
+            "--batch-sizes", default="1,10,100,1000",
+            help="Comma separated numbers of notes written per batch",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Runs, the best one counts")
+
+    def check_options(self, options):
+        try:
+            options["batch_sizes"] = [int(size) for size in options["batch_sizes"].split(",")]
+        except ValueError:
+            raise CommandError("--batch-sizes must be a comma separated list of integers")
+        if not all(0 < size <= NoteBulkView.max_operations for size in options["batch_sizes"]):
+            raise CommandError(
+                f"--batch-sizes must be between 1 and {NoteBulkView.max_operations}"
+            )
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be positive")
+
+    def run(self, dataset_options, options):
+        return run_bulk_benchmark(dataset_options, options["batch_sizes"], options["repeat"])
+
+    def summarize(self, report):
+        for result in report["results"]:
+            per_note, bulk = result["per_note"], result["bulk"]
+            yield (
+                f'{result["operation"]:6} {result["notes"]:5} notes: '
+                f'per note {per_note["notes_per_second"]:9.1f}/s ({per_note["queries"]} queries) '
+                f'bulk {bulk["notes_per_second"]:9.1f}/s ({bulk["queries"]} queries) '
+                f'x{result["speedup"]}'
+            )
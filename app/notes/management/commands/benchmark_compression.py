@@ -0,0 +1,40 @@
+from django.core.management.base import CommandError
+from notes.benchmark import run_compression_benchmark
+from notes.management.base import BenchmarkCommand
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Benchmark note bodies stored as plain text against settings.NOTES_COMPRESSION: "
+        "report the size of the notes table and the latency of the routes reading and "
+        "writing bodies as JSON. The dataset and all writes are rolled back afterwards."
+    )
+    dataset_defaults = {"notes": 5000, "authors": 50, "tags": 100, "body_words": 1000}
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50, help="Timed requests per route")
+        parser.add_argument("--warmup", type=int, default=5, help="Untimed requests per route")
+
+    def check_options(self, options):
+        if options["iterations"] < 2:
+            raise CommandError("--iterations must be at least 2")
+
+    def run(self, dataset_options, options):
+        return run_compression_benchmark(
+            dataset_options, options["iterations"], options["warmup"]
+        )
+
+    def summarize(self, report):
+        for result in report["results"]:
+            storage = result["storage"]
+            yield (
+                f'{result["profile"]}: {storage["stored_bytes"]} of {storage["text_bytes"]} '
+                f'body bytes stored, table {storage["table_bytes"]} bytes, generated in '
+                f'{result["dataset"]["generation_seconds"]}s'
+            )
+            for route in result["routes"]:
+                yield (
+                    f'  {route["method"]:6} {route["path"]:40} {route["status"]} '
+                    f'p50 {route["latency_ms"]["p50"]:8.2f}ms '
+                    f'p99 {route["latency_ms"]["p99"]:8.2f}ms'
+                )
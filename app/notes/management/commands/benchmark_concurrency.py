@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import CommandError
+from notes.benchmark import run_concurrency_benchmark
+from notes.management.base import BenchmarkCommand
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Benchmark the sync note views under WSGI against their async counterparts under ASGI "
+        "with many concurrent clients and report throughput and latency percentiles as JSON. "
+        "The generated dataset is committed while the benchmark runs and deleted afterwards."
+    )
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument(
+            "--clients", default="1,10,50,200",
+            help="Comma separated counts of concurrent clients, e.g. 1,10,50,200",
+        )
+        parser.add_argument("--requests", type=int, default=20, help="Requests per client")
+        parser.add_argument(
+            "--replicas", default="",
+            help="Comma separated aliases of SQLite replicas, e.g. replica. The sync views are "
+                 "benchmarked reading from the primary and from the replicas.",
+        )
+
+    def check_options(self, options):
+        try:
+            options["clients"] = [int(count) for count in options["clients"].split(",")]
+        except ValueError:
+            raise CommandError("--clients must be comma separated integers")
+        if min(options["clients"]) < 1 or options["requests"] * min(options["clients"]) < 2:
+            raise CommandError("--clients and --requests must allow at least 2 requests per run")
+        options["replicas"] = [alias for alias in options["replicas"].split(",") if alias]
+        for alias in options["replicas"]:
+            if alias not in settings.DATABASES:
+                raise CommandError(f'Unknown database "{alias}"')
+
+    def run(self, dataset_options, options):
+        return run_concurrency_benchmark(
+            dataset_options, options["clients"], options["requests"], options["replicas"]
+        )
+
+    def summarize(self, report):
+        for result in report["results"]:
+            yield (
+                f'{result["server"]} {result["name"]:18} {",".join(result["replicas"]) or "-":8} '
+                f'{result["clients"]:4} clients '
+                f'{result["requests_per_second"]:8.1f} req/s '
+                f'p50 {result["latency_ms"]["p50"]:8.2f}ms '
+                f'p99 {result["latency_ms"]["p99"]:8.2f}ms {result["errors"]} errors'
+            )
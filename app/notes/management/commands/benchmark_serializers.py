@@ -0,0 +1,33 @@
+from django.core.management.base import CommandError
+from notes.benchmark import run_serializer_benchmark
+from notes.management.base import BenchmarkCommand
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Microbenchmark of the note list serialization: the cost per note of reading, "
+        "serializing and rendering a list with NoteSerializer against ValuesSerializer, "
+        "reported as JSON. The dataset is rolled back afterwards."
+    )
+    dataset_defaults = {"notes": 5000, "authors": 50, "tags": 100, "body_words": 30}
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument("--list-size", type=int, default=1000, help="Notes per list")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs, the best one counts")
+
+    def check_options(self, options):
+        if options["list_size"] < 1 or options["repeat"] < 1:
+            raise CommandError("--list-size and --repeat must be positive")
+
+    def run(self, dataset_options, options):
+        return run_serializer_benchmark(dataset_options, options["list_size"], options["repeat"])
+
+    def summarize(self, report):
+        for result in report["results"]:
+            per_note = result["per_note_us"]
+            yield (
+                f'{result["name"]:18} {result["notes"]:6} notes, per note: '
+                f'read {per_note["read"]:7.2f}us serialize {per_note["serialize"]:7.2f}us '
+                f'render {per_note["render"]:7.2f}us total {per_note["total"]:7.2f}us'
+            )
+        yield f'Identical JSON: {report["identical_json"]}'
@@ -0,0 +1,50 @@
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from notes.benchmark import run_sqlite_benchmark
+from notes.management.base import BenchmarkCommand
+
+from app.sqlite.base import DatabaseWrapper
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Benchmark concurrent readers of the note list and writers creating notes on stock "
+        "SQLite settings against the tuned settings.SQLITE_OPTIONS and report throughput and "
+        "latency percentiles as JSON. The generated dataset is committed while the benchmark "
+        "runs and deleted afterwards."
+    )
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument(
+            "--clients", default="4,16,32",
+            help="Comma separated counts of concurrent clients, e.g. 4,16,32",
+        )
+        parser.add_argument("--requests", type=int, default=20, help="Requests per client")
+        parser.add_argument(
+            "--write-ratio", type=float, default=0.25, help="Share of the clients writing"
+        )
+
+    def check_options(self, options):
+        if not isinstance(connections[DEFAULT_DB_ALIAS], DatabaseWrapper):
+            raise CommandError('The "default" database has to use the app.sqlite backend')
+        try:
+            options["clients"] = [int(count) for count in options["clients"].split(",")]
+        except ValueError:
+            raise CommandError("--clients must be comma separated integers")
+        if min(options["clients"]) < 1 or options["requests"] < 2:
+            raise CommandError("--clients must be positive and --requests at least 2")
+        if not 0 <= options["write_ratio"] <= 1:
+            raise CommandError("--write-ratio must be between 0 and 1")
+
+    def run(self, dataset_options, options):
+        return run_sqlite_benchmark(
+            dataset_options, options["clients"], options["requests"], options["write_ratio"]
+        )
+
+    def summarize(self, report):
+        for result in report["results"]:
+            yield (
+                f'{result["profile"]:6} {result["clients"]:4} clients '
+                f'{result["writers"]:4} writers '
+                f'{result["requests_per_second"]:8.1f} req/s {result["errors"]} errors'
+            )
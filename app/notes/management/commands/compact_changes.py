@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from notes.changes import compact_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact the change log read by syncing clients: drop the changes superseded by a "
+        "later change of the same note or tag and the tombstones older than the retention. "
+        "Clients that synced before the dropped tombstones have to sync anew."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days", type=float,
+            default=settings.NOTES_CHANGE_LOG["RETENTION_DAYS"],
+            help="Days tombstones of deleted notes and tags are kept",
+        )
+
+    def handle(self, *args, **options):
+        if options["retention_days"] < 0:
+            raise CommandError("--retention-days must not be negative")
+        dropped = compact_changes(timedelta(days=options["retention_days"]))
+        self.stdout.write(self.style.SUCCESS(
+            f'Dropped {dropped["superseded"]} superseded changes and '
+            f'{dropped["tombstones"]} tombstones'
+        ))
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from notes.ndjson import import_notes
+
+
+class Command(BaseCommand):
+    help = "Import notes for an author from an NDJSON file with one note per line"
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="Author the notes are imported for")
+        parser.add_argument("path", help="NDJSON file, see notes.ndjson.parse_note")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.NOTES_IMPORT_CHUNK_SIZE,
+            help="Number of notes written per bulk insert",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = get_user_model().objects.get(username=options["username"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'Author "{options["username"]}" does not exist')
+
+        with open(options["path"], "rb") as lines:
+            result = import_notes(author, lines, options["chunk_size"])
+
+        for error in result["errors"]:
+            self.stderr.write(f'Line {error["line"]}: {error["errors"]}')
+        if result["error_count"] > len(result["errors"]):
+            self.stderr.write(f'... {result["error_count"] - len(result["errors"])} more errors')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result["created"]} notes, skipped {result["error_count"]} lines'
+        ))
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from notes.rebalance import rebalance_notes
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the notes that are not in the shard of their author (see settings.NOTE_SHARDS) "
+        "along with their tag relations, e.g. after adding a shard. Also copies the tags to "
+        "every shard. Can be repeated after an interruption."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source", action="append", dest="sources",
+            help="Database to move notes out of, repeatable. Default: default and all shards",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only count the notes that would be moved"
+        )
+
+    def handle(self, *args, **options):
+        for alias in options["sources"] or []:
+            if alias not in settings.DATABASES:
+                raise CommandError(f'Unknown database "{alias}"')
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        moved = rebalance_notes(options["sources"], options["batch_size"], options["dry_run"])
+        verb = "Would move" if options["dry_run"] else "Moved"
+        for source, counts in moved.items():
+            for target, count in counts.items():
+                self.stdout.write(f"{verb} {count} notes from {source} to {target}")
+        total = sum(count for counts in moved.values() for count in counts.values())
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} notes"))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from app.routers import copy_to_replica
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite primary database to SQLite replicas, standing in for replication in "
+        "development. Copies to settings.DATABASE_REPLICAS by default."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("aliases", nargs="*", help="Aliases of the replicas")
+
+    def handle(self, *args, **options):
+        aliases = options["aliases"] or settings.DATABASE_REPLICAS
+        if not aliases:
+            raise CommandError("No replicas given and settings.DATABASE_REPLICAS is empty")
+        for alias in aliases:
+            if alias not in settings.DATABASES:
+                raise CommandError(f'Unknown database "{alias}"')
+            try:
+                copy_to_replica(alias)
+            except ImproperlyConfigured as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(self.style.SUCCESS(f'Copied the primary to "{alias}"'))
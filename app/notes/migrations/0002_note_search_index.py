@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from notes.search import install_search_index
+
+    install_search_index(schema_editor.connection.alias, rebuild=True)
+
+
+def drop_search_index(apps, schema_editor):
+    from notes.search import drop_search_index
+
+    drop_search_index(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notes", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, drop_search_index),
+    ]
@@ -0,0 +1,91 @@
+from django.db import migrations, models
+from django.db.models import Count, F
+from django.utils import timezone
+
+BATCH_SIZE = 500
+
+
+def normalize_title(title):
+    return " ".join(title.split()).casefold()
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """
+    Fills the normalized titles and merges tags sharing one into the tag with the smallest
+    uuid: their notes are moved to it and the duplicates deleted, all in batches.
+    """
+    Tag = apps.get_model("notes", "Tag")
+    Note = apps.get_model("notes", "Note")
+    Through = Note.tags.through
+    db = schema_editor.connection.alias
+
+    tags = Tag.objects.using(db).filter(normalized_title__isnull=True).order_by("uuid")
+    while True:
+        batch = list(tags[:BATCH_SIZE])
+        if not batch:
+            break
+        for tag in batch:
+            tag.normalized_title = normalize_title(tag.title)
+        Tag.objects.using(db).bulk_update(batch, ["normalized_title"])
+
+    duplicates = (
+        Tag.objects.using(db)
+        .values("normalized_title")
+        .annotate(count=Count("uuid"))
+        .filter(count__gt=1)
+        .values_list("normalized_title", flat=True)
+    )
+    while True:
+        titles = list(duplicates[:BATCH_SIZE])
+        if not titles:
+            break
+        groups = {}
+        for tag_id, title in (
+            Tag.objects.using(db)
+            .filter(normalized_title__in=titles)
+            .order_by("uuid")
+            .values_list("uuid", "normalized_title")
+        ):
+            groups.setdefault(title, []).append(tag_id)
+
+        canonical = {}
+        for tag_ids in groups.values():
+            for tag_id in tag_ids[1:]:
+                canonical[tag_id] = tag_ids[0]
+        moved = list(
+            Through.objects.using(db)
+            .filter(tag_id__in=canonical)
+            .values_list("note_id", "tag_id")
+        )
+        Through.objects.using(db).bulk_create(
+            [Through(note_id=note_id, tag_id=canonical[tag_id]) for note_id, tag_id in moved],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        Through.objects.using(db).filter(tag_id__in=canonical).delete()
+        Tag.objects.using(db).filter(uuid__in=canonical).delete()
+        note_ids = sorted({note_id for note_id, _ in moved})
+        for start in range(0, len(note_ids), BATCH_SIZE):
+            Note.objects.using(db).filter(pk__in=note_ids[start:start + BATCH_SIZE]).update(
+                version=F("version") + 1, updated_at=timezone.now()
+            )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notes", "0003_versioned_notes_and_tags"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tag",
+            name="normalized_title",
+            field=models.CharField(editable=False, max_length=384, null=True),
+        ),
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="tag",
+            name="normalized_title",
+            field=models.CharField(editable=False, max_length=384, unique=True),
+        ),
+    ]
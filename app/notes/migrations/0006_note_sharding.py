@@ -0,0 +1,44 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("notes", "0005_note_access_indexes"),
+    ]
+
+    # The notes have no foreign keys to their authors and tags when they are sharded
+    operations = [
+        migrations.CreateModel(
+            name="NoteSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="note",
+            name="author",
+            field=models.ForeignKey(
+                db_constraint=not settings.NOTE_SHARDS,
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="notes",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="note",
+            name="tags",
+            field=models.ManyToManyField(
+                blank=True, db_constraint=not settings.NOTE_SHARDS, related_name="notes",
+                to="notes.tag",
+            ),
+        ),
+    ]
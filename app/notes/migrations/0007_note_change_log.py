@@ -0,0 +1,85 @@
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def log_existing_notes_and_tags(apps, schema_editor):
+    """
+    Logs a change of every existing tag and note, so a sync from 0 receives all of them
+    """
+    Tag = apps.get_model("notes", "Tag")
+    Note = apps.get_model("notes", "Note")
+    NoteChange = apps.get_model("notes", "NoteChange")
+    db = schema_editor.connection.alias
+
+    NoteChange.objects.using(db).bulk_create(
+        (
+            NoteChange(model="tag", object_id=str(pk), public=True)
+            for pk in Tag.objects.using(db).order_by("pk").values_list("pk", flat=True).iterator()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    notes = Note.objects.using(db).order_by("pk").values_list("pk", "author_id", "is_public")
+    NoteChange.objects.using(db).bulk_create(
+        (
+            NoteChange(model="note", object_id=str(pk), author_id=author_id, public=is_public)
+            for pk, author_id, is_public in notes.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notes", "0006_note_sharding"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NoteChange",
+            fields=[
+                ("seq", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "model",
+                    models.CharField(choices=[("note", "Note"), ("tag", "Tag")], max_length=4),
+                ),
+                ("object_id", models.CharField(max_length=36)),
+                ("author_id", models.BigIntegerField(null=True)),
+                ("deleted", models.BooleanField(default=False)),
+                ("public", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="NoteChangeHorizon",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("seq", models.BigIntegerField(db_index=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="notechange",
+            index=models.Index(fields=["author_id", "seq"], name="notes_change_author_seq_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="notechange",
+            index=models.Index(
+                condition=models.Q(("public", True)),
+                fields=["seq"],
+                name="notes_change_public_seq_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notechange",
+            index=models.Index(
+                fields=["model", "object_id", "seq"], name="notes_change_object_idx"
+            ),
+        ),
+        migrations.RunPython(log_existing_notes_and_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+import notes.fields
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def _convert_bodies(schema_editor, stored_type, convert):
+    """
+    Rewrites the bodies stored as `stored_type` ("text" or "blob") with `convert`, in batches
+    of BATCH_SIZE notes. The search index is dropped meanwhile and rebuilt from the text.
+    """
+    from notes.search import drop_search_index, install_search_index
+
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    drop_search_index(connection.alias)
+    last_id = 0
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                "SELECT id, body FROM notes_note WHERE id > %s AND typeof(body) = %s "
+                "ORDER BY id LIMIT %s",
+                [last_id, stored_type, BATCH_SIZE],
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updates = []
+            for pk, body in rows:
+                value = convert(body)
+                if value != body:
+                    updates.append((value, pk))
+            cursor.executemany("UPDATE notes_note SET body = %s WHERE id = %s", updates)
+    install_search_index(connection.alias, rebuild=True)
+
+
+def compress_bodies(apps, schema_editor):
+    _convert_bodies(schema_editor, "text", notes.fields.compress)
+
+
+def decompress_bodies(apps, schema_editor):
+    _convert_bodies(schema_editor, "blob", notes.fields.decompress)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notes", "0007_note_change_log"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="note",
+            name="body",
+            field=notes.fields.CompressedTextField(),
+        ),
+        migrations.RunPython(compress_bodies, decompress_bodies),
+    ]
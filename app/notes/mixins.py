@@ -0,0 +1,198 @@
+import hashlib
+
+from django.db.models import Max, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from notes.models import NoteChange, NoteChangeHorizon
+from notes.renderers import ColumnarJSONRenderer
+from notes.serializers import ValuesSerializer
+from notes.sharding import current_shard, is_sharded, shard_for_author
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from app.routers import choose_replica, read_alias
+
+
+def change_log_validators(*scope):
+    """
+    Returns the validators (etag, last_modified) of a list of notes or tags from the latest
+    entry of the change log (see `NoteChange`) instead of the listed objects, every write
+    of a note or tag appends to it. A lookup of the last key, the cost does not depend on
+    the size of the list. The horizon of the compaction is part of the etag, as the latest
+    entry may be a dropped tombstone.
+    `scope` (user, query params, ...) is hashed into the etag, as it changes the response.
+    """
+    seq = NoteChange.objects.aggregate(seq=Max("seq"))["seq"]
+    horizon = NoteChangeHorizon.objects.order_by("-seq").values("seq")[:1]
+    latest = NoteChange.objects.filter(seq=seq).annotate(horizon=Subquery(horizon))
+    latest = latest.values("created_at", "horizon").first() or {
+        "created_at": None, "horizon": horizon.first(),
+    }
+    fingerprint = ":".join(str(part) for part in (*scope, seq, latest["horizon"]))
+    return hashlib.md5(fingerprint.encode()).hexdigest(), latest["created_at"]
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag and Last-Modified headers to GET responses and answers requests with a
+    matching If-None-Match / If-Modified-Since with 304 Not Modified, before anything is
+    serialized. Views implement `get_validators`.
+    """
+
+    def get_validators(self):
+        """
+        Returns a tuple (etag, last_modified) for the requested resource, either may be None.
+        """
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        etag = quote_etag(etag) if etag else None
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if etag and response.status_code in (200, 304):
+            response.headers["ETag"] = etag
+        if last_modified and response.status_code in (200, 304):
+            response.headers["Last-Modified"] = http_date(last_modified)
+        return response
+
+
+class ReplicaReadMixin:
+    """
+    Reads of safe requests (GET, HEAD, OPTIONS) go to a replica once the user is
+    authenticated (see `app.routers`), unless the user wrote recently. Only for views that
+    may serve data a little behind the primary.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        token = read_alias.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            read_alias.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            read_alias.set(choose_replica(request.user))
+
+
+class ShardMixin:
+    """
+    Routes the queries of notes in the request to the shard of the authenticated user (see
+    `notes.sharding`), anonymous requests read from "default".
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        token = current_shard.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            current_shard.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if is_sharded() and request.user.is_authenticated:
+            current_shard.set(shard_for_author(request.user.pk))
+
+
+class SparseFieldsetMixin:
+    """
+    Sparse fieldsets for safe requests: the "fields" query param (comma separated names)
+    limits the serialized fields to those, "exclude" drops them, empty params serialize all
+    fields. Only the columns of the requested fields are loaded (`only()`) and relations
+    (e.g. the tags) are only prefetched if requested, so a list of titles never reads the
+    note bodies.
+    The serializer has to take `fields`, see `notes.serializers.SparseFieldsMixin`.
+    """
+
+    def get_sparse_fields(self):
+        """
+        Returns the names of the requested fields, None for all of them. Raises a
+        ValidationError for unknown fields or if both params are given.
+        """
+        if not hasattr(self, "_sparse_fields"):
+            self._sparse_fields = self._parse_sparse_fields()
+        return self._sparse_fields
+
+    def _parse_sparse_fields(self):
+        params = self.request.query_params
+        if self.request.method not in SAFE_METHODS or not {"fields", "exclude"} & params.keys():
+            return None
+        if "fields" in params and "exclude" in params:
+            raise ValidationError({"fields": ['Only one of "fields" and "exclude" is allowed.']})
+
+        param = "fields" if "fields" in params else "exclude"
+        names = {name.strip() for name in params[param].split(",") if name.strip()}
+        if not names:
+            # An empty fieldset ("?fields=") is the same as none
+            return None
+        readable = [
+            name for name, field in self.get_serializer_class()().fields.items()
+            if not field.write_only
+        ]
+        unknown = sorted(names.difference(readable))
+        if unknown:
+            raise ValidationError({param: [f'Unknown field "{name}".' for name in unknown]})
+        if param == "fields":
+            return [name for name in readable if name in names]
+        return [name for name in readable if name not in names]
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            kwargs["fields"] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset
+        opts = queryset.model._meta
+        columns = [opts.pk.name]
+        related = False
+        for name in fields:
+            field = opts.get_field(name)
+            if field.many_to_many or field.one_to_many:
+                related = True
+            elif field.concrete and name != opts.pk.name:
+                columns.append(name)
+        if not related:
+            queryset = queryset.prefetch_related(None)
+        return queryset.only(*columns)
+
+
+class ValuesListMixin:
+    """
+    Builds the list of a list view from values_list() rows with
+    `notes.serializers.ValuesSerializer` instead of model instances and the serializer, the
+    JSON is the same. The serializer's fields have to be model fields.
+    Also renders the list as columns (see `notes.renderers.ColumnarJSONRenderer`) via
+    ?format=columnar or its media type in the Accept header.
+    """
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = ValuesSerializer(self.get_serializer())
+        ordering = []
+        if self.paginator is not None:
+            # The cursor of the page is read from the ordering fields of its last row
+            ordering = self.paginator.get_ordering(request, queryset, self)
+        rows = serializer.values_list(queryset, *(name.lstrip("-") for name in ordering))
+        page = self.paginate_queryset(rows)
+        rows = list(rows) if page is None else page
+
+        if request.accepted_renderer.format == ColumnarJSONRenderer.format:
+            data = serializer.to_columns(rows)
+        else:
+            data = serializer.to_representation(rows)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
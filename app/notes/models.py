@@ -1,26 +1,467 @@
+import contextvars
 import uuid
+from contextlib import contextmanager
 
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models, router, transaction
+from django.db.models import F, Max, Q
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+from notes.cache import bump_generation
+from notes.fields import CompressedTextField
+from notes.querysets import MergedQuerySet
+from notes.sharding import copy_targets, is_sharded, shard_for_author
 
 from app.settings import AUTH_USER_MODEL
 
+# (database, changes) recorded in a `NoteChange.batch()` block, appended at its end
+pending_changes = contextvars.ContextVar("pending_changes", default=None)
 
-class Tag(models.Model):
+
+class Versioned(models.Model):
+    """
+    Abstract model tracking the time and count of modifications, used as validators for
+    conditional requests (ETag / Last-Modified)
+    """
+
+    updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+            if using == self._state.db:
+                # Incremented by the database, two saves from stale copies of the same row
+                # never write the same version. Read back by `_save_table`.
+                self.version = F("version") + 1
+            else:
+                self.version += 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "updated_at", "version"}
+        super().save(*args, **kwargs)
+
+    def _save_table(self, raw, cls, force_insert, force_update, using, update_fields):
+        updated = super()._save_table(raw, cls, force_insert, force_update, using, update_fields)
+        # Before the post_save signals, they may copy the instance
+        if hasattr(self.version, "resolve_expression"):
+            self.refresh_from_db(using=using, fields=["version"])
+        return updated
+
+
+class TagQuerySet(models.QuerySet):
+    def in_bulk_by_title(self, normalized_titles, batch_size=500):
+        """
+        Returns a dict of the tags with the given normalized titles, queried in batches.
+        """
+        normalized_titles = list(normalized_titles)
+        tags = {}
+        for start in range(0, len(normalized_titles), batch_size):
+            batch = self.filter(normalized_title__in=normalized_titles[start:start + batch_size])
+            tags.update((tag.normalized_title, tag) for tag in batch)
+        return tags
+
+    def resolve_titles(self, titles, batch_size=500):
+        """
+        Returns a dict mapping each of `titles` to the Tag with the same normalized title.
+        Missing tags are created in batches of `batch_size`.
+        """
+        keys = {title: Tag.normalize_title(title) for title in titles}
+        tags = self.in_bulk_by_title(set(keys.values()), batch_size)
+
+        missing = {}
+        for title, key in keys.items():
+            if key not in tags:
+                missing.setdefault(key, title.strip())
+        if missing:
+            new = [Tag(title=title, normalized_title=key) for key, title in missing.items()]
+            self.bulk_create(new, batch_size=batch_size, ignore_conflicts=True)
+            # Read the tags back, a concurrent request may have created some of them first
+            created = Tag.objects.using(DEFAULT_DB_ALIAS).in_bulk_by_title(missing, batch_size)
+            Tag.objects.copy_to_shards(created.values())
+            # The bulk insert does not send signals, log the tags inserted here
+            inserted = {tag.pk for tag in new}
+            NoteChange.record_tags(tag for tag in created.values() if tag.pk in inserted)
+            tags.update(created)
+        return {title: tags[key] for title, key in keys.items()}
+
+    def copy_to_shards(self, tags, batch_size=500):
+        """
+        Writes `tags` to every shard besides "default" (see `notes.sharding`), inserting
+        missing and updating existing copies. The bulk inserts do not send signals.
+        """
+        fields = ["title", "normalized_title", "updated_at", "version"]
+        copies = [
+            Tag(uuid=tag.uuid, **{field: getattr(tag, field) for field in fields})
+            for tag in tags
+        ]
+        for alias in copy_targets():
+            self.using(alias).bulk_create(
+                copies,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=["uuid"],
+                update_fields=fields,
+            )
+
+
+class Tag(Versioned):
     """
     Model for saving tags to the Notes
+    Tags are unique by their normalized title, "Work" and " work" are the same tag.
     """
 
     title = models.CharField(max_length=128)
+    # Case folding maps a character to up to 3 ("ß" to "ss", "ΐ" to 3 characters)
+    normalized_title = models.CharField(max_length=3 * 128, unique=True, editable=False)
     uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
+    objects = TagQuerySet.as_manager()
+
+    @staticmethod
+    def normalize_title(title):
+        """
+        Returns the case folded title with collapsed whitespace
+        """
+        return " ".join(title.split()).casefold()
 
-class Note(models.Model):
+    def save(self, *args, **kwargs):
+        self.normalized_title = self.normalize_title(self.title)
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "normalized_title"}
+        super().save(*args, **kwargs)
+
+
+class NoteSequence(models.Model):
+    """
+    Allocates the ids of notes when they are sharded, so they are unique and ordered by
+    creation across the shards. Rows are deleted right after the allocation, the database
+    never hands out an id twice.
+    """
+
+    @classmethod
+    def allocate(cls, count):
+        """
+        Returns `count` new note ids
+        """
+        objects = cls.objects.using(DEFAULT_DB_ALIAS)
+        ids = [row.pk for row in objects.bulk_create([cls() for _ in range(count)])]
+        objects.filter(pk__lte=max(ids)).delete()
+        return ids
+
+    @classmethod
+    def advance_past(cls, note_id):
+        """
+        Makes sure later allocations are above `note_id`, e.g. of notes written unsharded
+        """
+        objects = cls.objects.using(DEFAULT_DB_ALIAS)
+        if (objects.aggregate(last=Max("pk"))["last"] or 0) < note_id:
+            objects.create(pk=note_id)
+            objects.filter(pk__lte=note_id).delete()
+
+
+class NoteQuerySet(models.QuerySet):
+    def with_tags(self):
+        """
+        Prefetch the tags (only their uuid) of all notes in one batched query, so serializing
+        a list of notes does not query the tags note by note
+        """
+        return self.prefetch_related(models.Prefetch("tags", queryset=Tag.objects.only("uuid")))
+
+    def visible_to(self, user):
+        """
+        The notes `user` may read: public notes for anonymous users, otherwise their own
+        notes and the public notes of others, as `MergedQuerySet` instead of
+        `Q(author=user) | Q(is_public=True)`. SQLite cannot use an index for the bare
+        boolean of the OR, so each side is queried on its own index with the filters,
+        ordering and LIMIT of the page, and merged.
+        """
+        if user.is_anonymous:
+            return self.filter(is_public=True)
+        return MergedQuerySet([
+            self.filter(author=user), self.filter(is_public=True).exclude(author=user)
+        ])
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        With sharding the notes are inserted into the shard of their author, new notes get
+        their ids from `NoteSequence`
+        """
+        if not is_sharded():
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        new = [note for note in objs if note.pk is None]
+        for note, pk in zip(new, NoteSequence.allocate(len(new)) if new else []):
+            note.pk = pk
+        by_shard = {}
+        for note in objs:
+            by_shard.setdefault(shard_for_author(note.author_id), []).append(note)
+        for alias, notes in by_shard.items():
+            models.QuerySet.bulk_create(self.using(alias), notes, *args, **kwargs)
+        return objs
+
+
+class Note(Versioned):
     """
     Model for saving Notes written by Authors
     """
 
     title = models.CharField(max_length=128)
-    body = models.TextField()
-    author = models.ForeignKey(AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notes")
-    tags = models.ManyToManyField(Tag, related_name="notes", blank=True)
+    body = CompressedTextField()
+    # Indexed by the composite notes_note_author_id_idx, which starts with the author.
+    # No database constraints with sharding, authors and notes are in different databases.
+    author = models.ForeignKey(
+        AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="notes",
+        db_index=False,
+        db_constraint=not is_sharded(),
+    )
+    tags = models.ManyToManyField(
+        Tag, related_name="notes", blank=True, db_constraint=not is_sharded()
+    )
     is_public = models.BooleanField(default=False)
+
+    objects = NoteQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        note = super().from_db(db, field_names, values)
+        # Whether the note is public in the database, for the change log (see NoteChange)
+        if "is_public" in note.__dict__:
+            note._was_public = note.is_public
+        return note
+
+    def save(self, *args, **kwargs):
+        # With sharding a note always lives in the shard of its author
+        if is_sharded():
+            kwargs["using"] = shard_for_author(self.author_id)
+            if self.pk is None:
+                self.pk = NoteSequence.allocate(1)[0]
+                kwargs.setdefault("force_insert", True)
+        super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            # The notes of an author, newest first (lists, detail and tag lookups by author)
+            models.Index(fields=["author", "-id"], name="notes_note_author_id_idx"),
+            # Public notes newest first, only the public rows are indexed
+            models.Index(
+                fields=["-id"], condition=models.Q(is_public=True), name="notes_note_public_id_idx"
+            ),
+        ]
+
+
+class NoteChangeQuerySet(models.QuerySet):
+    def visible_to(self, user, since=0):
+        """
+        The changes after `since` the authenticated `user` may read: of their own notes,
+        public notes and tags. Merged for the same reason as `NoteQuerySet.visible_to`, each
+        side reads its index from `since` on, up to the LIMIT of the page.
+        """
+        changes = self.filter(seq__gt=since)
+        return MergedQuerySet([
+            changes.filter(author_id=user.pk),
+            changes.filter(public=True).exclude(author_id=user.pk),
+        ])
+
+
+class NoteChange(models.Model):
+    """
+    Append-only log of the changes of notes and tags, numbered by `seq` in the order they
+    were written, read by clients syncing the changes since the last one they have seen
+    (see `notes.changes`). A change of the tags of a note is a change of the note, deletions
+    leave a tombstone. The log always lives in "default". Compacted by
+    `manage.py compact_changes`.
+    """
+    NOTE, TAG = "note", "tag"
+
+    seq = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=4, choices=[(NOTE, "Note"), (TAG, "Tag")])
+    object_id = models.CharField(max_length=36)
+    # The author of the note, None for tags
+    author_id = models.BigIntegerField(null=True)
+    deleted = models.BooleanField(default=False)
+    # The note was public before or is public after the change, every user reads it
+    public = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = NoteChangeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # The changes of an author and the public changes, in order
+            models.Index(fields=["author_id", "seq"], name="notes_change_author_seq_idx"),
+            models.Index(
+                fields=["seq"], condition=Q(public=True), name="notes_change_public_seq_idx"
+            ),
+            # The changes of an object, for the compaction
+            models.Index(fields=["model", "object_id", "seq"], name="notes_change_object_idx"),
+        ]
+
+    @classmethod
+    def _append(cls, changes, using):
+        """
+        Inserts `changes` into "default", with the write in progress if it goes there too,
+        otherwise (a shard) once the transaction of `using` commits
+        """
+        if not changes:
+            return
+        pending = pending_changes.get()
+        if pending is not None:
+            pending.append((using, changes))
+            return
+        objects = cls.objects.using(DEFAULT_DB_ALIAS)
+        if using == DEFAULT_DB_ALIAS:
+            objects.bulk_create(changes)
+        else:
+            transaction.on_commit(lambda: objects.bulk_create(changes), using=using)
+
+    @classmethod
+    @contextmanager
+    def batch(cls):
+        """
+        Collects the changes recorded in the block, e.g. by the signals of a bulk delete,
+        and appends them with one insert per database at its end
+        """
+        token = pending_changes.set([])
+        try:
+            yield
+            by_database = {}
+            for using, changes in pending_changes.get():
+                by_database.setdefault(using, []).extend(changes)
+        finally:
+            pending_changes.reset(token)
+        for using, changes in by_database.items():
+            cls._append(changes, using)
+
+    @classmethod
+    def record_notes(cls, notes, deleted=False, using=DEFAULT_DB_ALIAS):
+        """
+        Appends a change (or with `deleted` a tombstone) of each of `notes`, written to
+        the database `using`
+        """
+        changes = []
+        for note in notes:
+            was_public = getattr(note, "_was_public", note.is_public)
+            changes.append(cls(
+                model=cls.NOTE,
+                object_id=str(note.pk),
+                author_id=note.author_id,
+                deleted=deleted,
+                public=was_public or note.is_public,
+            ))
+            note._was_public = note.is_public
+        cls._append(changes, using)
+
+    @classmethod
+    def record_tags(cls, tags, deleted=False):
+        cls._append(
+            [cls(model=cls.TAG, object_id=str(tag.pk), deleted=deleted, public=True)
+             for tag in tags],
+            DEFAULT_DB_ALIAS,
+        )
+
+
+class NoteChangeHorizon(models.Model):
+    """
+    The highest `seq` of the tombstones a compaction of the change log dropped. Clients
+    that synced up to an earlier change may have missed deletions and have to sync anew.
+    """
+    seq = models.BigIntegerField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=Note.tags.through)
+def notes_changed(sender, action="post_save", **kwargs):
+    """
+    Invalidate the cached public note lists whenever notes, tags or their relation change
+    """
+    if action.startswith("post_"):
+        bump_generation()
+
+
+@receiver(m2m_changed, sender=Note.tags.through)
+def note_tags_changed(sender, instance, action, reverse, pk_set, using, **kwargs):
+    """
+    A note is modified when its tags change, bump its version for the conditional requests
+    and log the change
+    """
+    if action in ("post_add", "post_remove") and not pk_set:
+        return
+
+    if not reverse and action in ("post_add", "post_remove", "post_clear"):
+        notes = Note.objects.using(using).filter(pk=instance.pk)
+    # Reverse relation: instance is a Tag and pk_set holds the affected notes
+    elif reverse and action in ("post_add", "post_remove"):
+        notes = Note.objects.using(using).filter(pk__in=pk_set)
+    elif reverse and action == "pre_clear":
+        notes = instance.notes.all()
+    else:
+        return
+
+    notes.update(version=F("version") + 1, updated_at=timezone.now())
+    if not reverse:
+        instance.refresh_from_db(using=using, fields=["version", "updated_at"])
+    NoteChange.record_notes([instance] if not reverse else notes, using=using)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_pre_delete(sender, instance, using, **kwargs):
+    """
+    Deleting a tag removes it from its notes, bump their versions
+    """
+    NoteChange.record_notes(instance.notes.all(), using=using)
+    instance.notes.update(version=F("version") + 1, updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def record_note_change(sender, instance, using, signal, raw=False, **kwargs):
+    if not raw:
+        NoteChange.record_notes([instance], deleted=signal is post_delete, using=using)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def record_tag_change(sender, instance, using, signal, raw=False, **kwargs):
+    # The copies of tags in the shards are not logged
+    if using == DEFAULT_DB_ALIAS and not raw:
+        NoteChange.record_tags([instance], deleted=signal is post_delete)
+
+
+@receiver(post_save, sender=Tag)
+def copy_tag_to_shards(sender, instance, using, raw=False, **kwargs):
+    """
+    Tags are saved to "default", keep their copies in the shards up to date
+    """
+    if using == DEFAULT_DB_ALIAS and not raw:
+        Tag.objects.copy_to_shards([instance])
+
+
+@receiver(post_delete, sender=Tag)
+def delete_tag_from_shards(sender, instance, using, **kwargs):
+    """
+    Deletes the copies of a tag deleted in "default", along with their relations to notes
+    """
+    if using == DEFAULT_DB_ALIAS:
+        for alias in copy_targets():
+            Tag.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+@receiver(pre_delete, sender=AUTH_USER_MODEL)
+def delete_sharded_notes(sender, instance, **kwargs):
+    """
+    The cascade of an author deletion only reaches notes in "default", delete the notes in
+    the shard of the author
+    """
+    alias = shard_for_author(instance.pk)
+    if alias != DEFAULT_DB_ALIAS:
+        Note.objects.using(alias).filter(author_id=instance.pk).delete()
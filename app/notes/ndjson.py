@@ -0,0 +1,148 @@
+import json
+import uuid
+
+from django.db import transaction
+from notes.cache import bump_generation
+from notes.models import Note, NoteChange, Tag
+from notes.renderers import encode_line
+from notes.serializers import NoteSerializer
+from notes.sharding import using_shard_of
+
+# Only the first errors are reported, so a broken upload cannot fill the memory with them
+MAX_REPORTED_ERRORS = 100
+
+
+def export_notes(queryset, chunk_size=1000):
+    """
+    Yields the notes of `queryset` ordered by id as lines of NDJSON in the representation
+    of `NoteSerializer`. The notes are fetched `chunk_size` at a time along with one batched
+    query for their tags, so memory use does not depend on the number of notes.
+    """
+    serializer = NoteSerializer()
+    notes = queryset.with_tags().order_by("pk").iterator(chunk_size=chunk_size)
+    for note in notes:
+        yield encode_line(serializer.to_representation(note))
+
+
+def _check_string(value, max_length=None):
+    """
+    Returns the validation error of a required string field or None
+    """
+    if value is None or value == "":
+        return "This field is required."
+    if not isinstance(value, str):
+        return "Not a valid string."
+    if not value.strip():
+        return "This field may not be blank."
+    if max_length is not None and len(value) > max_length:
+        return f"Ensure this field has no more than {max_length} characters."
+    return None
+
+
+def parse_note(line):
+    """
+    Parses and validates one NDJSON line of a note:
+        {"title": str, "body": str, "tags": list(str), "is_public": bool}
+    Tags are given by title or by the uuid of an existing tag, as in an export (see
+    `resolve_tags`). Returns a tuple (note data, errors), one of them is None.
+    """
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None, {"non_field_errors": ["Invalid JSON."]}
+    if not isinstance(data, dict):
+        return None, {"non_field_errors": ["Expected a JSON object."]}
+
+    errors = {}
+    for field in ("title", "body"):
+        error = _check_string(data.get(field), Note._meta.get_field(field).max_length)
+        if error:
+            errors[field] = [error]
+    if not isinstance(data.get("is_public", False), bool):
+        errors["is_public"] = ["Must be a valid boolean."]
+    tags = data.get("tags", [])
+    if not isinstance(tags, list):
+        errors["tags"] = ["Expected a list of tag titles or uuids."]
+    else:
+        max_length = Tag._meta.get_field("title").max_length
+        tag_errors = [error for error in (_check_string(tag, max_length) for tag in tags) if error]
+        if tag_errors:
+            errors["tags"] = tag_errors
+    if errors:
+        return None, errors
+
+    return {
+        "title": data["title"],
+        "body": data["body"],
+        "is_public": data.get("is_public", False),
+        "tags": [tag.strip() for tag in tags],
+    }, None
+
+
+def resolve_tags(names):
+    """
+    Returns a dict mapping each of `names` to its Tag: the existing tag if the name is the
+    uuid of one, otherwise the tag with the same normalized title, created if missing.
+    """
+    uuids = {}
+    for name in names:
+        try:
+            uuids[name] = uuid.UUID(name)
+        except ValueError:
+            pass
+    existing = Tag.objects.in_bulk(uuids.values())
+    tags = {name: existing[value] for name, value in uuids.items() if value in existing}
+    tags.update(Tag.objects.resolve_titles(set(names).difference(tags)))
+    return tags
+
+
+def _write_notes(author, rows):
+    """
+    Inserts the parsed `rows` with one batched tag lookup, one bulk insert of the notes and
+    one of their tag relations.
+    """
+    Through = Note.tags.through
+    with using_shard_of(author) as alias, transaction.atomic(using=alias):
+        tags = resolve_tags({name for row in rows for name in row["tags"]})
+        notes = Note.objects.bulk_create(
+            Note(author=author, title=row["title"], body=row["body"], is_public=row["is_public"])
+            for row in rows
+        )
+        relations = {
+            (note.pk, tags[name].pk) for note, row in zip(notes, rows) for name in row["tags"]
+        }
+        Through.objects.bulk_create(
+            Through(note_id=note_id, tag_id=tag_id) for note_id, tag_id in relations
+        )
+        # Bulk inserts bypass the model signals
+        NoteChange.record_notes(notes, using=alias)
+        bump_generation()
+    return len(notes)
+
+
+def import_notes(author, lines, chunk_size=1000):
+    """
+    Imports notes for `author` from an iterable of NDJSON lines (e.g. an uploaded file),
+    see `parse_note` for the format. Lines are validated one by one and the valid ones are
+    written `chunk_size` at a time, so memory use does not depend on the size of the upload.
+    Invalid lines are skipped and reported with their line number.
+    Returns {"created": int, "error_count": int, "errors": [{"line": int, "errors": dict}]}
+    """
+    created, error_count, errors = 0, 0, []
+    rows = []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        row, row_errors = parse_note(line)
+        if row_errors:
+            error_count += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": number, "errors": row_errors})
+            continue
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            created += _write_notes(author, rows)
+            rows = []
+    if rows:
+        created += _write_notes(author, rows)
+    return {"created": created, "error_count": error_count, "errors": errors}
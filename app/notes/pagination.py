@@ -0,0 +1,45 @@
+import math
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class NoteCursorPagination(CursorPagination):
+    """
+    Keyset pagination for note listings.
+    The opaque cursor encodes the last position of the previous page, so every page is fetched
+    with an indexed `id < position` lookup instead of an OFFSET and without a COUNT(*).
+    Full text search results are paged by relevance ("search_rank") with the id as tiebreaker.
+    Query Params:
+        "cursor" opaque position returned in the "next"/"previous" links
+        "page_size" number of notes per page, capped by `max_page_size`
+    """
+    ordering = "-id"
+    search_ordering = ("search_rank", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+    def get_ordering(self, request, queryset, view):
+        if "search_rank" in queryset.query.annotations:
+            return self.search_ordering
+        return super().get_ordering(request, queryset, view)
+
+    def decode_cursor(self, request):
+        """
+        Also rejects a cursor whose position is not a value of the first ordering field (an
+        id or a finite search rank), like DRF rejects malformed cursors, instead of failing
+        in the query
+        """
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        ordering = [self.ordering] if isinstance(self.ordering, str) else self.ordering
+        convert = float if ordering[0].lstrip("-") == "search_rank" else int
+        try:
+            position = convert(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not math.isfinite(position):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
@@ -0,0 +1,28 @@
+from notes.renderers import ColumnarJSONRenderer
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+
+class ColumnarJSONParser(JSONParser):
+    """
+    Parses a list of objects sent as columns (see `notes.renderers.ColumnarJSONRenderer`),
+    e.g. the operations of a bulk request: {"op": ["create", "delete"], "id": [null, 2],
+    "title": ["a", null]}. A null value leaves the field out of its object, so objects with
+    different fields share the columns.
+    """
+    media_type = ColumnarJSONRenderer.media_type
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        columns = super().parse(stream, media_type, parser_context)
+        if not isinstance(columns, dict) or not all(
+            isinstance(values, list) for values in columns.values()
+        ):
+            raise ParseError("Columnar data must be an object of arrays.")
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ParseError("Columnar data must have arrays of the same length.")
+        rows = zip(*columns.values())
+        return [
+            {name: value for name, value in zip(columns, row) if value is not None}
+            for row in rows
+        ]
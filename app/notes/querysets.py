@@ -0,0 +1,100 @@
+import heapq
+import itertools
+
+
+def _chained(name):
+    def method(self, *args, **kwargs):
+        return type(self)(
+            getattr(queryset, name)(*args, **kwargs) for queryset in self.querysets
+        )
+
+    method.__name__ = name
+    return method
+
+
+def _merge_key(ordering):
+    """
+    Returns the sort key of rows (instances or dicts) for `ordering`, a tuple of (numeric)
+    field names as passed to `order_by`
+    """
+    fields = [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+
+    def key(row):
+        values = (row[name] if isinstance(row, dict) else getattr(row, name) for name, _ in fields)
+        return tuple(
+            -value if descending else value for value, (_, descending) in zip(values, fields)
+        )
+
+    return key
+
+
+class MergedQuerySet:
+    """
+    Several querysets of disjoint rows of one model, chained like a QuerySet. Slicing and
+    iterating merge the ordered results of the querysets, each is queried for at most the
+    end of the slice, so every one reads its own index up to a LIMIT. Merging supports
+    orderings by numeric fields (e.g. "-id" or "search_rank") of instances, dicts and named
+    rows.
+    """
+    filter = _chained("filter")
+    exclude = _chained("exclude")
+    order_by = _chained("order_by")
+    annotate = _chained("annotate")
+    prefetch_related = _chained("prefetch_related")
+    select_related = _chained("select_related")
+    distinct = _chained("distinct")
+    only = _chained("only")
+    defer = _chained("defer")
+    values = _chained("values")
+    values_list = _chained("values_list")
+    all = _chained("all")
+
+    def __init__(self, querysets):
+        self.querysets = list(querysets)
+
+    @property
+    def model(self):
+        return self.querysets[0].model
+
+    @property
+    def query(self):
+        return self.querysets[0].query
+
+    @property
+    def db(self):
+        return self.querysets[0].db
+
+    def map(self, function):
+        return type(self)(function(queryset) for queryset in self.querysets)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop
+        results = [queryset[:stop] if stop is not None else queryset for queryset in self.querysets]
+        ordering = self.query.order_by
+        merged = heapq.merge(*results, key=_merge_key(ordering)) if ordering else (
+            itertools.chain(*results)
+        )
+        return list(itertools.islice(merged, start, stop))
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def exists(self):
+        return any(queryset.exists() for queryset in self.querysets)
+
+    def aggregate(self, **aggregates):
+        """
+        Combines Count, Sum, Max and Min aggregates of the querysets
+        """
+        combine = {"Count": sum, "Sum": sum, "Max": max, "Min": min}
+        results = [queryset.aggregate(**aggregates) for queryset in self.querysets]
+        combined = {}
+        for name, aggregate in aggregates.items():
+            values = [result[name] for result in results if result[name] is not None]
+            combined[name] = combine[aggregate.name](values) if values else None
+        return combined
@@ -0,0 +1,73 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max
+from notes.models import Note, NoteChange, NoteSequence, Tag
+from notes.sharding import get_shards, shard_for_author
+
+
+def note_databases():
+    """
+    Returns the aliases of the databases that may hold notes: "default" and the shards
+    """
+    return list(dict.fromkeys([DEFAULT_DB_ALIAS, *get_shards()]))
+
+
+def _move_notes(source, author_id, batch_size):
+    """
+    Moves the notes of `author_id` with their tag relations from `source` to the shard of
+    the author. Every batch is copied before it is deleted, an interrupted run can be
+    repeated. Returns the number of moved notes.
+    """
+    Through = Note.tags.through
+    notes = Note.objects.using(source).filter(author_id=author_id).order_by("pk")
+    moved = 0
+    while batch := list(notes[:batch_size]):
+        note_ids = [note.pk for note in batch]
+        relations = [
+            Through(note_id=row.note_id, tag_id=row.tag_id)
+            for row in Through.objects.using(source).filter(note_id__in=note_ids)
+        ]
+        target = shard_for_author(author_id)
+        with transaction.atomic(using=target):
+            Note.objects.bulk_create(batch, ignore_conflicts=True)
+            Through.objects.using(target).bulk_create(relations, ignore_conflicts=True)
+        with transaction.atomic(using=source):
+            Note.objects.using(source).filter(pk__in=note_ids).delete()
+        # The deletion logged tombstones, the notes still exist
+        NoteChange.record_notes(batch)
+        moved += len(batch)
+    return moved
+
+
+def rebalance_notes(sources=None, batch_size=1000, dry_run=False):
+    """
+    Moves every note of the `sources` databases (default: see `note_databases`) that is not
+    in the shard of its author, e.g. after settings.NOTE_SHARDS changed. The tags are copied
+    to all shards and the note ids allocated after the highest existing one first.
+    Returns the counts of moved notes: {source: {target: count}}. With `dry_run` nothing is
+    written and the counts of the notes to move are returned.
+    """
+    sources = sources or note_databases()
+    if not dry_run:
+        Tag.objects.copy_to_shards(Tag.objects.using(DEFAULT_DB_ALIAS).iterator(), batch_size)
+        last_ids = [
+            Note.objects.using(alias).aggregate(last=Max("pk"))["last"] or 0
+            for alias in note_databases()
+        ]
+        NoteSequence.advance_past(max(last_ids))
+
+    moved = {}
+    for source in sources:
+        author_ids = (
+            Note.objects.using(source).order_by().values_list("author_id", flat=True).distinct()
+        )
+        for author_id in list(author_ids):
+            target = shard_for_author(author_id)
+            if target == source:
+                continue
+            if dry_run:
+                count = Note.objects.using(source).filter(author_id=author_id).count()
+            else:
+                count = _move_notes(source, author_id, batch_size)
+            counts = moved.setdefault(source, {})
+            counts[target] = counts.get(target, 0) + count
+    return moved
@@ -0,0 +1,54 @@
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Renders a list as newline delimited JSON, one item per line, anything else as one line.
+    """
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        items = data if isinstance(data, list) else [data]
+        return b"".join(encode_line(item) for item in items)
+
+
+def encode_line(item):
+    """
+    Returns `item` encoded as one line of NDJSON
+    """
+    return json.dumps(item, cls=JSONEncoder, ensure_ascii=False).encode() + b"\n"
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    Renders lists of objects as columns, their field names once and the values as parallel
+    arrays: [{"id": 1, "title": "a"}, {"id": 2, "title": "b"}] as
+    {"id": [1, 2], "title": ["a", "b"]}. Also the "results" of paginated lists, anything
+    else as JSON. `notes.mixins.ValuesListMixin` builds the columns of list views right
+    away, see `notes.parsers.ColumnarJSONParser` for requests.
+    """
+    media_type = "application/vnd.notes.columnar+json"
+    format = "columnar"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, list):
+            data = to_columns(data)
+        elif isinstance(data, dict) and isinstance(data.get("results"), list):
+            data = {**data, "results": to_columns(data["results"])}
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+def to_columns(rows):
+    """
+    Returns the list of dicts `rows` as a dict of columns, a value of None where a row lacks
+    the field
+    """
+    names = list(dict.fromkeys(name for row in rows for name in row))
+    return {name: [row.get(name) for row in rows] for name in names}
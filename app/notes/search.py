@@ -0,0 +1,175 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField, QuerySet
+from django.db.models.expressions import RawSQL
+from notes.fields import DECOMPRESS_FUNCTION
+
+SEARCH_TABLE = "notes_note_fts"
+QUEUE_TABLE = f"{SEARCH_TABLE}_queue"
+
+# External content FTS5 table: the index only stores the inverted lists and reads the text
+# from notes_note. Compressed bodies (see `notes.fields`) are indexed as their text, which
+# only Django connections can read (notes_decompress()). So the triggers on notes_note are
+# plain SQL and queue every change with the stored values, writes from any client (sqlite3
+# CLI, backup tools, ...) keep working. Django connections drain the queue into the index
+# whenever a change is queued (see `DRAIN_STATEMENTS`), in order, so changes made outside
+# of Django are indexed with the next write through Django, or the next migrate.
+INSTALL_STATEMENTS = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, body, content='notes_note', content_rowid='id', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {QUEUE_TABLE} (
+        seq integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+        command text NULL,
+        note_id integer NOT NULL,
+        title text NULL,
+        body blob NULL
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {QUEUE_TABLE}_insert AFTER INSERT ON notes_note BEGIN
+        INSERT INTO {QUEUE_TABLE}(command, note_id, title, body)
+            VALUES (NULL, new.id, new.title, new.body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {QUEUE_TABLE}_delete AFTER DELETE ON notes_note BEGIN
+        INSERT INTO {QUEUE_TABLE}(command, note_id, title, body)
+            VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {QUEUE_TABLE}_update AFTER UPDATE OF title, body ON notes_note
+    BEGIN
+        INSERT INTO {QUEUE_TABLE}(command, note_id, title, body)
+            VALUES ('delete', old.id, old.title, old.body), (NULL, new.id, new.title, new.body);
+    END
+    """,
+)
+
+# Applies the queued changes to the index, 'delete' needs the values that were indexed
+DRAIN_STATEMENTS = (
+    f"""
+    INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, body)
+        SELECT command, note_id, title, {DECOMPRESS_FUNCTION}(body) FROM {QUEUE_TABLE}
+        ORDER BY seq
+    """,
+    f"DELETE FROM {QUEUE_TABLE}",
+)
+
+# Per connection trigger draining the queue right away, only Django connections have it
+DRAIN_TRIGGER_STATEMENT = f"""
+    CREATE TEMP TRIGGER IF NOT EXISTS {QUEUE_TABLE}_drain AFTER INSERT ON main.{QUEUE_TABLE}
+    BEGIN
+        {"; ".join(statement.strip() for statement in DRAIN_STATEMENTS)};
+    END
+"""
+
+REBUILD_STATEMENTS = (
+    f"DELETE FROM {QUEUE_TABLE}",
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('delete-all')",
+    f"""
+    INSERT INTO {SEARCH_TABLE}(rowid, title, body)
+        SELECT id, title, {DECOMPRESS_FUNCTION}(body) FROM notes_note
+    """,
+)
+
+DROP_STATEMENTS = (
+    f"DROP TRIGGER IF EXISTS temp.{QUEUE_TABLE}_drain",
+    f"DROP TRIGGER IF EXISTS {QUEUE_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {QUEUE_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {QUEUE_TABLE}_update",
+    f"DROP TABLE IF EXISTS {QUEUE_TABLE}",
+    f"DROP TABLE IF EXISTS {SEARCH_TABLE}",
+)
+
+# A double quoted phrase or a single word, both optionally followed by "*" for prefix search
+TOKEN_REGEX = re.compile(r'"([^"]*)"(\*?)|([^\s"]+)')
+
+
+def is_supported(using="default"):
+    """
+    Returns True if the database behind `using` provides the FTS5 index.
+    """
+    return connections[using].vendor == "sqlite"
+
+
+def install_search_index(using="default", rebuild=False):
+    """
+    Creates the FTS5 table, the queue and their triggers if they are missing, and indexes
+    the queued changes.
+    SQLite drops the triggers whenever a migration remakes notes_note, so this is also run
+    after every migrate. With `rebuild` the index is repopulated from notes_note.
+    """
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        for statement in INSTALL_STATEMENTS:
+            cursor.execute(statement)
+        cursor.execute(DRAIN_TRIGGER_STATEMENT)
+        for statement in REBUILD_STATEMENTS if rebuild else DRAIN_STATEMENTS:
+            cursor.execute(statement)
+
+
+def install_drain_trigger(connection):
+    """
+    Adds the trigger indexing the queued changes to a new SQLite connection (a DB-API
+    connection with `notes.fields.register_functions`), if the database has the queue
+    """
+    exists = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (QUEUE_TABLE,)
+    ).fetchone()
+    if exists:
+        connection.execute(DRAIN_TRIGGER_STATEMENT)
+
+
+def drop_search_index(using="default"):
+    """
+    Removes the FTS5 table, the queue and their triggers.
+    """
+    if not is_supported(using):
+        return
+    with connections[using].cursor() as cursor:
+        for statement in DROP_STATEMENTS:
+            cursor.execute(statement)
+
+
+def build_match_query(terms):
+    """
+    Translates the user supplied search terms into a safe FTS5 MATCH expression.
+    - words are matched as whole tokens: test -> "test"
+    - double quoted text is matched as phrase: "big test" -> "big test"
+    - a trailing "*" turns a word or phrase into a prefix query: tes* -> "tes"*
+    All terms must match. Returns an empty string if no term was found.
+    """
+    parts = []
+    for phrase, phrase_prefix, word in TOKEN_REGEX.findall(terms or ""):
+        prefix = phrase_prefix
+        if word:
+            prefix = "*" if word.endswith("*") else ""
+            phrase = word.rstrip("*")
+        phrase = phrase.strip()
+        if phrase:
+            parts.append(f'"{phrase}"{prefix}')
+    return " ".join(parts)
+
+
+def search_notes(queryset: QuerySet, match: str) -> QuerySet:
+    """
+    Restricts `queryset` to the notes matching the FTS5 expression `match` and annotates the
+    bm25 relevance as "search_rank" (lower is more relevant).
+    """
+    table = queryset.model._meta.db_table
+    matching_ids = RawSQL(
+        f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", (match,)
+    )
+    rank = RawSQL(
+        f"SELECT rank FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND rowid = {table}.id",
+        (match,),
+        output_field=FloatField(),
+    )
+    return queryset.filter(id__in=matching_ids).annotate(search_rank=rank)
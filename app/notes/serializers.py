@@ -1,8 +1,103 @@
+from django.conf import settings
+from notes.fields import CompressedTextField, decompress
 from notes.models import Note, Tag
+from notes.sharding import shard_querysets
 from rest_framework import serializers
 
 
-class NoteSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Serializer taking `fields`, the names of the fields to keep, e.g. for the sparse
+    fieldsets of `notes.mixins.SparseFieldsetMixin`
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path of a model serializer for lists: the representation of objects
+    built from values_list() rows instead of model instances and the per field machinery
+    of the serializer, rendering to the same JSON. The readable fields of `serializer`
+    (an instance, e.g. with sparse fields) have to be model fields: concrete fields are
+    selected as columns, many to many fields (e.g. the tags) read from their through table
+    with one query, datetimes and compressed text are converted like the serializer does.
+    """
+
+    def __init__(self, serializer):
+        opts = serializer.Meta.model._meta
+        self.pk = opts.pk.attname
+        # (name, model field, conversion of the selected value or None)
+        self.fields = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            model_field = opts.get_field(field.source)
+            convert = None
+            if isinstance(model_field, CompressedTextField):
+                convert = decompress
+            elif isinstance(field, serializers.DateTimeField):
+                convert = field.to_representation
+            self.fields.append((name, model_field, convert))
+
+    def values_list(self, queryset, *extra):
+        """
+        Returns the named rows of `queryset` with the columns of the fields, and `extra`
+        columns, e.g. the ordering of a cursor pagination
+        """
+        columns = [self.pk]
+        columns += [field.attname for _, field, _ in self.fields if not field.many_to_many]
+        return queryset.prefetch_related(None).values_list(
+            *dict.fromkeys([*columns, *extra]), named=True
+        )
+
+    def to_columns(self, rows):
+        """
+        Returns the values of the fields of `rows` as {name: [value of every row]}
+        """
+        columns = {}
+        for name, field, convert in self.fields:
+            if field.many_to_many:
+                values = self.get_related(field, [getattr(row, self.pk) for row in rows])
+            else:
+                values = [getattr(row, field.attname) for row in rows]
+                if convert is not None:
+                    values = [value if value is None else convert(value) for value in values]
+            columns[name] = values
+        return columns
+
+    def to_representation(self, rows):
+        """
+        Returns the representation of `rows` as the serializer returns it for many objects
+        """
+        columns = self.to_columns(rows)
+        names = list(columns)
+        if not names:
+            return [{} for _ in rows]
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+    def get_related(self, field, pks):
+        """
+        Returns the pks of the objects related by the many to many `field` to each of the
+        objects with the primary keys `pks`, read from every shard the relations may be in
+        """
+        through = field.remote_field.through
+        source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        relations = through.objects.filter(**{f"{source}__in": pks}).values_list(
+            f"{source}_id", f"{target}_id"
+        )
+        related = {pk: [] for pk in pks}
+        for shard_relations in shard_querysets(relations):
+            for pk, related_pk in shard_relations:
+                related[pk].append(related_pk)
+        return [related[pk] for pk in pks]
+
+
+class NoteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Auto add the current user as author, because users can only create/edit their notes
     author = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
@@ -12,9 +107,98 @@ class NoteSerializer(serializers.ModelSerializer):
         read_only_fields = ("author",)
 
 
+class NoteReadSerializer(NoteSerializer):
+    """
+    Representation of `NoteSerializer` for notes with the ids of their tags loaded into
+    `tag_ids`, it does not query the database (for async views)
+    """
+    tags = serializers.SerializerMethodField()
+
+    def get_tags(self, note):
+        return note.tag_ids
+
+
+class NoteWriteSerializer(serializers.ModelSerializer):
+    """
+    Validates a new note without querying the database (for async views), tags are only
+    checked for their format, their existence is checked by the view
+    """
+    tags = serializers.ListField(child=serializers.UUIDField(), required=False)
+
+    class Meta:
+        model = Note
+        fields = ("title", "body", "is_public", "tags")
+
+
 class TagSerializer(serializers.ModelSerializer):
     notes = NoteSerializer
 
     class Meta:
         model = Tag
-        fields = "__all__"
+        exclude = ("normalized_title",)
+
+    def validate_title(self, title):
+        """
+        Renaming a tag must not produce a duplicate, creating one reuses the existing tag
+        """
+        if self.instance is not None:
+            duplicates = Tag.objects.filter(normalized_title=Tag.normalize_title(title))
+            if duplicates.exclude(pk=self.instance.pk).exists():
+                raise serializers.ValidationError("A tag with this title already exists.")
+        return title
+
+
+class TagResolveSerializer(serializers.Serializer):
+    titles = serializers.ListField(
+        child=serializers.CharField(max_length=128), allow_empty=False, max_length=1000
+    )
+
+
+class NoteBulkOperationSerializer(serializers.ModelSerializer):
+    """
+    Validates one operation of a bulk request, the note fields are flat next to "op":
+        {"op": "create", "title": str, "body": str, "tags": list(uuid), "is_public": bool}
+        {"op": "update", "id": int, <any of the create fields>}
+        {"op": "delete", "id": int}
+    Tags are only checked for their format here, their existence is checked for the whole
+    request at once.
+    """
+    op = serializers.ChoiceField(choices=("create", "update", "delete"))
+    id = serializers.IntegerField(required=False)
+    tags = serializers.ListField(child=serializers.UUIDField(), required=False)
+
+    class Meta:
+        model = Note
+        fields = ("op", "id", "title", "body", "is_public", "tags")
+        extra_kwargs = {"title": {"required": False}, "body": {"required": False}}
+
+    def validate(self, attrs):
+        if attrs["op"] == "create":
+            missing = [field for field in ("title", "body") if field not in attrs]
+            if missing:
+                raise serializers.ValidationError(
+                    {field: ["This field is required."] for field in missing}
+                )
+        elif "id" not in attrs:
+            raise serializers.ValidationError({"id": ["This field is required."]})
+        return attrs
+
+
+class NoteImportSerializer(serializers.Serializer):
+    file = serializers.FileField(help_text="NDJSON file with one note per line")
+
+
+class NoteChangesSerializer(serializers.Serializer):
+    """
+    Validates the query params of a sync, see `NoteChangesView`
+    """
+    since = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_limit(self, limit):
+        maximum = settings.NOTES_CHANGE_LOG["MAX_PAGE_SIZE"]
+        if limit > maximum:
+            raise serializers.ValidationError(
+                f"Ensure this value is less than or equal to {maximum}."
+            )
+        return limit
@@ -0,0 +1,126 @@
+import contextvars
+import functools
+import hashlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from notes.querysets import MergedQuerySet
+
+# Alias of the shard of the user whose request is in progress, set by
+# `notes.mixins.ShardMixin`. Queries of sharded models without an instance go there.
+current_shard = contextvars.ContextVar("current_shard", default=None)
+
+# Notes and their tag relations are partitioned by author
+SHARDED_MODELS = {"notes.note", "notes.note_tags"}
+# Tags are written to "default" and copied to every shard, so joins stay on one database
+REFERENCE_MODELS = {"notes.tag"}
+
+
+def get_shards():
+    return settings.NOTE_SHARDS
+
+
+def is_sharded():
+    return bool(settings.NOTE_SHARDS)
+
+
+@functools.lru_cache(maxsize=65536)
+def _rendezvous(shards, author_id):
+    return max(shards, key=lambda alias: hashlib.md5(f"{alias}:{author_id}".encode()).digest())
+
+
+def shard_for_author(author_id):
+    """
+    Returns the alias of the shard holding the notes of the author `author_id`.
+    Rendezvous hashing: adding a shard only moves the authors that now hash to it.
+    """
+    if not is_sharded():
+        return DEFAULT_DB_ALIAS
+    return _rendezvous(tuple(settings.NOTE_SHARDS), author_id)
+
+
+@contextmanager
+def using_shard_of(author):
+    """
+    Routes the queries of sharded models in the block to the shard of `author`, yields its
+    alias
+    """
+    alias = shard_for_author(author.pk)
+    token = current_shard.set(alias if is_sharded() else None)
+    try:
+        yield alias
+    finally:
+        current_shard.reset(token)
+
+
+def shard_querysets(queryset):
+    """
+    Returns `queryset` on every shard, or only `queryset` without sharding. The querysets
+    of a `MergedQuerySet` are returned on every shard each.
+    """
+    querysets = queryset.querysets if isinstance(queryset, MergedQuerySet) else [queryset]
+    if not is_sharded():
+        return querysets
+    return [queryset.using(alias) for queryset in querysets for alias in get_shards()]
+
+
+def copy_targets():
+    """
+    Returns the shards the tags are copied to, all but "default" which holds the originals
+    """
+    return [alias for alias in get_shards() if alias != DEFAULT_DB_ALIAS]
+
+
+class ShardRouter:
+    """
+    Routes notes and their tag relations to the shard of their author when
+    settings.NOTE_SHARDS is set: by the note passed as instance, else by the database of the
+    instance, else by `current_shard`. Tags are written to "default" (see
+    `TagQuerySet.copy_to_shards`) and read from the shard of the request, the related
+    instance or "default".
+    Everything else is left to the next router, apart from objects related to instances of
+    a shard (e.g. the author of a note), which are read from "default".
+    """
+
+    def _db_for_model(self, model, hints):
+        label = model._meta.label_lower
+        instance = hints.get("instance")
+        if label in SHARDED_MODELS or label in REFERENCE_MODELS:
+            author_id = getattr(instance, "author_id", None)
+            if author_id is not None:
+                return shard_for_author(author_id)
+            if instance is not None and instance._state.db in get_shards():
+                return instance._state.db
+            return current_shard.get()
+        if instance is not None and instance._state.db in copy_targets():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded():
+            return None
+        return self._db_for_model(model, hints)
+
+    def db_for_write(self, model, **hints):
+        if not is_sharded():
+            return None
+        if model._meta.label_lower in REFERENCE_MODELS:
+            return DEFAULT_DB_ALIAS
+        return self._db_for_model(model, hints)
+
+
+class ShardedQuerySet(MergedQuerySet):
+    """
+    The same query on several shards, see `MergedQuerySet`.
+    Ranks of the full text search are computed per shard, from the statistics of its notes.
+    """
+
+    @classmethod
+    def fan_out(cls, queryset):
+        """
+        Returns `queryset` on every shard, or `queryset` itself without sharding
+        """
+        if not is_sharded():
+            return queryset
+        return cls(shard_querysets(queryset))
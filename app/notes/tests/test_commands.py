@@ -0,0 +1,314 @@
+import json
+import tempfile
+import tracemalloc
+from io import StringIO
+
+from authors.models import Author
+from authors.urls import urlpatterns as author_urlpatterns
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase
+from model_bakery import baker
+from notes.models import Note, NoteChange, NoteChangeHorizon, Tag
+from notes.urls import urlpatterns as note_urlpatterns
+
+
+class TestImportNotesCommand(TestCase):
+    """
+    Test cases for the `import_notes` management command.
+    """
+
+    def setUp(self):
+        self.author = baker.make(Author, username="author")
+
+    def write_lines(self, lines):
+        """
+        Returns a temporary NDJSON file holding `lines`.
+        """
+        file = tempfile.NamedTemporaryFile("w", suffix=".ndjson")
+        file.writelines(json.dumps(line) + "\n" for line in lines)
+        file.flush()
+        self.addCleanup(file.close)
+        return file
+
+    def test_import(self):
+        """
+        Test importing a file with a valid and an invalid line.
+        """
+        file = self.write_lines([{"title": "title", "body": "body", "tags": ["tag"]}, {}])
+        stdout, stderr = StringIO(), StringIO()
+        call_command("import_notes", "author", file.name, stdout=stdout, stderr=stderr)
+        self.assertIn("Imported 1 notes, skipped 1 lines", stdout.getvalue())
+        self.assertIn("Line 2", stderr.getvalue())
+        self.assertEqual(Note.objects.get(author=self.author).tags.get().title, "tag")
+
+    def test_unknown_author(self):
+        """
+        Test that importing for an unknown author fails.
+        """
+        file = self.write_lines([])
+        with self.assertRaises(CommandError):
+            call_command("import_notes", "unknown", file.name)
+
+    def test_import_memory_is_bounded(self):
+        """
+        Test that the peak memory while importing stays well below the size of the file.
+        """
+        body = "x" * 2000
+        file = self.write_lines({"title": f"note {i}", "body": body} for i in range(3000))
+        tracemalloc.start()
+        call_command("import_notes", "author", file.name, "--chunk-size", "100",
+                     stdout=StringIO())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertEqual(Note.objects.count(), 3000)
+        self.assertLess(peak, 3000 * len(body) / 4)
+
+
+class TestBenchmarkCommand(TestCase):
+    """
+    Test cases for the `benchmark` management command.
+    """
+
+    def test_benchmark(self):
+        """
+        Test that every route is benchmarked successfully and the dataset is rolled back.
+        """
+        output = tempfile.NamedTemporaryFile(suffix=".json")
+        self.addCleanup(output.close)
+        call_command(
+            "benchmark", "--notes", "50", "--authors", "3", "--tags", "10",
+            "--iterations", "2", "--warmup", "0", "--output", output.name, stdout=StringIO(),
+        )
+        report = json.load(output)
+
+        self.assertEqual(report["dataset"]["notes"], 50)
+        self.assertEqual(
+            {result["name"] for result in report["routes"]},
+            {pattern.name for pattern in note_urlpatterns + author_urlpatterns},
+        )
+        for result in report["routes"]:
+            self.assertLess(result["status"], 400, result["path"])
+            self.assertEqual(set(result["latency_ms"]), {"p50", "p95", "p99", "mean"})
+            self.assertGreater(result["allocated_bytes"], 0)
+        self.assertFalse(Note.objects.exists() or Tag.objects.exists() or Author.objects.exists())
+
+    def test_invalid_iterations(self):
+        with self.assertRaises(CommandError):
+            call_command("benchmark", "--iterations", "1")
+
+
+class TestBenchmarkCompressionCommand(TestCase):
+    """
+    Test cases for the `benchmark_compression` management command.
+    """
+
+    def test_benchmark_compression(self):
+        """
+        Test that both profiles are benchmarked, compression shrinks the stored bodies and
+        the dataset is rolled back.
+        """
+        output = tempfile.NamedTemporaryFile(suffix=".json")
+        self.addCleanup(output.close)
+        call_command(
+            "benchmark_compression", "--notes", "20", "--authors", "2", "--tags", "5",
+            "--body-words", "500", "--iterations", "2", "--warmup", "0",
+            "--output", output.name, stdout=StringIO(),
+        )
+        report = json.load(output)
+
+        plain, compressed = report["results"]
+        self.assertEqual((plain["profile"], compressed["profile"]), ("plain", "compressed"))
+        self.assertEqual(plain["storage"]["stored_bytes"], plain["storage"]["text_bytes"])
+        self.assertEqual(compressed["storage"]["text_bytes"], plain["storage"]["text_bytes"])
+        self.assertLess(compressed["storage"]["stored_bytes"], plain["storage"]["text_bytes"] / 2)
+        for result in plain["routes"] + compressed["routes"]:
+            self.assertLess(result["status"], 400, result["path"])
+        self.assertFalse(Note.objects.exists() or Tag.objects.exists() or Author.objects.exists())
+
+    def test_invalid_body_words(self):
+        with self.assertRaises(CommandError):
+            call_command("benchmark_compression", "--body-words", "-1")
+
+
+class TestBenchmarkSerializersCommand(TestCase):
+    """
+    Test cases for the `benchmark_serializers` management command.
+    """
+
+    def test_benchmark_serializers(self):
+        """
+        Test that both serializers are timed, render the same JSON and the dataset is rolled
+        back.
+        """
+        output = tempfile.NamedTemporaryFile(suffix=".json")
+        self.addCleanup(output.close)
+        call_command(
+            "benchmark_serializers", "--notes", "20", "--authors", "2", "--tags", "5",
+            "--list-size", "10", "--repeat", "2", "--output", output.name, stdout=StringIO(),
+        )
+        report = json.load(output)
+
+        self.assertTrue(report["identical_json"])
+        self.assertEqual(
+            [(result["name"], result["notes"]) for result in report["results"]],
+            [("model_serializer", 10), ("values_serializer", 10)],
+        )
+        for result in report["results"]:
+            self.assertEqual(set(result["per_note_us"]), {"read", "serialize", "render", "total"})
+        self.assertFalse(Note.objects.exists() or Tag.objects.exists() or Author.objects.exists())
+
+    def test_invalid_list_size(self):
+        with self.assertRaises(CommandError):
+            call_command("benchmark_serializers", "--list-size", "0")
+
+
+class TestBenchmarkBulkCommand(TestCase):
+    """
+    Test cases for the `benchmark_bulk` management command.
+    """
+
+    def test_benchmark_bulk(self):
+        """
+        Test that both write paths succeed for every batch, the bulk view with a constant
+        number of queries, and the dataset is rolled back.
+        """
+        output = tempfile.NamedTemporaryFile(suffix=".json")
+        self.addCleanup(output.close)
+        call_command(
+            "benchmark_bulk", "--notes", "20", "--authors", "2", "--tags", "5",
+            "--batch-sizes", "1,5", "--repeat", "1", "--output", output.name, stdout=StringIO(),
+        )
+        report = json.load(output)
+
+        self.assertEqual(
+            [(result["operation"], result["notes"]) for result in report["results"]],
+            [("create", 1), ("create", 5), ("update", 1), ("update", 5)],
+        )
+        for result in report["results"]:
+            self.assertEqual(result["bulk"]["statuses"], [200])
+            self.assertTrue(all(code < 400 for code in result["per_note"]["statuses"]))
+            self.assertGreater(result["bulk"]["notes_per_second"], 0)
+        creates = [result["bulk"]["queries"] for result in report["results"][:2]]
+        self.assertEqual(creates[0], creates[1])
+        self.assertFalse(Note.objects.exists() or Tag.objects.exists() or Author.objects.exists())
+
+    def test_invalid_batch_sizes(self):
+        with self.assertRaises(CommandError):
+            call_command("benchmark_bulk", "--batch-sizes", "10,1001")
+
+
+class TestCompactChangesCommand(TestCase):
+    """
+    Test cases for the `compact_changes` management command.
+    """
+
+    def test_compact(self):
+        """
+        Test that only the last change of every object is kept and tombstones are dropped
+        after the retention, moving the horizon.
+        """
+        note = baker.make(Note)
+        note.title = "changed"
+        note.save()
+        deleted = baker.make(Note)
+        deleted_id = deleted.pk
+        deleted.delete()
+        stdout = StringIO()
+        call_command("compact_changes", stdout=stdout)
+        self.assertIn("Dropped 2 superseded changes and 0 tombstones", stdout.getvalue())
+        self.assertEqual(
+            list(NoteChange.objects.values_list("object_id", "deleted")),
+            [(str(note.pk), False), (str(deleted_id), True)],
+        )
+
+        tombstone = NoteChange.objects.get(deleted=True)
+        call_command("compact_changes", "--retention-days", "0", stdout=StringIO())
+        self.assertEqual(NoteChange.objects.count(), 1)
+        self.assertEqual(NoteChangeHorizon.objects.get().seq, tombstone.seq)
+
+    def test_public_notes_stay_public(self):
+        """
+        Test that the last change of a note made private stays visible to other users.
+        """
+        note = baker.make(Note, is_public=True)
+        note.is_public = False
+        note.save()
+        note.title = "private"
+        note.save()
+        call_command("compact_changes", stdout=StringIO())
+        self.assertTrue(NoteChange.objects.get().public)
+
+    def test_invalid_retention(self):
+        with self.assertRaises(CommandError):
+            call_command("compact_changes", "--retention-days", "-1")
+
+
+class TestBenchmarkConcurrencyCommand(TransactionTestCase):
+    """
+    Test cases for the `benchmark_concurrency` management command, its clients need the
+    dataset committed.
+    """
+
+    def test_benchmark_concurrency(self):
+        """
+        Test that the sync and async views are benchmarked and the dataset is deleted.
+        """
+        output = tempfile.NamedTemporaryFile(suffix=".json")
+        self.addCleanup(output.close)
+        call_command(
+            "benchmark_concurrency", "--notes", "20", "--authors", "2", "--tags", "5",
+            "--clients", "1,3", "--requests", "2", "--output", output.name, stdout=StringIO(),
+        )
+        report = json.load(output)
+
+        self.assertEqual(
+            {(result["server"], result["clients"]) for result in report["results"]},
+            {("wsgi", 1), ("wsgi", 3), ("asgi", 1), ("asgi", 3)},
+        )
+        for result in report["results"]:
+            self.assertEqual(result["errors"], 0, result["name"])
+            self.assertEqual(result["requests"], 2 * result["clients"])
+        self.assertFalse(Note.objects.exists() or Tag.objects.exists() or Author.objects.exists())
+
+    def test_invalid_clients(self):
+        with self.assertRaises(CommandError):
+            call_command("benchmark_concurrency", "--clients", "1,x")
+
+
+class TestBenchmarkSQLiteCommand(TransactionTestCase):
+    """
+    Test cases for the `benchmark_sqlite` management command, its clients need the dataset
+    committed.
+    """
+
+    def test_benchmark_sqlite(self):
+        """
+        Test that readers and writers run on both profiles and the dataset is deleted.
+        """
+        output = tempfile.NamedTemporaryFile(suffix=".json")
+        self.addCleanup(output.close)
+        call_command(
+            "benchmark_sqlite", "--notes", "20", "--authors", "2", "--tags", "5",
+            "--clients", "1,4", "--requests", "2", "--write-ratio", "0.5",
+            "--output", output.name, stdout=StringIO(),
+        )
+        report = json.load(output)
+
+        self.assertEqual(
+            [(result["profile"], result["clients"], result["writers"])
+             for result in report["results"]],
+            [("stock", 1, 0), ("stock", 4, 2), ("tuned", 1, 0), ("tuned", 4, 2)],
+        )
+        for result in report["results"]:
+            # Writers may hit table locks of the in-memory test database, which has no busy
+            # timeout
+            if not result["writers"]:
+                self.assertEqual(result["errors"], 0, result["profile"])
+            readers = result["clients"] - result["writers"]
+            self.assertEqual(result["reads"]["requests"], 2 * readers)
+        self.assertEqual(report["results"][-1]["writes"]["requests"], 4)
+        self.assertFalse(Note.objects.exists() or Tag.objects.exists() or Author.objects.exists())
+
+    def test_invalid_write_ratio(self):
+        with self.assertRaises(CommandError):
+            call_command("benchmark_sqlite", "--write-ratio", "2")
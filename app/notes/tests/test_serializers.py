@@ -0,0 +1,71 @@
+from authors.models import Author
+from django.test import override_settings
+from hypothesis import given, settings
+from hypothesis import strategies as st
+from hypothesis.extra.django import TestCase
+from notes.models import Note, Tag
+from notes.serializers import NoteSerializer, TagSerializer, ValuesSerializer
+from rest_framework.renderers import JSONRenderer
+
+# Text SQLite stores as given: no surrogates and no NUL characters
+text = st.text(st.characters(blacklist_categories=("Cs",), blacklist_characters="\x00"))
+notes = st.lists(
+    st.fixed_dictionaries({
+        "title": text.map(lambda title: title[:128]),
+        "body": st.one_of(text, text.map(lambda body: body * 20)),
+        "is_public": st.booleans(),
+        "tags": st.sets(st.integers(min_value=0, max_value=3)),
+    }),
+    max_size=8,
+)
+note_fields = st.one_of(
+    st.none(), st.sets(st.sampled_from(list(NoteSerializer().fields)))
+)
+
+
+@override_settings(NOTES_COMPRESSION={"MIN_LENGTH": 64, "LEVEL": 6})
+class TestValuesSerializer(TestCase):
+    """
+    Property based tests of `ValuesSerializer` against the model serializers it replaces
+    for lists.
+    """
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    @settings(max_examples=50, deadline=None)
+    @given(notes=notes, fields=note_fields)
+    def test_notes(self, notes, fields):
+        """
+        Test that notes render to the same JSON, also with sparse fields and compressed
+        bodies.
+        """
+        author = Author.objects.create(username="author")
+        tags = [Tag.objects.create(title=f"tag {i}") for i in range(4)]
+        for data in notes:
+            note = Note.objects.create(
+                author=author, title=data["title"], body=data["body"],
+                is_public=data["is_public"],
+            )
+            note.tags.set([tags[i] for i in data["tags"]])
+
+        queryset = Note.objects.with_tags().order_by("-id")
+        serializer = NoteSerializer(fields=fields)
+        expected = self.render(NoteSerializer(queryset, many=True, fields=fields).data)
+        values = ValuesSerializer(serializer)
+        self.assertEqual(
+            self.render(values.to_representation(list(values.values_list(queryset)))), expected
+        )
+
+    @settings(max_examples=25, deadline=None)
+    @given(titles=st.lists(text.map(lambda title: title[:128]), unique_by=Tag.normalize_title))
+    def test_tags(self, titles):
+        for title in titles:
+            Tag.objects.create(title=title)
+
+        queryset = Tag.objects.order_by("title")
+        expected = self.render(TagSerializer(queryset, many=True).data)
+        values = ValuesSerializer(TagSerializer())
+        self.assertEqual(
+            self.render(values.to_representation(list(values.values_list(queryset)))), expected
+        )
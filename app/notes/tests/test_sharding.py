@@ -0,0 +1,223 @@
+from io import StringIO
+from unittest import skipUnless
+
+from authors.authentication import token_cache
+from authors.models import Author
+from django.conf import settings
+from django.core.management import call_command
+from django.test import override_settings
+from model_bakery import baker
+from notes.models import Note, Tag
+from notes.sharding import ShardedQuerySet, shard_for_author
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from app.tests.utils import APIViewTest
+
+SHARDS = ["shard_1", "shard_2"]
+# The shard databases are only configured with sharding (see settings.NOTE_SHARDS), the
+# tests run with NOTE_SHARDS=shard_1,shard_2 in the environment
+CONFIGURED_SHARDS = [alias for alias in SHARDS if alias in settings.DATABASES]
+requires_shards = skipUnless(
+    CONFIGURED_SHARDS == SHARDS, f"Run with NOTE_SHARDS={','.join(SHARDS)}"
+)
+
+
+@requires_shards
+@override_settings(NOTE_SHARDS=SHARDS)
+class TestShardedNotes(APIViewTest):
+    """
+    Test cases for the notes partitioned across two shards by author.
+    """
+    databases = {"default", *CONFIGURED_SHARDS}
+
+    def setUp(self):
+        super().setUp()
+        token_cache.clear()
+        # An author on the other shard than the authenticated one
+        self.shard = shard_for_author(self.auth_user.pk)
+        self.other_author = baker.make(Author)
+        while shard_for_author(self.other_author.pk) == self.shard:
+            self.other_author = baker.make(Author)
+        self.other_shard = shard_for_author(self.other_author.pk)
+        self.tag = baker.make(Tag)
+
+    def make_note(self, author, **kwargs):
+        return Note.objects.create(author=author, title="title", body="body", **kwargs)
+
+    def test_notes_are_stored_in_the_shard_of_their_author(self):
+        """
+        Test that notes created through the API land in the shard of the author only, with
+        ids unique across the shards.
+        """
+        data = {"title": "title", "body": "body", "tags": [str(self.tag.pk)]}
+        response = self.post("/notes/note/create/", data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        note = Note.objects.using(self.shard).get(pk=response.json["id"])
+        self.assertEqual(list(note.tags.all()), [self.tag])
+        self.assertFalse(Note.objects.using("default").exists())
+        self.assertFalse(Note.objects.using(self.other_shard).exists())
+
+        other_note = self.make_note(self.other_author)
+        self.assertEqual(other_note._state.db, self.other_shard)
+        self.assertGreater(other_note.pk, note.pk)
+
+    def test_tags_are_copied_to_the_shards(self):
+        """
+        Test that tags are written to "default" and copied to every shard, also when renamed
+        and deleted along with their relations.
+        """
+        self.assertTrue(all(Tag.objects.using(alias).filter(pk=self.tag.pk).exists()
+                            for alias in SHARDS))
+        self.tag.title = "renamed"
+        self.tag.save()
+        self.assertEqual(Tag.objects.using(self.other_shard).get(pk=self.tag.pk).title, "renamed")
+
+        note = self.make_note(self.auth_user)
+        note.tags.add(self.tag)
+        self.tag.delete()
+        self.assertFalse(any(Tag.objects.using(alias).exists() for alias in SHARDS))
+        self.assertFalse(Note.tags.through.objects.using(self.shard).exists())
+
+    def test_detail(self):
+        """
+        Test reading, updating and deleting a note of the authenticated user in its shard.
+        """
+        note = self.make_note(self.auth_user)
+        url = f"/notes/note/{note.pk}/"
+        self.assertEqual(self.get(url).json["title"], "title")
+        response = self.patch(url, {"title": "new", "tags": [str(self.tag.pk)]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        note = Note.objects.using(self.shard).get(pk=note.pk)
+        self.assertEqual((note.title, note.version), ("new", 3))
+        self.assertEqual(self.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Note.objects.using(self.shard).exists())
+
+    def test_list_merges_the_shards(self):
+        """
+        Test that the list fans out to the shards and pages through the merged notes, newest
+        first.
+        """
+        notes = []
+        for i in range(3):
+            notes.append(self.make_note(self.auth_user))
+            notes.append(self.make_note(self.other_author, is_public=True))
+            self.make_note(self.other_author)
+        expected = sorted((note.pk for note in notes), reverse=True)
+
+        ids, url = [], "/notes/note/list/?page_size=2"
+        while url:
+            response = self.get(url)
+            ids += [note["id"] for note in response.json["results"]]
+            url = response.json["next"]
+        self.assertEqual(ids, expected)
+
+        response = self.get("/notes/note/list/", auth=False)
+        self.assertEqual([note["id"] for note in response.json["results"]],
+                         [note.pk for note in reversed(notes) if note.is_public])
+
+        response = self.get("/notes/async/note/list/")
+        self.assertEqual([note["id"] for note in response.json["results"]], expected)
+
+        public = self.make_note(self.other_author, is_public=True)
+        public.tags.add(self.tag)
+        response = self.get("/notes/note/list/?format=columnar&page_size=2")
+        self.assertEqual(response.json["results"]["id"], [public.pk, expected[0]])
+        self.assertEqual(response.json["results"]["tags"], [[str(self.tag.pk)], []])
+
+    def test_list_search_and_validators(self):
+        """
+        Test the full text search and the ETag of the list across the shards.
+        """
+        match = self.make_note(self.other_author, is_public=True)
+        match.body = "unique words"
+        match.save()
+        self.make_note(self.auth_user)
+        response = self.get("/notes/note/list/?search=unique")
+        self.assertEqual([note["id"] for note in response.json["results"]], [match.pk])
+
+        response = self.get("/notes/note/list/")
+        not_modified = self.get("/notes/note/list/",
+                                headers={"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        # The change of a note in a shard is logged once its transaction commits
+        with self.captureOnCommitCallbacks(using=self.other_shard, execute=True):
+            self.make_note(self.other_author, is_public=True)
+        modified = self.get("/notes/note/list/",
+                            headers={"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(modified.status_code, status.HTTP_200_OK)
+
+    def test_tag_detail(self):
+        """
+        Test that the tags of the notes of the user are found in their shard.
+        """
+        note = self.make_note(self.auth_user)
+        note.tags.add(self.tag)
+        response = self.get(f"/notes/tag/{self.tag.pk}/")
+        self.assertEqual(response.json["title"], self.tag.title)
+
+    def test_bulk(self):
+        """
+        Test that the bulk operations write to the shard of the user.
+        """
+        data = [{"op": "create", "title": "title", "body": "body", "tags": [str(self.tag.pk)]}]
+        self.assertEqual(self.post("/notes/note/bulk/", data).status_code, status.HTTP_200_OK)
+        self.assertEqual(Note.objects.using(self.shard).get().tags.get(), self.tag)
+        self.assertFalse(Note.objects.using(self.other_shard).exists())
+
+    def test_deleting_an_author_deletes_their_notes(self):
+        self.make_note(self.other_author)
+        self.other_author.delete()
+        self.assertFalse(Note.objects.using(self.other_shard).exists())
+
+    def test_sharded_queryset_aggregate(self):
+        self.make_note(self.auth_user)
+        self.make_note(self.other_author)
+        notes = ShardedQuerySet.fan_out(Note.objects.all())
+        self.assertEqual(notes.count(), 2)
+        self.assertEqual(notes.order_by("id")[1].author, self.other_author)
+
+
+@requires_shards
+class TestRebalanceNotesCommand(APIViewTest):
+    """
+    Test cases for the `rebalance_notes` management command.
+    """
+    databases = {"default", *CONFIGURED_SHARDS}
+
+    def test_rebalance(self):
+        """
+        Test that notes written unsharded are moved to the shards of their authors with
+        their tags, and stay searchable.
+        """
+        authors = baker.make(Author, _quantity=6)
+        tag = baker.make(Tag)
+        with override_settings(NOTE_SHARDS=[]):
+            for author in authors:
+                note = Note.objects.create(author=author, title="title", body="moved body")
+                note.tags.add(tag)
+
+        with override_settings(NOTE_SHARDS=SHARDS):
+            stdout = StringIO()
+            call_command("rebalance_notes", "--dry-run", stdout=stdout)
+            self.assertIn("Would move 6 notes", stdout.getvalue())
+            self.assertEqual(Note.objects.using("default").count(), 6)
+
+            call_command("rebalance_notes", "--batch-size", "1", stdout=StringIO())
+            self.assertFalse(Note.objects.using("default").exists())
+            for author in authors:
+                note = Note.objects.using(shard_for_author(author.pk)).get(author=author)
+                self.assertEqual(list(note.tags.all()), [tag])
+
+            token = Token.objects.get(user=authors[0])
+            response = self.app.get("/notes/note/list/?search=moved",
+                                    headers={"Authorization": f"Token {token.key}"})
+            self.assertEqual(len(response.json["results"]), 1)
+
+            # New notes get ids above the moved ones
+            new_note = Note.objects.create(author=authors[0], title="title", body="body")
+            self.assertGreater(new_note.pk, max(note["id"] for note in response.json["results"]))
+
+            stdout = StringIO()
+            call_command("rebalance_notes", stdout=stdout)
+            self.assertIn("Moved 0 notes", stdout.getvalue())
@@ -1,9 +1,29 @@
+import base64
+import importlib
+import json
+import tracemalloc
+import uuid
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from authors.authentication import token_cache
 from authors.models import Author
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
 from model_bakery import baker
-from notes.models import Note, Tag
+from notes import search
+from notes.fields import DECOMPRESS_FUNCTION, compress, register_functions
+from notes.filters import NoteTagFilter
+from notes.models import Note, NoteChange, Tag
+from notes.pagination import NoteCursorPagination
+from notes.views import NoteBulkView
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 
-from app.tests.utils import APIViewTest
+from app.tests.utils import APIViewTest, count_sqlite_steps
 
 
 class TestNoteCreateView(APIViewTest):
@@ -56,6 +76,303 @@ class TestNoteCreateView(APIViewTest):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class TestNoteBulkView(APIViewTest):
+    """
+    Test cases for the `NoteBulkView` API view.
+    """
+    url = '/notes/note/bulk/'
+
+    def setUp(self):
+        super().setUp()
+        self.tags = baker.make(Tag, _quantity=2)
+        self.note = baker.make(Note, title="old", tags=self.tags[:1], author=self.auth_user)
+        self.other_note = baker.make(Note, author=self.auth_user)
+
+    def test_mixed_operations(self):
+        """
+        Test creating, updating and deleting notes in one request.
+        """
+        data = [
+            {"op": "create", "title": "first", "body": "body", "tags": [str(self.tags[0].pk)]},
+            {"op": "update", "id": self.note.pk, "title": "new", "tags": [str(self.tags[1].pk)]},
+            {"op": "create", "title": "second", "body": "body", "is_public": True},
+            {"op": "delete", "id": self.other_note.pk},
+        ]
+        response = self.post(self.url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(result["op"], result["status"]) for result in response.json],
+            [("create", 201), ("update", 200), ("create", 201), ("delete", 204)],
+        )
+
+        first = Note.objects.get(pk=response.json[0]["id"])
+        self.assertEqual(first.author, self.auth_user)
+        self.assertEqual(list(first.tags.all()), self.tags[:1])
+        self.assertTrue(Note.objects.get(pk=response.json[2]["id"]).is_public)
+        version = self.note.version
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.title, "new")
+        self.assertEqual(self.note.version, version + 1)
+        self.assertEqual(list(self.note.tags.all()), self.tags[1:])
+        self.assertFalse(Note.objects.filter(pk=self.other_note.pk).exists())
+
+    def test_invalid_operation_applies_nothing(self):
+        """
+        Test that nothing is applied if one operation refers to a note of another author.
+        """
+        foreign_note = baker.make(Note)
+        data = [
+            {"op": "create", "title": "title", "body": "body"},
+            {"op": "delete", "id": foreign_note.pk},
+        ]
+        response = self.post(self.url, data, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json, [{}, {"id": ["Not found."]}])
+        self.assertEqual(Note.objects.count(), 3)
+
+    def test_validation_errors_per_operation(self):
+        """
+        Test that missing fields and unknown tags are reported for their operation.
+        """
+        data = [
+            {"op": "create", "body": "body"},
+            {"op": "update", "title": "title"},
+            {"op": "update", "id": self.note.pk, "tags": [str(uuid.uuid4())]},
+        ]
+        response = self.post(self.url, data, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("title", response.json[0])
+        self.assertIn("id", response.json[1])
+
+        response = self.post(self.url, data[2:], expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("tags", response.json[0])
+
+    def test_too_many_operations(self):
+        """
+        Test that a request with more than the allowed number of operations is rejected.
+        """
+        data = [{"op": "create", "title": "title", "body": "body"}] * 3
+        with patch.object(NoteBulkView, "max_operations", 2):
+            response = self.post(self.url, data, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_is_constant(self):
+        """
+        Test that the number of queries does not grow with the number of operations.
+        """
+        def count_queries(quantity):
+            notes = baker.make(Note, author=self.auth_user, _quantity=quantity * 2)
+            tag_ids = [str(tag.pk) for tag in self.tags]
+            data = [
+                *({"op": "create", "title": "t", "body": "b", "tags": tag_ids}
+                  for _ in range(quantity)),
+                *({"op": "update", "id": note.pk, "title": "t", "tags": tag_ids}
+                  for note in notes[:quantity]),
+                *({"op": "delete", "id": note.pk} for note in notes[quantity:]),
+            ]
+            token_cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.app.post(self.url, params=json.dumps(data), content_type="application/json",
+                              headers={"Authorization": f"Token {self.token.key}"})
+            return len(queries)
+
+        self.assertEqual(count_queries(2), count_queries(20))
+
+    def test_bulk_changes_invalidate_public_list(self):
+        """
+        Test that notes created in bulk show up in the cached public list.
+        """
+        self.assertEqual(self.get('/notes/note/list/', auth=False).json["results"], [])
+        data = [{"op": "create", "title": "title", "body": "body", "is_public": True}]
+        self.post(self.url, data)
+        self.assertEqual(len(self.get('/notes/note/list/', auth=False).json["results"]), 1)
+
+    def test_bulk_without_being_logged_in(self):
+        """
+        Test that bulk operations require authentication.
+        """
+        response = self.post(self.url, [], auth=False, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestNoteExportView(APIViewTest):
+    """
+    Test cases for the `NoteExportView` API view.
+    """
+    url = '/notes/note/export/'
+
+    def stream(self):
+        """
+        Returns the streamed export of the authenticated user.
+        """
+        response = self.client.get(self.url, HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response
+
+    def test_export_own_notes(self):
+        """
+        Test that the export holds one line per own note in the format of the note list.
+        """
+        tags = baker.make(Tag, _quantity=2)
+        own_ids = {note.pk for note in baker.make(Note, tags=tags, author=self.auth_user,
+                                                  _quantity=3)}
+        baker.make(Note, is_public=True)
+        response = self.stream()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        exported = [json.loads(line) for line in lines]
+        listed = self.get('/notes/note/list/').json["results"]
+        own_listed = sorted((note for note in listed if note["id"] in own_ids),
+                            key=lambda note: note["id"])
+        self.assertEqual(exported, own_listed)
+
+    @override_settings(NOTES_EXPORT_CHUNK_SIZE=10)
+    def test_export_loads_tags_per_chunk(self):
+        """
+        Test that the notes are read in chunks with one tag query per chunk.
+        """
+        baker.make(Note, tags=baker.make(Tag, _quantity=2), author=self.auth_user,
+                   _quantity=35)
+        with CaptureQueriesContext(connection) as queries:
+            lines = list(self.stream().streaming_content)
+        self.assertEqual(len(lines), 35)
+        tag_queries = [query for query in queries if 'FROM "notes_tag"' in query["sql"]]
+        self.assertEqual(len(tag_queries), 4)
+
+    @override_settings(NOTES_EXPORT_CHUNK_SIZE=100)
+    def test_export_memory_is_bounded(self):
+        """
+        Test that the peak memory while streaming stays well below the size of the export,
+        and that the number of queries only grows with the number of chunks.
+        """
+        quantity = 3000
+        Note.objects.bulk_create(
+            Note(title=f"note {i}", body="x" * 2000, author=self.auth_user)
+            for i in range(quantity)
+        )
+        response = self.stream()
+        exported = 0
+        with CaptureQueriesContext(connection) as queries:
+            tracemalloc.start()
+            for line in response.streaming_content:
+                exported += len(line)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        self.assertGreater(exported, quantity * 2000)
+        self.assertLess(peak, exported / 4)
+        # One query for the notes, read in chunks, and one for the tags of every chunk
+        self.assertEqual(len(queries), 1 + quantity // 100)
+
+    def test_export_without_being_logged_in(self):
+        """
+        Test that the export requires authentication.
+        """
+        response = self.get(self.url, auth=False, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestNoteImportView(APIViewTest):
+    """
+    Test cases for the `NoteImportView` API view.
+    """
+    url = '/notes/note/import/'
+
+    def upload(self, lines, expect_errors=False):
+        """
+        Uploads `lines` as NDJSON file, dicts are encoded as JSON.
+        """
+        content = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+        return self.app.post(
+            self.url,
+            upload_files=[("file", "notes.ndjson", content.encode())],
+            headers={"Authorization": f"Token {self.token.key}"},
+            expect_errors=expect_errors,
+        )
+
+    def test_import_notes_with_tags(self):
+        """
+        Test that notes are created for the user with their tags resolved by title.
+        """
+        work = baker.make(Tag, title="work")
+        response = self.upload([
+            {"title": "first", "body": "body", "tags": ["Work", "new tag"]},
+            {"title": "second", "body": "body", "is_public": True},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json, {"created": 2, "error_count": 0, "errors": []})
+        first = Note.objects.get(title="first", author=self.auth_user)
+        self.assertEqual({tag.title for tag in first.tags.all()}, {"work", "new tag"})
+        self.assertIn(work, first.tags.all())
+        self.assertTrue(Note.objects.get(title="second").is_public)
+
+    def test_import_an_export(self):
+        """
+        Test that importing an export recreates the notes with the same tags, referenced
+        by their uuid, without creating tags.
+        """
+        tags = [baker.make(Tag, title="work"), baker.make(Tag, title="home")]
+        baker.make(Note, title="first", tags=tags, author=self.auth_user)
+        baker.make(Note, title="second", is_public=True, author=self.auth_user)
+        response = self.client.get('/notes/note/export/',
+                                   HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        exported = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.auth_user = baker.make(Author)
+        self.token = Token.objects.get(user=self.auth_user)
+
+        response = self.upload(exported)
+        self.assertEqual(response.json, {"created": 2, "error_count": 0, "errors": []})
+        self.assertEqual(Tag.objects.count(), 2)
+        imported = Note.objects.filter(author=self.auth_user).order_by("pk")
+        for note, data in zip(imported, exported):
+            self.assertEqual((note.title, note.body, note.is_public),
+                             (data["title"], data["body"], data["is_public"]))
+            self.assertEqual({str(tag.pk) for tag in note.tags.all()}, set(data["tags"]))
+
+    def test_import_reports_invalid_lines(self):
+        """
+        Test that invalid lines are skipped and reported with their line number.
+        """
+        response = self.upload([
+            {"title": "valid", "body": "body"},
+            "{not json",
+            "",
+            {"body": "body"},
+            {"title": "title", "body": "body", "tags": "work"},
+            ["title", "body"],
+        ])
+        self.assertEqual(response.json["created"], 1)
+        self.assertEqual(response.json["error_count"], 4)
+        self.assertEqual([error["line"] for error in response.json["errors"]], [2, 4, 5, 6])
+        self.assertIn("title", response.json["errors"][1]["errors"])
+        self.assertIn("tags", response.json["errors"][2]["errors"])
+
+    @override_settings(NOTES_IMPORT_CHUNK_SIZE=10)
+    def test_import_in_chunks(self):
+        """
+        Test that the notes are written with one bulk insert per chunk.
+        """
+        lines = [{"title": f"note {i}", "body": "body", "tags": ["tag"]} for i in range(25)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(lines)
+        self.assertEqual(response.json["created"], 25)
+        inserts = [
+            query for query in queries if query["sql"].startswith('INSERT INTO "notes_note"')
+        ]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_import_without_file(self):
+        """
+        Test that a request without file is rejected.
+        """
+        response = self.app.post(self.url, headers={"Authorization": f"Token {self.token.key}"},
+                                 expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class TestNoteListView(APIViewTest):
     """
     Test cases for the `NoteListView` API view.
@@ -73,7 +390,7 @@ class TestNoteListView(APIViewTest):
         self.auth_user.delete()
         response = self.app.get(url=self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.json), 5)
+        self.assertEqual(len(response.json["results"]), 5)
 
     def test_only_show_notes_of_author(self):
         """
@@ -83,7 +400,7 @@ class TestNoteListView(APIViewTest):
         baker.make(Note, _quantity=5, author=self.auth_user)
         response = self.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.json), 5)
+        self.assertEqual(len(response.json["results"]), 5)
 
     def test_search_for_content_of_the_body(self):
         """
@@ -95,7 +412,70 @@ class TestNoteListView(APIViewTest):
         baker.make(Note, body="Not included", _quantity=5, author=self.auth_user)
         first_response = self.get(f"{self.url}?search=test")
         self.assertEqual(first_response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(first_response.json), 2)
+        self.assertEqual(len(first_response.json["results"]), 2)
+
+
+class TestNoteListViewSearch(APIViewTest):
+    """
+    Test cases for the full text search of the `NoteListView` API view.
+    """
+    url = '/notes/note/list/'
+
+    def search(self, terms):
+        """
+        Returns the ids of the notes found for the "search" query param `terms`.
+        """
+        response = self.get(self.url, params={"search": terms})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [note["id"] for note in response.json["results"]]
+
+    def test_search_title_and_body(self):
+        """
+        Test that keywords are searched in the title and in the body.
+        """
+        in_title = baker.make(Note, title="Groceries", body="milk", author=self.auth_user)
+        in_body = baker.make(Note, title="Shopping", body="groceries", author=self.auth_user)
+        baker.make(Note, title="Other", body="other", author=self.auth_user)
+        self.assertEqual(set(self.search("groceries")), {in_title.pk, in_body.pk})
+
+    def test_search_phrase_and_prefix(self):
+        """
+        Test phrase queries in double quotes and prefix queries with a trailing "*".
+        """
+        phrase = baker.make(Note, body="the quick brown fox", author=self.auth_user)
+        reversed_phrase = baker.make(Note, body="brown and quick", author=self.auth_user)
+        self.assertEqual(self.search('"quick brown"'), [phrase.pk])
+        self.assertEqual(set(self.search("qui*")), {phrase.pk, reversed_phrase.pk})
+        self.assertEqual(self.search("qui"), [])
+
+    def test_search_ranked_by_relevance(self):
+        """
+        Test that notes matching more often are returned first.
+        """
+        weak = baker.make(Note, title="note", body="django " + "filler " * 20,
+                          author=self.auth_user)
+        strong = baker.make(Note, title="django", body="django django", author=self.auth_user)
+        self.assertEqual(self.search("django"), [strong.pk, weak.pk])
+
+    def test_search_index_follows_updates_and_deletes(self):
+        """
+        Test that the index is kept in sync when notes are changed or removed.
+        """
+        note = baker.make(Note, body="before", author=self.auth_user)
+        note.body = "after"
+        note.save()
+        self.assertEqual(self.search("before"), [])
+        self.assertEqual(self.search("after"), [note.pk])
+        note.delete()
+        self.assertEqual(self.search("after"), [])
+
+    def test_search_with_fts_syntax(self):
+        """
+        Test that FTS operators in the search terms are treated as plain text.
+        """
+        note = baker.make(Note, body="NOT a (problem) OR: maybe", author=self.auth_user)
+        self.assertEqual(self.search('NOT "a ( problem" OR: *'), [note.pk])
+        self.assertEqual(len(self.search('"')), 1)
 
 
 class TestNoteListViewWithTag(APIViewTest):
@@ -124,7 +504,7 @@ class TestNoteListViewWithTag(APIViewTest):
         The response should include all notes associated with the first tag.
         """
         response_first_tag = self.get(f'{self.url}?tag={self.first_tag.pk}')
-        self.assertEqual(len(response_first_tag.json), 3)
+        self.assertEqual(len(response_first_tag.json["results"]), 3)
 
     def test_search_for_second_tag(self):
         """
@@ -132,7 +512,7 @@ class TestNoteListViewWithTag(APIViewTest):
         The response should include all notes associated with the second tag.
         """
         response_first_tag = self.get(f'{self.url}?tag={self.second_tag.pk}')
-        self.assertEqual(len(response_first_tag.json), 2)
+        self.assertEqual(len(response_first_tag.json["results"]), 2)
 
     def test_search_for_third_tag(self):
         """
@@ -140,7 +520,7 @@ class TestNoteListViewWithTag(APIViewTest):
         The response should include all notes associated with the third tag.
         """
         response_first_tag = self.get(f'{self.url}?tag={self.third_tag.pk}')
-        self.assertEqual(len(response_first_tag.json), 10)
+        self.assertEqual(len(response_first_tag.json["results"]), 10)
 
     def test_search_for_first_and_second_tag(self):
         """
@@ -148,7 +528,7 @@ class TestNoteListViewWithTag(APIViewTest):
         The response should include only the notes associated with both tags.
         """
         response_first_tag = self.get(f'{self.url}?tag={self.first_tag.pk}+{self.second_tag.pk}')
-        self.assertEqual(len(response_first_tag.json), 1)
+        self.assertEqual(len(response_first_tag.json["results"]), 1)
 
     def test_search_for_content_and_tag(self):
         """
@@ -156,7 +536,399 @@ class TestNoteListViewWithTag(APIViewTest):
         The response should include only the notes associated with both tags.
         """
         response_first_tag = self.get(f'{self.url}?search=test&tag={self.second_tag.pk}')
-        self.assertEqual(len(response_first_tag.json), 1)
+        self.assertEqual(len(response_first_tag.json["results"]), 1)
+
+
+class TestNoteListViewTagMatch(APIViewTest):
+    """
+    Test cases for the "match" modes and limits of the tag filter of the `NoteListView`.
+    """
+    url = '/notes/note/list/'
+
+    def setUp(self):
+        super().setUp()
+        self.tags = baker.make(Tag, _quantity=12)
+        self.all_tags_note = baker.make(Note, tags=self.tags, author=self.auth_user)
+        self.first_tag_note = baker.make(Note, tags=self.tags[:1], author=self.auth_user)
+        self.untagged_note = baker.make(Note, author=self.auth_user)
+        baker.make(Note, tags=self.tags, is_public=True)
+
+    def filter_ids(self, tags, match=None, expect_errors=False):
+        """
+        Returns the response for a tag filter over `tags` with the given "match" mode.
+        """
+        params = {"tag": " ".join(str(tag.pk) for tag in tags)}
+        if match:
+            params["match"] = match
+        return self.get(self.url, params=params, expect_errors=expect_errors)
+
+    def result_ids(self, response):
+        """
+        Returns the ids of the notes in a list `response`.
+        """
+        return {note["id"] for note in response.json["results"]}
+
+    def test_match_all_intersects_many_tags(self):
+        """
+        Test that "all" returns only the notes having every one of many tags.
+        """
+        response = self.filter_ids(self.tags, match="all")
+        self.assertEqual(self.result_ids(response), {self.all_tags_note.pk})
+
+    def test_match_any(self):
+        """
+        Test that "any" returns notes having at least one of the tags.
+        """
+        response = self.filter_ids(self.tags[:2], match="any")
+        self.assertEqual(
+            self.result_ids(response), {self.all_tags_note.pk, self.first_tag_note.pk}
+        )
+
+    def test_match_none(self):
+        """
+        Test that "none" returns the own notes having none of the tags.
+        """
+        response = self.filter_ids(self.tags[:1], match="none")
+        self.assertEqual(self.result_ids(response), {self.untagged_note.pk})
+
+    def test_match_all_is_a_single_aggregate_query(self):
+        """
+        Test that intersecting many tags runs one grouped subquery instead of a join per tag.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.filter_ids(self.tags, match="all")
+        note_queries = [
+            query["sql"] for query in queries.captured_queries
+            if 'FROM "notes_note"' in query["sql"]
+        ]
+        # Only the page itself, one query per side of `visible_to`, the validators are read
+        # from the change log
+        self.assertEqual(len(note_queries), 2)
+        for sql in note_queries:
+            self.assertEqual(sql.count('"notes_note_tags"'), 1)
+            self.assertIn("HAVING COUNT", sql)
+
+    def test_invalid_match_mode(self):
+        """
+        Test that an unknown "match" mode is rejected.
+        """
+        response = self.filter_ids(self.tags[:1], match="some", expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("match", response.json)
+
+    def test_too_many_tags(self):
+        """
+        Test that filtering by more than the allowed number of tags is rejected.
+        """
+        tags = baker.make(Tag, _quantity=NoteTagFilter.max_tags + 1)
+        response = self.filter_ids(tags, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("tag", response.json)
+
+
+class TestNoteListViewPagination(APIViewTest):
+    """
+    Test cases for the cursor pagination of the `NoteListView` API view.
+    """
+    url = '/notes/note/list/'
+
+    def collect_pages(self, url):
+        """
+        Follow the "next" links starting at `url` and return the ids of all visited notes.
+        """
+        ids = []
+        while url:
+            response = self.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(note["id"] for note in response.json["results"])
+            url = response.json["next"]
+        return ids
+
+    def test_default_page_size(self):
+        """
+        Test that an unbounded list is cut at the default page size.
+        """
+        baker.make(Note, _quantity=NoteCursorPagination.page_size + 5, author=self.auth_user)
+        response = self.get(self.url)
+        self.assertEqual(len(response.json["results"]), NoteCursorPagination.page_size)
+        self.assertIsNotNone(response.json["next"])
+        self.assertIsNone(response.json["previous"])
+
+    def test_page_size_is_capped(self):
+        """
+        Test that a requested page size above the maximum falls back to the maximum.
+        """
+        Note.objects.bulk_create(
+            Note(title="title", body="body", author=self.auth_user)
+            for _ in range(NoteCursorPagination.max_page_size + 1)
+        )
+        response = self.get(f"{self.url}?page_size=100000")
+        self.assertEqual(len(response.json["results"]), NoteCursorPagination.max_page_size)
+
+    def test_walk_all_pages(self):
+        """
+        Test that following the cursors returns every note exactly once, newest first.
+        """
+        notes = baker.make(Note, _quantity=7, author=self.auth_user)
+        ids = self.collect_pages(f"{self.url}?page_size=3")
+        self.assertEqual(ids, sorted((note.pk for note in notes), reverse=True))
+
+    def test_walk_pages_with_search_and_tag(self):
+        """
+        Test that the cursor keeps the "search" and "tag" filters while paging.
+        """
+        tag = baker.make(Tag)
+        matching = baker.make(Note, body="test", tags=[tag], author=self.auth_user, _quantity=5)
+        baker.make(Note, body="test", author=self.auth_user, _quantity=3)
+        baker.make(Note, body="other", tags=[tag], author=self.auth_user, _quantity=3)
+        ids = self.collect_pages(f"{self.url}?search=test&tag={tag.pk}&page_size=2")
+        self.assertEqual(ids, sorted((note.pk for note in matching), reverse=True))
+
+    def test_invalid_cursor_position(self):
+        """
+        Test that a cursor with a position that is not an id or a search rank is rejected
+        with 404 like a malformed cursor, also by the async list.
+        """
+        baker.make(Note, body="test", author=self.auth_user)
+        for url, position in (
+            (self.url, "x"),
+            (self.url, "1.5"),
+            (f"{self.url}?search=test", "x"),
+            (f"{self.url}?search=test", "nan"),
+            ("/notes/async/note/list/", "x"),
+        ):
+            cursor = base64.b64encode(f"p={position}".encode()).decode()
+            separator = "&" if "?" in url else "?"
+            response = self.get(f"{url}{separator}cursor={cursor}", expect_errors=True)
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, (url, position))
+            self.assertEqual(response.json, {"detail": "Invalid cursor"})
+
+    def test_deep_page_uses_keyset(self):
+        """
+        Test that a follow-up page is fetched by key without OFFSET or COUNT(*).
+        """
+        baker.make(Note, _quantity=6, author=self.auth_user)
+        next_url = self.get(f"{self.url}?page_size=2").json["next"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(next_url)
+        self.assertEqual(len(response.json["results"]), 2)
+        statements = " ".join(query["sql"] for query in queries.captured_queries).upper()
+        self.assertNotIn("OFFSET", statements)
+        self.assertNotIn("COUNT(", statements)
+
+
+class TestNoteViewQueryCount(APIViewTest):
+    """
+    Test cases for the number of queries issued by the note views.
+    The tags of all notes are loaded in one batch, so the count must not depend on the
+    number of notes returned.
+    """
+    list_url = '/notes/note/list/'
+    detail_url = '/notes/note/{}/'
+
+    def make_tagged_notes(self, quantity):
+        """
+        Creates `quantity` notes of the authenticated user sharing three tags.
+        """
+        tags = baker.make(Tag, _quantity=3)
+        return baker.make(Note, tags=tags, author=self.auth_user, _quantity=quantity)
+
+    def count_queries(self, url, auth=True):
+        """
+        Returns the number of queries of a GET on `url`, authenticated by the token header only.
+        """
+        headers = {"Authorization": f"Token {self.token.key}"} if auth else {}
+        token_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.app.get(url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_list_query_count_is_constant(self):
+        """
+        Test that listing many tagged notes costs as many queries as listing a few.
+        token lookup + validators (latest change, its time) + own and public notes + tags of
+        the notes
+        """
+        self.make_tagged_notes(2)
+        few = self.count_queries(self.list_url)
+        self.make_tagged_notes(40)
+        many = self.count_queries(self.list_url)
+        self.assertEqual(few, 6)
+        self.assertEqual(many, few)
+
+    def test_anonymous_list_query_count_is_constant(self):
+        """
+        Test the query count of the public list without authentication.
+        validators (latest change, its time) + notes + tags of the notes
+        """
+        baker.make(Note, tags=baker.make(Tag, _quantity=2), is_public=True, _quantity=30)
+        self.assertEqual(self.count_queries(self.list_url, auth=False), 4)
+
+    def test_detail_query_count(self):
+        """
+        Test that the detail view loads the tags of the note in a single query.
+        token lookup + validators + note + tags of the note
+        """
+        note = self.make_tagged_notes(1)[0]
+        self.assertEqual(self.count_queries(self.detail_url.format(note.pk)), 4)
+
+
+class TestNoteViewQueryPlans(APIViewTest):
+    """
+    Test cases for the query plans of the hot paths: none of their queries may read a whole
+    table, so a model or view change cannot silently drop the use of the indexes.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.tag = baker.make(Tag)
+        self.note = baker.make(Note, author=self.auth_user, tags=[self.tag], _quantity=3)[0]
+        baker.make(Note, tags=[self.tag], is_public=True, _quantity=3)
+
+    def test_list(self):
+        self.assertNoFullTableScan("/notes/note/list/")
+
+    def test_anonymous_list(self):
+        self.assertNoFullTableScan("/notes/note/list/", auth=False)
+
+    def test_list_search(self):
+        self.assertNoFullTableScan("/notes/note/list/?search=note")
+
+    def test_list_tags(self):
+        for match in ("all", "any", "none"):
+            self.assertNoFullTableScan(f"/notes/note/list/?tag={self.tag.uuid}&match={match}")
+
+    def test_detail(self):
+        self.assertNoFullTableScan(f"/notes/note/{self.note.pk}/")
+
+    def test_tag_detail(self):
+        self.assertNoFullTableScan(f"/notes/tag/{self.tag.uuid}/")
+
+    def test_export(self):
+        self.assertNoFullTableScan("/notes/note/export/")
+
+    def test_changes(self):
+        self.assertNoFullTableScan("/notes/note/changes/?since=1")
+
+    def test_list_cost_does_not_grow_with_public_notes(self):
+        """
+        Test that a page of the authenticated list reads as many rows with many public
+        notes of others as with a few, on the first and on a later page.
+        """
+        def count_steps():
+            headers = {"Authorization": f"Token {self.token.key}"}
+            first = self.app.get("/notes/note/list/?page_size=2", headers=headers)
+            first_steps = count_sqlite_steps(
+                lambda: self.app.get("/notes/note/list/?page_size=2", headers=headers)
+            )
+            later_steps = count_sqlite_steps(
+                lambda: self.app.get(first.json["next"], headers=headers)
+            )
+            return first_steps, later_steps
+
+        few = count_steps()
+        other = baker.make(Author)
+        Note.objects.bulk_create(
+            Note(title="public", body="body", author=other, is_public=True) for _ in range(2000)
+        )
+        many = count_steps()
+        # Reading the ids of all public notes took 100 times as many steps
+        for few_steps, many_steps in zip(few, many):
+            self.assertLessEqual(many_steps, few_steps + 5)
+
+    def test_changes_cost_does_not_grow_with_public_changes(self):
+        """
+        Test that a full sync reads as many rows per page with many public changes of others
+        as with a few.
+        """
+        def count_steps():
+            headers = {"Authorization": f"Token {self.token.key}"}
+            return count_sqlite_steps(
+                lambda: self.app.get("/notes/note/changes/?since=0&limit=2", headers=headers)
+            )
+
+        few = count_steps()
+        other = baker.make(Author)
+        NoteChange.objects.bulk_create(
+            NoteChange(model=NoteChange.NOTE, object_id=str(i), author_id=other.pk, public=True)
+            for i in range(2000)
+        )
+        self.assertLessEqual(count_steps(), few + 5)
+
+
+class TestNoteListViewCache(APIViewTest):
+    """
+    Test cases for the cached public note list of the `NoteListView` API view.
+    """
+    url = '/notes/note/list/'
+
+    def setUp(self):
+        super().setUp()
+        self.tag = baker.make(Tag)
+        self.note = baker.make(Note, tags=[self.tag], is_public=True)
+
+    def get_public(self, url=None):
+        """
+        Returns the ids of the anonymous note list and the number of queries it took.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(url or self.url, auth=False)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [note["id"] for note in response.json["results"]], len(queries)
+
+    def test_anonymous_list_is_cached(self):
+        """
+        Test that a repeated anonymous request is answered without queries.
+        """
+        first, first_queries = self.get_public()
+        second, second_queries = self.get_public()
+        self.assertEqual(first, second)
+        self.assertGreater(first_queries, 0)
+        self.assertEqual(second_queries, 0)
+
+    def test_cache_is_keyed_by_query_params(self):
+        """
+        Test that different query params are cached separately.
+        """
+        other = baker.make(Note, is_public=True)
+        self.get_public()
+        ids, queries = self.get_public(f"{self.url}?page_size=1")
+        self.assertEqual(ids, [other.pk])
+        self.assertGreater(queries, 0)
+
+    def test_cache_invalidated_on_note_changes(self):
+        """
+        Test that creating, updating and deleting notes invalidates the cache.
+        """
+        self.get_public()
+        new_note = baker.make(Note, is_public=True)
+        self.assertEqual(self.get_public()[0], [new_note.pk, self.note.pk])
+        new_note.is_public = False
+        new_note.save()
+        self.assertEqual(self.get_public()[0], [self.note.pk])
+        self.note.delete()
+        self.assertEqual(self.get_public()[0], [])
+
+    def test_cache_invalidated_on_tag_changes(self):
+        """
+        Test that changing the tags of a note invalidates the cache.
+        """
+        response = self.get(self.url, auth=False)
+        self.assertEqual(response.json["results"][0]["tags"], [str(self.tag.pk)])
+        self.note.tags.clear()
+        response = self.get(self.url, auth=False)
+        self.assertEqual(response.json["results"][0]["tags"], [])
+
+    def test_authenticated_list_is_not_cached(self):
+        """
+        Test that authenticated users always get their notes from the database.
+        """
+        self.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(self.url)
+        self.assertEqual(len(response.json["results"]), 1)
+        self.assertTrue(any('FROM "notes_note"' in query["sql"] for query in queries))
 
 
 class TestNoteDetailView(APIViewTest):
@@ -235,6 +1007,714 @@ class TestNoteDetailView(APIViewTest):
         self.assertTrue(Note.objects.all())
 
 
+class TestConditionalRequests(APIViewTest):
+    """
+    Test cases for ETag / Last-Modified handling of the note and tag views.
+    """
+    list_url = '/notes/note/list/'
+    detail_url = '/notes/note/{}/'
+    tag_list_url = '/notes/tag/list/'
+
+    def setUp(self):
+        super().setUp()
+        self.tag = baker.make(Tag)
+        self.note = baker.make(Note, tags=[self.tag], author=self.auth_user)
+
+    def revalidate(self, url, response, **kwargs):
+        """
+        Repeats a GET on `url` with the validators of a previous `response`.
+        """
+        return self.get(url, headers={"If-None-Match": response.headers["ETag"]}, **kwargs)
+
+    def test_detail_not_modified(self):
+        """
+        Test that an unchanged note is answered with 304 without loading it.
+        """
+        url = self.detail_url.format(self.note.pk)
+        response = self.get(url)
+        self.assertTrue(response.headers["ETag"].startswith('"'))
+        self.assertIn("Last-Modified", response.headers)
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.revalidate(url, response)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified.body, b"")
+        self.assertFalse(any('"notes_note"."body"' in query["sql"] for query in queries))
+
+    def test_detail_modified(self):
+        """
+        Test that changing a note or its tags changes its ETag.
+        """
+        url = self.detail_url.format(self.note.pk)
+        response = self.get(url)
+        self.patch(url, {"title": "new title"})
+        changed = self.revalidate(url, response)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertEqual(changed.json["title"], "new title")
+
+        self.note.tags.clear()
+        self.assertEqual(self.revalidate(url, changed).status_code, status.HTTP_200_OK)
+
+    def test_detail_modified_by_stale_copies(self):
+        """
+        Test that saves from two copies of a note loaded before either save give it
+        different versions and ETags.
+        """
+        url = self.detail_url.format(self.note.pk)
+        first, second = Note.objects.get(pk=self.note.pk), Note.objects.get(pk=self.note.pk)
+        first.title = "first"
+        first.save()
+        response = self.get(url)
+        second.title = "second"
+        second.save()
+        self.assertEqual(second.version, first.version + 1)
+        changed = self.revalidate(url, response)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertEqual(changed.json["title"], "second")
+
+    def test_detail_modified_by_tag_deletion(self):
+        """
+        Test that deleting a tag changes the ETag of its notes.
+        """
+        url = self.detail_url.format(self.note.pk)
+        response = self.get(url)
+        self.tag.delete()
+        self.assertEqual(self.revalidate(url, response).status_code, status.HTTP_200_OK)
+
+    def test_detail_if_modified_since(self):
+        """
+        Test that If-Modified-Since with the Last-Modified of the note is answered with 304.
+        """
+        url = self.detail_url.format(self.note.pk)
+        last_modified = self.get(url).headers["Last-Modified"]
+        response = self.get(url, headers={"If-Modified-Since": last_modified})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_not_modified(self):
+        """
+        Test that an unchanged list is answered with 304, for users and anonymous requests.
+        """
+        baker.make(Note, is_public=True)
+        for auth in (True, False):
+            response = self.get(self.list_url, auth=auth)
+            not_modified = self.revalidate(self.list_url, response, auth=auth)
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_modified(self):
+        """
+        Test that creating, changing and deleting notes changes the ETag of the list.
+        """
+        response = self.get(self.list_url)
+        new_note = baker.make(Note, author=self.auth_user)
+        response = self.revalidate(self.list_url, response)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        new_note.title = "changed"
+        new_note.save()
+        response = self.revalidate(self.list_url, response)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.note.delete()
+        response = self.revalidate(self.list_url, response)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json["results"]), 1)
+
+    def test_list_etag_depends_on_query_params(self):
+        """
+        Test that the ETag of another page or filter does not validate a list.
+        """
+        response = self.get(f"{self.list_url}?page_size=1")
+        other = self.revalidate(f"{self.list_url}?page_size=2", response)
+        self.assertEqual(other.status_code, status.HTTP_200_OK)
+
+    def test_tag_list(self):
+        """
+        Test that the tag list is answered with 304 until a tag changes.
+        """
+        response = self.get(self.tag_list_url)
+        not_modified = self.revalidate(self.tag_list_url, response)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.tag.title = "changed"
+        self.tag.save()
+        self.assertEqual(self.revalidate(self.tag_list_url, response).status_code,
+                         status.HTTP_200_OK)
+
+
+class TestSparseFieldsets(APIViewTest):
+    """
+    Test cases for the "fields" and "exclude" query params of the note list and detail views.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.tag = baker.make(Tag)
+        self.note = baker.make(Note, author=self.auth_user, tags=[self.tag], body="body")
+
+    def get_with_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.app.get(url, headers={"Authorization": f"Token {self.token.key}"})
+        notes = [query["sql"] for query in queries if query["sql"].startswith(
+            'SELECT "notes_note"."id"'
+        )]
+        return response, notes, queries
+
+    def test_fields(self):
+        """
+        Test that only the requested fields are serialized and their columns loaded.
+        """
+        response, notes, queries = self.get_with_queries("/notes/note/list/?fields=id,title")
+        self.assertEqual(response.json["results"], [{"id": self.note.pk, "title": self.note.title}])
+        # One query per side of `NoteQuerySet.visible_to`
+        self.assertEqual(len(notes), 2)
+        for sql in notes:
+            self.assertNotIn('"notes_note"."body"', sql)
+        self.assertFalse([query for query in queries if "notes_note_tags" in query["sql"]])
+
+        response, notes, queries = self.get_with_queries("/notes/note/list/?fields=title,tags")
+        self.assertEqual(response.json["results"], [
+            {"title": self.note.title, "tags": [str(self.tag.pk)]}
+        ])
+
+    def test_exclude(self):
+        response, notes, _ = self.get_with_queries(f"/notes/note/{self.note.pk}/?exclude=body")
+        self.assertNotIn("body", response.json)
+        self.assertEqual(response.json["tags"], [str(self.tag.pk)])
+        self.assertNotIn('"notes_note"."body"', notes[0])
+
+    def test_search(self):
+        response = self.get("/notes/note/list/?search=body&fields=title")
+        self.assertEqual(response.json["results"], [{"title": self.note.title}])
+
+    def test_etag_depends_on_fields(self):
+        url = f"/notes/note/{self.note.pk}/"
+        etag = self.get(url).headers["ETag"]
+        response = self.get(f"{url}?fields=title", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_writes_ignore_fields(self):
+        response = self.patch(f"/notes/note/{self.note.pk}/?fields=title", {"body": "new"})
+        self.assertEqual(response.json["body"], "new")
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.body, self.note.version), ("new", 3))
+
+    def test_empty_fields(self):
+        """
+        Test that an empty fieldset serializes all fields.
+        """
+        results = self.get("/notes/note/list/").json["results"]
+        for query in ("fields=", "fields=,", "exclude="):
+            response = self.get(f"/notes/note/list/?{query}")
+            self.assertEqual(response.json["results"], results, query)
+            response = self.get(f"/notes/note/{self.note.pk}/?{query}")
+            self.assertEqual(response.json["body"], "body", query)
+
+    def test_invalid_fields(self):
+        for query in ("fields=title,unknown", "exclude=author", "fields=title&exclude=body"):
+            response = self.get(f"/notes/note/list/?{query}", expect_errors=True)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+
+@override_settings(NOTES_COMPRESSION={"MIN_LENGTH": 100, "LEVEL": 6})
+class TestCompressedNoteBodies(APIViewTest):
+    """
+    Test cases for the note bodies stored compressed, see `notes.fields`.
+    """
+    long_body = " ".join(["the quick brown fox jumps over the lazy dog"] * 10)
+
+    def stored_body(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT typeof(body), length(body) FROM notes_note WHERE id = %s", [pk])
+            return cursor.fetchone()
+
+    def search(self, terms):
+        response = self.get("/notes/note/list/", params={"search": terms})
+        return [note["id"] for note in response.json["results"]]
+
+    def test_long_bodies_are_compressed(self):
+        """
+        Test that bodies above the threshold are stored compressed and read back unchanged.
+        """
+        response = self.post("/notes/note/create/", {"title": "long", "body": self.long_body})
+        long_id = response.json["id"]
+        short = baker.make(Note, author=self.auth_user, body="short")
+        stored_type, stored_length = self.stored_body(long_id)
+        self.assertEqual(stored_type, "blob")
+        self.assertLess(stored_length, len(self.long_body) / 4)
+        self.assertEqual(self.stored_body(short.pk)[0], "text")
+
+        self.assertEqual(self.get(f"/notes/note/{long_id}/").json["body"], self.long_body)
+        self.assertEqual(self.search("lazy"), [long_id])
+
+    def test_lazy_decompression(self):
+        """
+        Test that a loaded body is decompressed on access, and saved as stored if not read.
+        """
+        note = baker.make(Note, author=self.auth_user, body=self.long_body)
+        note = Note.objects.get(pk=note.pk)
+        self.assertIsInstance(note.__dict__["body"], bytes)
+        note.title = "renamed"
+        note.save()
+        self.assertIsInstance(note.__dict__["body"], bytes)
+        self.assertEqual(note.body, self.long_body)
+        self.assertEqual(note.__dict__["body"], self.long_body)
+        self.assertEqual(Note.objects.only("title").get(pk=note.pk).body, self.long_body)
+
+    def test_updates(self):
+        """
+        Test that updated bodies are compressed and reindexed, also by the bulk endpoint.
+        """
+        note = baker.make(Note, author=self.auth_user, body=self.long_body)
+        self.patch(f"/notes/note/{note.pk}/", {"body": "a short body"})
+        self.assertEqual(self.stored_body(note.pk)[0], "text")
+        self.assertEqual(self.search("lazy"), [])
+
+        self.post("/notes/note/bulk/", [
+            {"op": "update", "id": note.pk, "body": self.long_body.replace("dog", "cat")}
+        ])
+        self.assertEqual(self.stored_body(note.pk)[0], "blob")
+        self.assertEqual(self.search("cat"), [note.pk])
+        self.assertEqual(self.search("dog"), [])
+
+    def test_writes_outside_of_django(self):
+        """
+        Test that clients without notes_decompress() can write notes, their changes are
+        indexed with the next write through Django.
+        """
+        note = baker.make(Note, author=self.auth_user, body=self.long_body)
+        # A client like the sqlite3 CLI: no SQL function and no trigger draining the queue
+        connection.ensure_connection()
+        raw = connection.connection
+        raw.execute(f"DROP TRIGGER temp.{search.QUEUE_TABLE}_drain")
+        raw.create_function(DECOMPRESS_FUNCTION, 1, None)
+        try:
+            raw.execute(
+                "UPDATE notes_note SET body = ? WHERE id = ?",
+                [compress(self.long_body.replace("dog", "cat")), note.pk],
+            )
+            raw.execute("DELETE FROM notes_note WHERE id = ?", [note.pk])
+            raw.execute(
+                "INSERT INTO notes_note (title, body, is_public, author_id, version, updated_at)"
+                " VALUES ('outside', ?, 0, ?, 1, '2024-01-01 00:00:00')",
+                [compress(self.long_body.replace("dog", "cow")), self.auth_user.pk],
+            )
+        finally:
+            register_functions(raw)
+            search.install_drain_trigger(raw)
+        queued = f"SELECT count(*) FROM {search.QUEUE_TABLE}"
+        self.assertEqual(raw.execute(queued).fetchone(), (4,))
+
+        other = baker.make(Note, author=self.auth_user, body="other")
+        self.assertEqual(raw.execute(queued).fetchone(), (0,))
+        outside = Note.objects.get(title="outside")
+        self.assertEqual(self.search("lazy"), [outside.pk])
+        self.assertEqual(self.search("cow"), [outside.pk])
+        self.assertEqual(self.search("cat"), [])
+        self.assertEqual(self.search("other"), [other.pk])
+
+    def test_migration(self):
+        """
+        Test that the migration compresses existing bodies and rebuilds the search index.
+        """
+        migration = importlib.import_module("notes.migrations.0008_compressed_note_body")
+        note = baker.make(Note, author=self.auth_user, body="placeholder")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE notes_note SET body = %s WHERE id = %s", [self.long_body, note.pk]
+            )
+        self.assertEqual(self.stored_body(note.pk)[0], "text")
+
+        # The functions only use the connection of the schema editor
+        schema_editor = SimpleNamespace(connection=connection)
+        migration.compress_bodies(None, schema_editor)
+        self.assertEqual(self.stored_body(note.pk)[0], "blob")
+        self.assertEqual(self.search("lazy"), [note.pk])
+
+        migration.decompress_bodies(None, schema_editor)
+        self.assertEqual(self.stored_body(note.pk)[0], "text")
+        self.assertEqual(self.search("lazy"), [note.pk])
+
+
+class TestColumnarFormat(APIViewTest):
+    """
+    Test cases for the columnar format of the note and tag lists and the bulk endpoint.
+    """
+    media_type = "application/vnd.notes.columnar+json"
+
+    def setUp(self):
+        super().setUp()
+        self.tags = baker.make(Tag, _quantity=2)
+        self.notes = [
+            baker.make(Note, author=self.auth_user, tags=self.tags, body="first"),
+            baker.make(Note, author=self.auth_user, body="x" * 2000),
+            baker.make(Note, is_public=True, tags=self.tags[:1]),
+        ]
+
+    def assertColumnsOf(self, url):
+        """
+        Asserts that the columnar list of `url` holds the values of its JSON list.
+        """
+        rows = self.get(url).json
+        columns = self.get(url, params={"format": "columnar"}).json
+        if "results" in rows:
+            rows, columns = rows["results"], columns["results"]
+        self.assertEqual(list(columns), list(rows[0]))
+        self.assertEqual(columns, {name: [row[name] for row in rows] for name in rows[0]})
+
+    def test_note_list(self):
+        """
+        Test that the columns hold the values of the notes, also sparse and searched.
+        """
+        self.assertColumnsOf("/notes/note/list/")
+        self.assertColumnsOf("/notes/note/list/?fields=id,tags")
+        self.assertColumnsOf("/notes/note/list/?search=first")
+        self.assertColumnsOf("/notes/note/list/?page_size=1")
+
+    def test_tag_list(self):
+        self.assertColumnsOf("/notes/tag/list/")
+
+    def test_pagination(self):
+        """
+        Test that the next page continues after the last note of the columnar page.
+        """
+        response = self.get("/notes/note/list/?format=columnar&page_size=2")
+        self.assertEqual(response.json["results"]["id"], [note.pk for note in self.notes[:0:-1]])
+        response = self.app.get(response.json["next"],
+                                headers={"Authorization": f"Token {self.token.key}"})
+        self.assertEqual(response.json["results"]["id"], [self.notes[0].pk])
+
+    def test_accept_header(self):
+        response = self.get("/notes/note/list/", headers={"Accept": self.media_type})
+        self.assertEqual(response.content_type, self.media_type)
+        self.assertEqual(response.json["results"]["id"], [note.pk for note in self.notes[::-1]])
+
+    def test_queries(self):
+        """
+        Test that the notes (own and public) and their tags are read without instances.
+        """
+        with patch.object(Note, "from_db") as from_db:
+            with CaptureQueriesContext(connection) as queries:
+                self.get("/notes/note/list/?format=columnar")
+        self.assertFalse(from_db.called)
+        reads = [
+            query["sql"] for query in queries
+            if query["sql"].startswith(('SELECT "notes_note"."id"', 'SELECT "notes_note_tags"'))
+        ]
+        self.assertEqual(len(reads), 3)
+
+    def test_anonymous_cache(self):
+        """
+        Test that the cached anonymous lists are kept apart per format.
+        """
+        for _ in range(2):
+            response = self.get("/notes/note/list/", auth=False)
+            self.assertEqual(response.json["results"][0]["id"], self.notes[2].pk)
+            response = self.get("/notes/note/list/", auth=False,
+                                headers={"Accept": self.media_type})
+            self.assertEqual(response.json["results"]["id"], [self.notes[2].pk])
+
+    def post_columns(self, columns, **kwargs):
+        return self.app.post(
+            "/notes/note/bulk/",
+            params=json.dumps(columns),
+            headers={"Authorization": f"Token {self.token.key}"},
+            content_type=self.media_type,
+            **kwargs,
+        )
+
+    def test_bulk_upload(self):
+        """
+        Test that bulk operations are parsed from columns, null leaving out a field.
+        """
+        response = self.post_columns({
+            "op": ["create", "update", "delete"],
+            "id": [None, self.notes[0].pk, self.notes[1].pk],
+            "title": ["new", "renamed", None],
+            "body": ["body", None, None],
+        })
+        self.assertEqual([result["status"] for result in response.json], [201, 200, 204])
+        self.notes[0].refresh_from_db()
+        self.assertEqual((self.notes[0].title, self.notes[0].body), ("renamed", "first"))
+        self.assertFalse(Note.objects.filter(pk=self.notes[1].pk).exists())
+
+    def test_invalid_columns(self):
+        for columns in ([{"op": "create"}], {"op": "create"}, {"op": ["create"], "id": []}):
+            response = self.post_columns(columns, expect_errors=True)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, columns)
+
+
+class TestNoteChangesView(APIViewTest):
+    """
+    Test cases for the `NoteChangesView` API view.
+    """
+    url = '/notes/note/changes/'
+
+    def setUp(self):
+        super().setUp()
+        self.tag = baker.make(Tag)
+        self.note = baker.make(Note, author=self.auth_user, tags=[self.tag])
+        self.other_author = baker.make(Author)
+        self.public_note = baker.make(Note, author=self.other_author, is_public=True)
+        self.private_note = baker.make(Note, author=self.other_author)
+
+    def sync(self, since=0, **params):
+        response = self.get(self.url, params={"since": since, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json
+
+    def changed(self, data):
+        return [(change["type"], change["id"], change["deleted"]) for change in data["changes"]]
+
+    def test_full_sync(self):
+        """
+        Test that a sync from 0 returns the current state of the visible notes and the tags.
+        """
+        data = self.sync()
+        self.assertEqual(self.changed(data), [
+            ("tag", str(self.tag.pk), False),
+            ("note", self.note.pk, False),
+            ("note", self.public_note.pk, False),
+        ])
+        self.assertEqual(data["changes"][1]["data"]["tags"], [str(self.tag.pk)])
+        self.assertFalse(data["has_more"])
+        self.assertEqual(self.sync(data["next_since"])["changes"], [])
+
+    def test_changes_since(self):
+        """
+        Test that only the notes changed since the last sync are returned, in the order of
+        their last change, with tombstones for deleted notes.
+        """
+        since = self.sync()["next_since"]
+        self.patch(f"/notes/note/{self.note.pk}/", {"title": "new"})
+        self.post("/notes/note/bulk/", [{"op": "create", "title": "title", "body": "body"}])
+        new_note = Note.objects.latest("pk")
+        self.delete(f"/notes/note/{self.note.pk}/")
+        self.public_note.tags.add(self.tag)
+        self.private_note.title = "private"
+        self.private_note.save()
+
+        data = self.sync(since)
+        self.assertEqual(self.changed(data), [
+            ("note", new_note.pk, False),
+            ("note", self.note.pk, True),
+            ("note", self.public_note.pk, False),
+        ])
+        self.assertIsNone(data["changes"][1]["data"])
+        self.assertEqual(data["changes"][2]["data"]["tags"], [str(self.tag.pk)])
+
+    def test_paging(self):
+        """
+        Test that the log is read `limit` entries at a time until it is exhausted.
+        """
+        changes, since, has_more = {}, 0, True
+        while has_more:
+            data = self.sync(since, limit=1)
+            self.assertLessEqual(len(data["changes"]), 1)
+            changes.update((change["id"], change) for change in data["changes"])
+            since, has_more = data["next_since"], data["has_more"]
+        self.assertEqual(set(changes), {str(self.tag.pk), self.note.pk, self.public_note.pk})
+
+    def test_notes_made_private_are_deleted_for_others(self):
+        since = self.sync()["next_since"]
+        self.public_note.is_public = False
+        self.public_note.save()
+        self.assertEqual(self.changed(self.sync(since)), [("note", self.public_note.pk, True)])
+
+    def test_tag_changes(self):
+        since = self.sync()["next_since"]
+        self.tag.title = "renamed"
+        self.tag.save()
+        data = self.sync(since)
+        self.assertEqual(data["changes"][-1]["data"]["title"], "renamed")
+        tag_id = str(self.tag.pk)
+        self.tag.delete()
+        data = self.sync(data["next_since"])
+        self.assertIn(("tag", tag_id, True), self.changed(data))
+
+    def test_resolved_tags(self):
+        """
+        Test that tags created in bulk by resolving titles are logged, existing ones not.
+        """
+        since = self.sync()["next_since"]
+        response = self.post("/notes/tag/resolve/", {"titles": [self.tag.title, "new"]})
+        new_tag = response.json["tags"]["new"]
+        self.assertEqual(self.changed(self.sync(since)), [("tag", new_tag, False)])
+
+    def test_compacted_since(self):
+        """
+        Test that a client that synced before dropped tombstones has to sync from 0.
+        """
+        since = self.sync()["next_since"]
+        self.note.delete()
+        call_command("compact_changes", "--retention-days", "0", stdout=StringIO())
+        response = self.get(self.url, params={"since": since}, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(len(self.sync()["changes"]), 2)
+
+    def test_invalid_params(self):
+        for params in ({"since": "x"}, {"since": -1}, {"limit": 0}, {"limit": 100000}):
+            response = self.get(self.url, params=params, expect_errors=True)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+        response = self.get(self.url, auth=False, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestAsyncNoteViews(APIViewTest):
+    """
+    Test cases for the async note views, they must answer like their sync counterparts.
+    """
+    list_url = '/notes/async/note/list/'
+    detail_url = '/notes/async/note/{}/'
+    create_url = '/notes/async/note/create/'
+
+    def setUp(self):
+        super().setUp()
+        token_cache.clear()
+        self.tags = baker.make(Tag, _quantity=2)
+        self.notes = baker.make(Note, tags=self.tags, author=self.auth_user, _quantity=3)
+        self.public_note = baker.make(Note, tags=self.tags[:1], is_public=True)
+        baker.make(Note)
+
+    @staticmethod
+    def normalized(notes):
+        return [{**note, "tags": sorted(note["tags"])} for note in notes]
+
+    def test_list_matches_sync_view(self):
+        """
+        Test that the async list returns the same notes as `NoteListView`.
+        """
+        for auth in (True, False):
+            for query in ("", f"?tag={self.tags[1].pk}", "?search=x"):
+                response = self.get(f"{self.list_url}{query}", auth=auth)
+                expected = self.get(f"/notes/note/list/{query}", auth=auth)
+                self.assertEqual(self.normalized(response.json["results"]),
+                                 self.normalized(expected.json["results"]))
+
+    def test_list_pagination(self):
+        """
+        Test that following the next links returns every visible note once, newest first.
+        """
+        ids, url = [], f"{self.list_url}?page_size=2"
+        while url:
+            response = self.get(url)
+            ids += [note["id"] for note in response.json["results"]]
+            url = response.json["next"]
+        self.assertEqual(ids, sorted([note.pk for note in self.notes] + [self.public_note.pk],
+                                     reverse=True))
+
+    def test_list_query_count(self):
+        """
+        Test that a page is loaded with three queries: the own and the public notes (see
+        `NoteQuerySet.visible_to`) and their tags.
+        """
+        headers = {"Authorization": f"Token {self.token.key}"}
+        self.app.get(self.list_url, headers=headers)
+        with CaptureQueriesContext(connection) as queries:
+            self.app.get(self.list_url, headers=headers)
+        self.assertEqual(len(queries), 3)
+
+    def test_invalid_token(self):
+        """
+        Test that an invalid token is rejected even on the public list.
+        """
+        response = self.app.get(self.list_url, headers={"Authorization": "Token invalid"},
+                                expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json, {"detail": "Invalid token."})
+        self.assertEqual(response.headers["WWW-Authenticate"], "Token")
+
+    def test_detail(self):
+        """
+        Test that the detail matches `NoteDetailView`, including its validators.
+        """
+        url = self.detail_url.format(self.notes[0].pk)
+        response = self.get(url)
+        expected = self.get(f"/notes/note/{self.notes[0].pk}/")
+        self.assertEqual(self.normalized([response.json]), self.normalized([expected.json]))
+        self.assertEqual(response.headers["ETag"], expected.headers["ETag"])
+
+        not_modified = self.get(url, headers={"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_of_other_author(self):
+        """
+        Test that notes of other authors are not found, public or not.
+        """
+        response = self.get(self.detail_url.format(self.public_note.pk), expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.get(self.detail_url.format(self.notes[0].pk), auth=False,
+                            expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_create(self):
+        """
+        Test creating a note with tags.
+        """
+        data = {"title": "title", "body": "body", "tags": [str(tag.pk) for tag in self.tags]}
+        response = self.post(self.create_url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        note = Note.objects.get(pk=response.json["id"])
+        self.assertEqual(note.author, self.auth_user)
+        self.assertEqual(set(note.tags.all()), set(self.tags))
+        self.assertEqual(sorted(response.json["tags"]), sorted(data["tags"]))
+
+    def test_create_invalid(self):
+        """
+        Test that missing fields and unknown tags are rejected without creating a note.
+        """
+        response = self.post(self.create_url, {"body": "body"}, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("title", response.json)
+
+        data = {"title": "title", "body": "body", "tags": [str(uuid.uuid4())]}
+        response = self.post(self.create_url, data, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("tags", response.json)
+        self.assertEqual(Note.objects.count(), 5)
+
+    def test_create_with_tag_deleted_meanwhile(self):
+        """
+        Test that a tag deleted between the validation and the insert of the relations
+        rejects the note, without leaving the note or a relation to the tag behind.
+        """
+        create = Note.objects.acreate
+
+        async def create_and_delete_tag(**kwargs):
+            note = await create(**kwargs)
+            await Tag.objects.filter(pk=self.tags[0].pk).adelete()
+            return note
+
+        data = {"title": "title", "body": "body", "tags": [str(tag.pk) for tag in self.tags]}
+        with patch.object(Note.objects, "acreate", create_and_delete_tag):
+            response = self.post(self.create_url, data, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("tags", response.json)
+        self.assertFalse(Note.objects.filter(title="title", author=self.auth_user).exists())
+        self.assertFalse(Note.tags.through.objects.filter(tag_id=self.tags[0].pk).exists())
+
+    def test_create_without_being_logged_in(self):
+        """
+        Test creation of a note without being logged in (should fail).
+        """
+        response = self.post(self.create_url, {"title": "title", "body": "body"}, auth=False,
+                             expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_asgi_client(self):
+        """
+        Test the views through the ASGI handler.
+        """
+        client = AsyncClient()
+        headers = {"AUTHORIZATION": f"Token {self.token.key}"}
+        response = await client.get(self.list_url, **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()["results"]), 4)
+        response = await client.post(self.create_url, {"title": "title", "body": "body"},
+                                     content_type="application/json", **headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = await client.get(self.detail_url.format(response.json()["id"]), **headers)
+        self.assertEqual(response.json()["title"], "title")
+
+
 class TestCreateTagView(APIViewTest):
     """
     Test cases for the `CreateTagView` API view.
@@ -247,9 +1727,64 @@ class TestCreateTagView(APIViewTest):
         """
         data = {"title": "test title"}
         self.assertFalse(Tag.objects.all())
-        self.post(self.url, data)
+        response = self.post(self.url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(Tag.objects.all())
 
+    def test_create_existing_tag(self):
+        """
+        Test that creating a tag with the title of an existing tag returns the existing one.
+        """
+        tag = baker.make(Tag, title="Work")
+        response = self.post(self.url, {"title": " WORK "})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json["uuid"], str(tag.pk))
+        self.assertEqual(response.json["title"], "Work")
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_create_tag_longer_when_normalized(self):
+        """
+        Test that a title of the maximum length fits once case folding made it longer.
+        """
+        response = self.post(self.url, {"title": "ß" * 128})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        tag = Tag.objects.get()
+        self.assertEqual(tag.normalized_title, "ss" * 128)
+        tag.full_clean()
+
+
+class TestTagResolveView(APIViewTest):
+    """
+    Test cases for the `TagResolveView` API view.
+    """
+    url = '/notes/tag/resolve/'
+
+    def test_resolve_titles(self):
+        """
+        Test that titles resolve to existing tags and missing tags are created once.
+        """
+        work = baker.make(Tag, title="work")
+        titles = ["Work", "todo", "TODO", "new  idea", "New Idea"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(self.url, {"titles": titles})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        tags = response.json["tags"]
+        self.assertEqual(tags["Work"], str(work.pk))
+        self.assertEqual(tags["todo"], tags["TODO"])
+        self.assertEqual(tags["new  idea"], tags["New Idea"])
+        self.assertEqual(Tag.objects.count(), 3)
+        self.assertEqual(Tag.objects.get(pk=tags["todo"]).title, "todo")
+        tag_queries = [query for query in queries if '"notes_tag"' in query["sql"]]
+        # lookup + bulk insert + lookup of the created tags
+        self.assertEqual(len(tag_queries), 3)
+
+    def test_resolve_without_titles(self):
+        """
+        Test that an empty list of titles is rejected.
+        """
+        response = self.post(self.url, {"titles": []}, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class TestTagDetailView(APIViewTest):
     """
@@ -269,6 +1804,17 @@ class TestTagDetailView(APIViewTest):
         response = self.patch(self.url.format(new_tag.pk), data=data)
         self.assertEqual(response.json["title"], data["title"])
 
+    def test_change_tag_to_existing_title(self):
+        """
+        Test that renaming a tag to the title of another tag is rejected.
+        """
+        baker.make(Tag, title="work")
+        tag = baker.make(Tag, title="todo")
+        baker.make(Note, tags=[tag], author=self.auth_user)
+        response = self.patch(self.url.format(tag.pk), {"title": "Work"}, expect_errors=True)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("title", response.json)
+
 
 class TestTagListView(APIViewTest):
     """
@@ -280,9 +1826,9 @@ class TestTagListView(APIViewTest):
         """
         Test retrieval of all tags.
         """
-        first_tag = baker.make(Tag, title="title")
-        second_tag = baker.make(Tag, title="title")
-        baker.make(Tag, title="title")
+        first_tag = baker.make(Tag, title="first title")
+        second_tag = baker.make(Tag, title="second title")
+        baker.make(Tag, title="third title")
         baker.make(Note, tags=[first_tag, second_tag], author=self.auth_user)
         baker.make(Note, _quantity=5, author=self.auth_user)
         response = self.get(self.url)
@@ -1,18 +1,39 @@
 from django.urls import re_path
-from notes.views import (NoteCreateView, NoteDetailView, NoteListView,
-                         TagCreateView, TagDetailView, TagListView)
+from notes.async_views import (AsyncNoteCreateView, AsyncNoteDetailView,
+                               AsyncNoteListView)
+from notes.views import (NoteBulkView, NoteChangesView, NoteCreateView,
+                         NoteDetailView, NoteExportView, NoteImportView,
+                         NoteListView, TagCreateView, TagDetailView,
+                         TagListView, TagResolveView)
 
 urlpatterns = [
     # Notes view
     re_path(r"^notes/note/create/$",
             NoteCreateView.as_view(), name="note-create"),
+    re_path(r"^notes/note/bulk/$",
+            NoteBulkView.as_view(), name="note-bulk"),
+    re_path(r"^notes/note/export/$",
+            NoteExportView.as_view(), name="note-export"),
+    re_path(r"^notes/note/import/$",
+            NoteImportView.as_view(), name="note-import"),
     re_path(r"^notes/note/list/$",
             NoteListView.as_view(), name="note-list"),
+    re_path(r"^notes/note/changes/$",
+            NoteChangesView.as_view(), name="note-changes"),
     re_path(r"^notes/note/(?P<pk>[0-9]+)/$",
             NoteDetailView.as_view(), name="note-detail"),
+    # Async note views for ASGI deployments
+    re_path(r"^notes/async/note/create/$",
+            AsyncNoteCreateView.as_view(), name="async-note-create"),
+    re_path(r"^notes/async/note/list/$",
+            AsyncNoteListView.as_view(), name="async-note-list"),
+    re_path(r"^notes/async/note/(?P<pk>[0-9]+)/$",
+            AsyncNoteDetailView.as_view(), name="async-note-detail"),
     # Tag views
     re_path(r"^notes/tag/create/$",
             TagCreateView.as_view(), name="tag-create"),
+    re_path(r"^notes/tag/resolve/$",
+            TagResolveView.as_view(), name="tag-resolve"),
     re_path(r"^notes/tag/list/$",
             TagListView.as_view(), name="tag-list"),
     re_path(r"^notes/tag/(?P<pk>[0-9A-Fa-f\-]+)/$",
@@ -1,15 +1,32 @@
-import re
-
-from django.db.models import Q
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from notes.bulk import apply_operations
+from notes.cache import get_cache, public_list_key
+from notes.changes import changes_since, get_horizon
+from notes.filters import NoteSearchFilter, NoteTagFilter
+from notes.mixins import (ConditionalGetMixin, ReplicaReadMixin, ShardMixin,
+                          SparseFieldsetMixin, ValuesListMixin,
+                          change_log_validators)
 from notes.models import Note, Tag
-from notes.serializers import NoteSerializer, TagSerializer
-from rest_framework import filters
-from rest_framework.generics import (CreateAPIView, ListAPIView,
-                                     RetrieveUpdateDestroyAPIView)
+from notes.ndjson import export_notes, import_notes
+from notes.pagination import NoteCursorPagination
+from notes.parsers import ColumnarJSONParser
+from notes.renderers import NDJSONRenderer
+from notes.serializers import (NoteBulkOperationSerializer,
+                               NoteChangesSerializer, NoteImportSerializer,
+                               NoteSerializer, TagResolveSerializer,
+                               TagSerializer)
+from notes.sharding import ShardedQuerySet, shard_for_author
+from rest_framework import status
+from rest_framework.generics import (CreateAPIView, GenericAPIView,
+                                     ListAPIView, RetrieveUpdateDestroyAPIView)
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
 
-class NoteCreateView(CreateAPIView):
+class NoteCreateView(ShardMixin, CreateAPIView):
     """
     API view for creating a new note via POST.
     Required: title:str, body:str
@@ -18,50 +35,164 @@ class NoteCreateView(CreateAPIView):
     serializer_class = NoteSerializer
 
 
-class NoteListView(ListAPIView):
+class NoteBulkView(ShardMixin, GenericAPIView):
+    """
+    API view for creating, updating and deleting many notes in one transactional request.
+    POST: A list of operations, see `NoteBulkOperationSerializer`
+        [{"op": "create", "title": "Title", "body": "Body", "tags": [], "is_public": false},
+         {"op": "update", "id": 1, "title": "New title"},
+         {"op": "delete", "id": 2}]
+    Returns a result per operation ({"op", "id", "status"}) in the order of the request, or
+    if any operation is invalid, applies none of them and returns the errors per operation.
+    The operations may also be sent as columns, see `ColumnarJSONParser`.
+    """
+    serializer_class = NoteBulkOperationSerializer
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, ColumnarJSONParser]
+    max_operations = 1000
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(
+            data=request.data, many=True, max_length=self.max_operations
+        )
+        serializer.is_valid(raise_exception=True)
+        results = apply_operations(request.user, serializer.validated_data)
+        return Response(results)
+
+
+class NoteExportView(ShardMixin, GenericAPIView):
+    """
+    API view for exporting all notes of the authenticated user via GET.
+    Streams the notes as NDJSON, one note per line in the format of the note list.
+    """
+    renderer_classes = [NDJSONRenderer]
+    queryset = Note.objects.all()
+
+    def get_queryset(self):
+        # The export is streamed after the request is dispatched, outside of the ShardMixin
+        alias = shard_for_author(self.request.user.pk)
+        return super().get_queryset().using(alias).filter(author=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(
+            export_notes(self.get_queryset(), settings.NOTES_EXPORT_CHUNK_SIZE),
+            content_type=NDJSONRenderer.media_type,
+        )
+        response["Content-Disposition"] = 'attachment; filename="notes.ndjson"'
+        return response
+
+
+class NoteImportView(ShardMixin, GenericAPIView):
+    """
+    API view for importing notes for the authenticated user from an NDJSON file via POST.
+    Required: file: multipart upload with one note per line
+        {"title": str, "body": str, "tags": list(str), "is_public": bool}
+    Tags are given by title and created if missing, or by the uuid of an existing tag, so
+    an export can be imported again. Invalid lines are skipped, returns
+    {"created": int, "error_count": int, "errors": [{"line": int, "errors": dict}]}
+    """
+    serializer_class = NoteImportSerializer
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = import_notes(
+            request.user, serializer.validated_data["file"], settings.NOTES_IMPORT_CHUNK_SIZE
+        )
+        return Response(result)
+
+
+class NoteListView(
+    ShardMixin,
+    ReplicaReadMixin,
+    ConditionalGetMixin,
+    SparseFieldsetMixin,
+    ValuesListMixin,
+    ListAPIView,
+):
     """
     API view for retrieving a list of notes.
-    GET: Returns a filtered list of notes based on additional query parameters and the
-        user's authentication status.
+    GET: Returns a filtered, cursor paginated list of notes (newest first) based on additional
+        query parameters and the user's authentication status. Supports conditional requests
+        via ETag / Last-Modified.
     Query Params:
-        "search" for content in notes body
-        "tags" for notes with tag_uuid
+        "search" for keywords in notes title and body, ranked by relevance. Supports
+            "quoted phrases" and prefix* queries
+        "tag" for notes with tag_uuid, combined via "match" (all, any, none), see
+            `NoteTagFilter`
+        "cursor" and "page_size" for paging, see `NoteCursorPagination`
+        "fields" or "exclude" for the fields of the notes, e.g. "id,title,tags", see
+            `SparseFieldsetMixin`
+        "format=columnar" for the notes as columns, see `ValuesListMixin`
+    The notes are serialized from values_list() rows, see `ValuesSerializer`.
     """
     serializer_class = NoteSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ["body"]
-    queryset = Note.objects.all()
+    pagination_class = NoteCursorPagination
+    filter_backends = [NoteSearchFilter, NoteTagFilter]
+    search_fields = ["title", "body"]
+    queryset = Note.objects.with_tags()
 
     def get_queryset(self):
         """
-        Returns a filtered queryset of notes based on additional query parameters and the
-            user's authentication status.
-        - If "search" as query parameters search contents of notes with keywords
-        - If "tags" as query parameters filter notes notes via tags
+        Returns a queryset of notes based on the user's authentication status.
+        The "search" and "tag" query parameters are applied afterwards by `filter_backends`.
         - If the user is anonymous (=unauthenticated), only public notes are returned.
         - If the user is authenticated, their notes and public notes are returned.
+        With sharding the notes of all shards are listed, see `ShardedQuerySet`.
         """
-        queryset = super().get_queryset()
+        return ShardedQuerySet.fan_out(super().get_queryset().visible_to(self.request.user))
 
-        # Look for tag as query param
-        tag_query = self.request.query_params.get('tag', None)
+    def get_validators(self):
+        """
+        Returns the validators of the list from the change log (see
+        `change_log_validators`), cached along with the anonymous lists.
+        """
+        if not self.request.user.is_anonymous:
+            return self.get_list_validators()
+        return get_cache().get_or_set(
+            f"{public_list_key(self.request)}:validators",
+            self.get_list_validators,
+            settings.NOTES_PUBLIC_LIST_CACHE_TIMEOUT,
+        )
+
+    def get_list_validators(self):
+        return change_log_validators(
+            self.request.user.pk,
+            self.request.get_full_path(),
+            self.request.accepted_renderer.format,
+        )
+
+    def list(self, request, *args, **kwargs):
+        """
+        Anonymous users all see the same public notes, so their responses are cached per
+        query params until notes or tags change (see `notes.cache`).
+        """
+        if not request.user.is_anonymous:
+            return super().list(request, *args, **kwargs)
 
-        if tag_query:
-            # Find all uuids in query param via regrex
-            uuid_regrex = '[a-fA-F0-9]{8}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{4}-[a-fA-F0-9]{12}'
-            for tag_uuid in re.findall(uuid_regrex, tag_query, re.DOTALL):
-                # Filter in loop to only keep notes which have all the tags found in query params
-                queryset = queryset.filter(tags__pk=tag_uuid, author=self.request.user)
+        cache = get_cache()
+        key = public_list_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
 
-        if self.request.user.is_anonymous:
-            return queryset.filter(is_public=True)
-        return queryset.filter(Q(author=self.request.user) | Q(is_public=True))
+        response = super().list(request, *args, **kwargs)
+        cache.set(key, response.data, settings.NOTES_PUBLIC_LIST_CACHE_TIMEOUT)
+        return response
 
 
-class NoteDetailView(RetrieveUpdateDestroyAPIView):
+class NoteDetailView(
+    ShardMixin,
+    ReplicaReadMixin,
+    ConditionalGetMixin,
+    SparseFieldsetMixin,
+    RetrieveUpdateDestroyAPIView,
+):
     """
     API view for retrieving (GET), updating (UPDATE), and deleting (DELETE) a note.
+    GET supports conditional requests via ETag / Last-Modified and the "fields" and
+    "exclude" query params of `SparseFieldsetMixin`.
     """
     serializer_class = NoteSerializer
     queryset = Note.objects.all()
@@ -70,18 +201,87 @@ class NoteDetailView(RetrieveUpdateDestroyAPIView):
         """
         Returns a filtered queryset of notes belonging to the authenticated user.
         """
-        return Note.objects.filter(author=self.request.user)
+        return Note.objects.with_tags().filter(author=self.request.user)
+
+    def get_validators(self):
+        """
+        Returns the validators of the note from its version, without loading the note.
+        """
+        note = self.get_queryset().filter(pk=self.kwargs["pk"]).values("version", "updated_at")
+        note = note.first()
+        if note is None:
+            return None, None
+        etag = f"{self.kwargs['pk']}-{note['version']}-{self.request.accepted_renderer.format}"
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            etag = f"{etag}-{','.join(fields)}"
+        return etag, note["updated_at"]
+
+
+class NoteChangesView(ShardMixin, GenericAPIView):
+    """
+    API view for syncing notes via GET: the changes of the user's notes, public notes and
+    tags since the last sync, from the change log (see `notes.changes`).
+    Query Params:
+        "since" the "next_since" of the previous sync, 0 (default) for all notes and tags
+        "limit" number of log entries read, see settings.NOTES_CHANGE_LOG
+    Returns {"changes": [{"seq", "type", "id", "deleted", "data"}], "next_since": int,
+        "has_more": bool}, clients repeat the request with "next_since" while "has_more".
+    Responds 410 Gone if the log was compacted past "since", the client has to sync from 0.
+    """
+    serializer_class = NoteChangesSerializer
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        since = serializer.validated_data["since"]
+        limit = serializer.validated_data.get("limit", settings.NOTES_CHANGE_LOG["PAGE_SIZE"])
+        if 0 < since < get_horizon():
+            return Response(
+                {"detail": "The changes since this sync are no longer available, sync from 0."},
+                status=status.HTTP_410_GONE,
+            )
+        return Response(changes_since(request, since, limit))
 
 
 class TagCreateView(CreateAPIView):
     """
     API view for creating a new tag with POST.
     Required: title: str
+    Tags are unique by their case folded title, if the tag already exists it is returned
+    with status 200 instead.
     """
     serializer_class = TagSerializer
 
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        title = serializer.validated_data["title"]
+        tag, created = Tag.objects.get_or_create(
+            normalized_title=Tag.normalize_title(title), defaults={"title": title}
+        )
+        return Response(
+            self.get_serializer(tag).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+
+class TagResolveView(GenericAPIView):
+    """
+    API view for resolving many tag titles to tags in one request via POST.
+    Required: titles: list(str)
+    Missing tags are created. Returns the uuid for every title: {"tags": {title: uuid}}
+    """
+    serializer_class = TagResolveSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tags = Tag.objects.resolve_titles(serializer.validated_data["titles"])
+        return Response({"tags": {title: tag.pk for title, tag in tags.items()}})
 
-class TagDetailView(RetrieveUpdateDestroyAPIView):
+
+class TagDetailView(ShardMixin, ReplicaReadMixin, RetrieveUpdateDestroyAPIView):
     """
     API view for retrieving (GET), updating (UPDATE), and deleting (DELETE) a tag.
     """
@@ -93,16 +293,23 @@ class TagDetailView(RetrieveUpdateDestroyAPIView):
         Returns a filtered queryset of tags associated with the authenticated user's notes.
         """
         queryset = super().get_queryset()
-        return queryset.filter(notes__author=self.request.user)
+        return queryset.filter(notes__author=self.request.user).distinct()
 
 
-class TagListView(ListAPIView):
+class TagListView(ReplicaReadMixin, ConditionalGetMixin, ValuesListMixin, ListAPIView):
     """
     API view for retrieving a list of all tags.
+    Supports conditional requests via ETag / Last-Modified and the tags as columns with
+    "format=columnar", serialized from values_list() rows, see `ValuesListMixin`.
     """
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
 
+    def get_validators(self):
+        return change_log_validators(
+            self.request.get_full_path(), self.request.accepted_renderer.format
+        )
+
     # TODO: Find out if this is necessary
     # def get_queryset(self):
     #     # Returns only the tags associated with authors notes